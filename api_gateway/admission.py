@@ -0,0 +1,145 @@
+import hashlib
+from typing import Dict, Any, Callable, Optional
+
+# Default knobs, overridable from the `caching.admission` section of model_configs.yaml
+DEFAULT_ADMISSION_CONFIG = {
+    "enabled": True,
+    "min_frequency": 2,
+    "width": 65536,
+    "depth": 4,
+    "sample_factor": 10,
+    "doorkeeper": True,
+}
+
+# Counters are capped like TinyLFU's 4-bit counters
+MAX_COUNT = 15
+
+# bytes.translate table that halves every counter in one pass
+HALVE = bytes(i >> 1 for i in range(256))
+
+
+def _indexes(key: str, depth: int, mask: int):
+    """One slot per row via double hashing of a single 128-bit digest"""
+    digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) & mask for i in range(depth)]
+
+
+class CountMinSketch:
+    """Approximate per-key counts in depth rows of width byte counters"""
+
+    def __init__(self, width: int, depth: int):
+        # Round the width up to a power of two so slots are a mask away
+        self.width = 1 << max(int(width) - 1, 1).bit_length()
+        self.depth = int(depth)
+        self.mask = self.width - 1
+        self.rows = [bytearray(self.width) for _ in range(self.depth)]
+
+    def increment(self, key: str):
+        for row, index in zip(self.rows, _indexes(key, self.depth, self.mask)):
+            if row[index] < MAX_COUNT:
+                row[index] += 1
+
+    def estimate(self, key: str) -> int:
+        return min(row[index] for row, index in zip(self.rows, _indexes(key, self.depth, self.mask)))
+
+    def halve(self):
+        self.rows = [row.translate(HALVE) for row in self.rows]
+
+
+class Doorkeeper:
+    """Bloom filter that absorbs each key's first sighting so one-offs never reach the sketch"""
+
+    def __init__(self, bits: int, hashes: int):
+        self.bits = 1 << max(int(bits) - 1, 1).bit_length()
+        self.hashes = int(hashes)
+        self.mask = self.bits - 1
+        self.array = bytearray(self.bits // 8)
+
+    def add(self, key: str) -> bool:
+        """Set the key's bits; True if they were all set already"""
+        present = True
+        for index in _indexes(key, self.hashes, self.mask):
+            byte, bit = index >> 3, 1 << (index & 7)
+            if not self.array[byte] & bit:
+                present = False
+                self.array[byte] |= bit
+        return present
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.array[i >> 3] & (1 << (i & 7)) for i in _indexes(key, self.hashes, self.mask))
+
+    def clear(self):
+        self.array = bytearray(len(self.array))
+
+
+class TinyLfuAdmission:
+    """Frequency-based admission filter for the response cache
+
+    Every cache lookup is recorded; a response is only written once its key
+    has been seen min_frequency times within the current window, so one-off
+    prompts never displace hot entries or cost a Redis write. Counts live in
+    a count-min sketch behind a doorkeeper bloom filter. After
+    sample_factor * width recordings every counter is halved and the
+    doorkeeper cleared, so old popularity fades and the sketch tracks the
+    recent request mix. Size width around the number of distinct keys
+    expected per window.
+    """
+
+    def __init__(self, admission_config: Optional[Dict[str, Any]] = None):
+        self.settings = {**DEFAULT_ADMISSION_CONFIG, **(admission_config or {})}
+        self.sketch = CountMinSketch(self.settings["width"], self.settings["depth"])
+        self.doorkeeper = (
+            Doorkeeper(self.sketch.width * 8, self.settings["depth"]) if self.settings["doorkeeper"] else None
+        )
+        self.sample_size = int(self.settings["sample_factor"]) * self.sketch.width
+        self.additions = 0
+        self.resets = 0
+        self.on_event: Optional[Callable[[str], None]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings["enabled"])
+
+    def record(self, key: str):
+        """Count one access to key"""
+        if not self.enabled:
+            return
+        if self.doorkeeper is None or self.doorkeeper.add(key):
+            self.sketch.increment(key)
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._age()
+
+    def frequency(self, key: str) -> int:
+        count = self.sketch.estimate(key)
+        if self.doorkeeper is not None and key in self.doorkeeper:
+            count += 1
+        return count
+
+    def admit(self, key: str) -> bool:
+        """Whether a response for key should be written to the cache"""
+        if not self.enabled:
+            return True
+        admitted = self.frequency(key) >= self.settings["min_frequency"]
+        if self.on_event:
+            self.on_event("admitted" if admitted else "rejected")
+        return admitted
+
+    def _age(self):
+        self.sketch.halve()
+        if self.doorkeeper is not None:
+            self.doorkeeper.clear()
+        self.additions //= 2
+        self.resets += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "width": self.sketch.width,
+            "depth": self.sketch.depth,
+            "sample_size": self.sample_size,
+            "additions": self.additions,
+            "resets": self.resets,
+        }
@@ -0,0 +1,105 @@
+import time
+from typing import Dict, Any, Callable, Optional
+
+# Default knobs, overridable from the `fast_fail` section of model_configs.yaml
+DEFAULT_FAST_FAIL_CONFIG = {
+    "enabled": True,
+    "failure_threshold": 3,
+    "open_seconds": 10.0,
+    "max_open_seconds": 120.0,
+}
+
+
+class BackendState:
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0.0
+        self.open_seconds = 0.0
+        self.probing_until = 0.0
+
+    @property
+    def open(self) -> bool:
+        return self.open_until > 0
+
+
+class BackendHealth:
+    """Fails requests fast while a backend is known to be unreachable
+
+    After failure_threshold consecutive connection failures to a model's
+    backend, requests for it get an immediate 503 (with Retry-After) for
+    open_seconds instead of each waiting out a connect timeout. Then one
+    request is let through as a probe: success closes the circuit, failure
+    reopens it for twice as long, up to max_open_seconds. Only connection
+    failures count; errors the backend returns itself do not.
+    """
+
+    def __init__(self, fast_fail_config: Optional[Dict[str, Any]] = None):
+        self.settings = {**DEFAULT_FAST_FAIL_CONFIG, **(fast_fail_config or {})}
+        self.backends: Dict[str, BackendState] = {}
+        self.on_event: Optional[Callable[[str, str], None]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings["enabled"])
+
+    def _event(self, model: str, kind: str):
+        if self.on_event:
+            self.on_event(model, kind)
+
+    def is_open(self, model: str) -> bool:
+        state = self.backends.get(model)
+        return state is not None and state.open
+
+    def check(self, model: str) -> Optional[float]:
+        """None if a request may go to model now, else seconds until it should be retried"""
+        state = self.backends.get(model)
+        if not self.enabled or state is None or not state.open:
+            return None
+        now = time.monotonic()
+        if now < state.open_until:
+            self._event(model, "rejected")
+            return state.open_until - now
+        if now < state.probing_until:
+            # A probe is in flight; the rest wait for its outcome
+            self._event(model, "rejected")
+            return state.probing_until - now
+        state.probing_until = now + state.open_seconds
+        self._event(model, "probe")
+        return None
+
+    def success(self, model: str):
+        state = self.backends.get(model)
+        if state is None:
+            return
+        if state.open:
+            self._event(model, "closed")
+        del self.backends[model]
+
+    def failure(self, model: str):
+        if not self.enabled:
+            return
+        state = self.backends.setdefault(model, BackendState())
+        state.failures += 1
+        if state.open and time.monotonic() < state.open_until:
+            # A request sent before the circuit opened
+            return
+        if state.open:
+            state.open_seconds = min(state.open_seconds * 2, self.settings["max_open_seconds"])
+        elif state.failures >= self.settings["failure_threshold"]:
+            state.open_seconds = self.settings["open_seconds"]
+        else:
+            return
+        state.open_until = time.monotonic() + state.open_seconds
+        state.probing_until = 0.0
+        self._event(model, "opened")
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            model: {
+                "failures": state.failures,
+                "open": state.open,
+                "retry_in": max(state.open_until - now, 0.0) if state.open else None,
+            }
+            for model, state in self.backends.items()
+        }
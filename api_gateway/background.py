@@ -0,0 +1,245 @@
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+
+# Default knobs, overridable from the `background` section of model_configs.yaml
+DEFAULT_BACKGROUND_CONFIG = {
+    "enabled": True,
+    "ttl_seconds": 600,
+    "max_generations": 1000,
+    "max_bytes_per_generation": 4 * 1024 * 1024,
+    "keepalive_seconds": 15,
+}
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+def sse_error(message: str) -> bytes:
+    """Terminal SSE event telling the client the stream ended without completing"""
+    return f"event: error\ndata: {json.dumps({'error': {'message': message}})}\n\n".encode()
+
+
+def sse_error_message(raw: bytes) -> Optional[str]:
+    """The message of an sse_error() event, or None for any other event"""
+    lines = raw.splitlines()
+    if b"event: error" not in lines:
+        return None
+    data = b"".join(line[5:].strip() for line in lines if line.startswith(b"data:"))
+    try:
+        return json.loads(data)["error"]["message"]
+    except (ValueError, KeyError, TypeError):
+        return data.decode(errors="replace") or "Upstream stream failed"
+
+
+class BackgroundGeneration:
+    """A generation running detached from the client connection
+
+    Upstream SSE events are kept in order with increasing ids so a client can
+    reconnect with Last-Event-ID and pick up where it left off. When the event
+    log exceeds its byte budget the oldest events are dropped and
+    first_event_id moves forward.
+    """
+
+    def __init__(self, generation_id: str, model: str, tenant: str, endpoint: str, max_bytes: int):
+        self.id = generation_id
+        self.model = model
+        self.tenant = tenant
+        self.endpoint = endpoint
+        self.max_bytes = max_bytes
+        self.status = "in_progress"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.events: List[Tuple[int, bytes]] = []
+        self.first_event_id = 1
+        self.next_event_id = 1
+        self.bytes = 0
+        self.task: Optional[asyncio.Task] = None
+        self.changed = asyncio.Event()
+        # Assembled output for polling clients
+        self.text_parts: List[str] = []
+        self.finish_reason: Optional[str] = None
+        self.usage: Optional[Dict[str, Any]] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def append(self, data: bytes):
+        """Record one upstream SSE data payload"""
+        self.events.append((self.next_event_id, data))
+        self.next_event_id += 1
+        self.bytes += len(data)
+        while self.bytes > self.max_bytes and len(self.events) > 1:
+            _, dropped = self.events.pop(0)
+            self.bytes -= len(dropped)
+            self.first_event_id = self.events[0][0]
+        self._accumulate(data)
+        self._notify()
+
+    def _accumulate(self, data: bytes):
+        if data == b"[DONE]":
+            return
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            return
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        for choice in chunk.get("choices") or []:
+            if choice.get("index", 0) != 0:
+                continue
+            delta = choice.get("delta") or {}
+            text = delta.get("content") if "delta" in choice else choice.get("text")
+            if text:
+                self.text_parts.append(text)
+            if choice.get("finish_reason"):
+                self.finish_reason = choice["finish_reason"]
+
+    def finish(self, status: str, error: Optional[str] = None):
+        if self.finished:
+            return
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        self._notify()
+
+    def _notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def events_after(self, last_event_id: int) -> List[Tuple[int, bytes]]:
+        if not self.events or last_event_id >= self.events[-1][0]:
+            return []
+        start = max(0, last_event_id + 1 - self.first_event_id)
+        return self.events[start:]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Status document for polling clients"""
+        result = {
+            "id": self.id,
+            "object": "generation",
+            "model": self.model,
+            "status": self.status,
+            "created_at": int(self.created_at),
+            "finished_at": int(self.finished_at) if self.finished_at else None,
+            "last_event_id": self.next_event_id - 1,
+            "error": self.error,
+        }
+        text = "".join(self.text_parts)
+        if self.endpoint == "/v1/chat/completions":
+            choice = {"index": 0, "message": {"role": "assistant", "content": text}}
+            result["output"] = {"object": "chat.completion", "model": self.model}
+        else:
+            choice = {"index": 0, "text": text}
+            result["output"] = {"object": "text_completion", "model": self.model}
+        choice["finish_reason"] = self.finish_reason
+        result["output"]["choices"] = [choice]
+        result["output"]["usage"] = self.usage
+        return result
+
+
+class GenerationStore:
+    """Bounded, TTL-expiring registry of background generations"""
+
+    def __init__(self, background_config: Optional[Dict[str, Any]] = None):
+        self.settings = {**DEFAULT_BACKGROUND_CONFIG, **(background_config or {})}
+        self.generations: "OrderedDict[str, BackgroundGeneration]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings["enabled"])
+
+    def __len__(self) -> int:
+        return len(self.generations)
+
+    def expire(self):
+        """Drop finished generations past their TTL, then the oldest finished ones over the cap"""
+        cutoff = time.time() - self.settings["ttl_seconds"]
+        for generation_id in [g.id for g in self.generations.values() if g.finished and g.finished_at < cutoff]:
+            del self.generations[generation_id]
+        while len(self.generations) >= self.settings["max_generations"]:
+            oldest = next((g for g in self.generations.values() if g.finished), None)
+            if oldest is None:
+                return False
+            del self.generations[oldest.id]
+        return True
+
+    def create(self, model: str, tenant: str, endpoint: str) -> Optional[BackgroundGeneration]:
+        """Register a new generation, or None if the store is full of running ones"""
+        if not self.expire():
+            return None
+        generation = BackgroundGeneration(
+            f"gen_{uuid.uuid4().hex}", model, tenant, endpoint, self.settings["max_bytes_per_generation"]
+        )
+        self.generations[generation.id] = generation
+        return generation
+
+    def get(self, generation_id: str, tenant: Optional[str] = None) -> Optional[BackgroundGeneration]:
+        self.expire()
+        generation = self.generations.get(generation_id)
+        if generation is None or (tenant is not None and generation.tenant != tenant):
+            return None
+        return generation
+
+    def start(self, generation: BackgroundGeneration, chunks: AsyncIterator[bytes]):
+        """Consume an upstream SSE byte stream in a task that outlives the client"""
+        generation.task = asyncio.create_task(self._consume(generation, chunks))
+
+    async def _consume(self, generation: BackgroundGeneration, chunks: AsyncIterator[bytes]):
+        buffer = b""
+        failure = None
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                while b"\n\n" in buffer:
+                    raw, buffer = buffer.split(b"\n\n", 1)
+                    # The stream ended early (e.g. past its deadline) and said so
+                    failure = sse_error_message(raw) or failure
+                    if failure is not None:
+                        continue
+                    for line in raw.splitlines():
+                        if line.startswith(b"data:"):
+                            generation.append(line[5:].strip())
+            if failure is not None:
+                generation.finish("failed", failure)
+            elif generation.next_event_id == 1:
+                generation.finish("failed", "Upstream returned no events")
+            else:
+                generation.finish("completed")
+        except asyncio.CancelledError:
+            generation.finish("cancelled")
+            raise
+        except Exception as e:
+            generation.finish("failed", str(e))
+
+    def cancel(self, generation: BackgroundGeneration):
+        if generation.task is not None and not generation.task.done():
+            generation.task.cancel()
+        generation.finish("cancelled")
+
+    async def subscribe(self, generation: BackgroundGeneration, last_event_id: int = 0) -> AsyncIterator[bytes]:
+        """SSE stream of events after last_event_id, following the generation until it ends"""
+        yield b"retry: 1000\n\n"
+        while True:
+            changed = generation.changed
+            for event_id, data in generation.events_after(last_event_id):
+                last_event_id = event_id
+                yield b"id: %d\ndata: %s\n\n" % (event_id, data)
+            if generation.finished:
+                if generation.status != "completed":
+                    yield sse_error(generation.error or generation.status)
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), self.settings["keepalive_seconds"])
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+
+    async def shutdown(self):
+        tasks = [g.task for g in self.generations.values() if g.task is not None and not g.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,381 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Default knobs, overridable from the `batch` section of model_configs.yaml
+DEFAULT_BATCH_CONFIG = {
+    "enabled": True,
+    "storage_dir": "/app/data/batches",
+    "concurrency": 4,
+    "idle_queue_depth": 0,
+    "poll_interval": 1.0,
+    "checkpoint_every": 20,
+    "max_file_bytes": 200 * 1024 * 1024,
+}
+
+SUPPORTED_ENDPOINTS = ("/v1/completions", "/v1/chat/completions")
+ACTIVE_STATUSES = ("validating", "in_progress", "finalizing", "cancelling")
+
+# (url, body) -> (status_code, response body)
+Dispatcher = Callable[[str, Dict[str, Any]], Awaitable[Tuple[int, Dict[str, Any]]]]
+
+
+class BatchError(Exception):
+    """Invalid batch or file request; mapped to a 4xx by the gateway"""
+
+    def __init__(self, status_code: int, message: str):
+        self.status_code = status_code
+        super().__init__(message)
+
+
+def _write_json_atomic(path: str, payload: Dict[str, Any]):
+    """Write JSON via a temp file and rename so a crash never leaves half a record"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _truncate_partial_line(path: str):
+    """Drop a trailing line that was cut short by a crash"""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+class BatchStore:
+    """Uploaded JSONL files and batch records on local disk"""
+
+    def __init__(self, storage_dir: str):
+        self.files_dir = os.path.join(storage_dir, "files")
+        self.batches_dir = os.path.join(storage_dir, "batches")
+
+    def open(self):
+        """Create the storage directories (at gateway startup)"""
+        os.makedirs(self.files_dir, exist_ok=True)
+        os.makedirs(self.batches_dir, exist_ok=True)
+
+    # Files
+
+    def file_path(self, file_id: str) -> str:
+        return os.path.join(self.files_dir, f"{file_id}.jsonl")
+
+    def _file_meta_path(self, file_id: str) -> str:
+        return os.path.join(self.files_dir, f"{file_id}.json")
+
+    def create_file(self, content: bytes, filename: str, purpose: str) -> Dict[str, Any]:
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        with open(self.file_path(file_id), "wb") as f:
+            f.write(content)
+        return self.register_file(file_id, filename, purpose)
+
+    def register_file(self, file_id: str, filename: str, purpose: str) -> Dict[str, Any]:
+        path = self.file_path(file_id)
+        record = {
+            "id": file_id,
+            "object": "file",
+            "bytes": os.path.getsize(path) if os.path.exists(path) else 0,
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+        }
+        _write_json_atomic(self._file_meta_path(file_id), record)
+        return record
+
+    def get_file(self, file_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._file_meta_path(file_id)) as f:
+                record = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if os.path.exists(self.file_path(file_id)):
+            record["bytes"] = os.path.getsize(self.file_path(file_id))
+        return record
+
+    # Batches
+
+    def _batch_path(self, batch_id: str) -> str:
+        return os.path.join(self.batches_dir, f"{batch_id}.json")
+
+    def save_batch(self, batch: Dict[str, Any]):
+        _write_json_atomic(self._batch_path(batch["id"]), batch)
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._batch_path(batch_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def list_batches(self) -> List[Dict[str, Any]]:
+        batches = []
+        for name in os.listdir(self.batches_dir):
+            if name.endswith(".json"):
+                batch = self.get_batch(name[:-5])
+                if batch:
+                    batches.append(batch)
+        return sorted(batches, key=lambda b: b["created_at"], reverse=True)
+
+
+class BatchRunner:
+    """Works through batch input files with bounded concurrency on idle capacity
+
+    Each result is appended to the batch's output (or error) JSONL as soon as
+    it finishes; those files double as the checkpoint, so a restarted gateway
+    skips every custom_id already written and carries on. File reads, writes
+    and fsyncs run in worker threads, off the event loop. A batch whose run
+    raises ends as "failed" with the error in its errors list.
+    """
+
+    def __init__(self, batch_config: Optional[Dict[str, Any]], dispatch: Dispatcher,
+                 interactive_depth: Callable[[], int]):
+        self.settings = {**DEFAULT_BATCH_CONFIG, **(batch_config or {})}
+        self.store = BatchStore(self.settings["storage_dir"])
+        self.dispatch = dispatch
+        self.interactive_depth = interactive_depth
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.cancelling: Set[str] = set()
+        self.on_result: Optional[Callable[[str], None]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings["enabled"])
+
+    def validate_input(self, file_id: str, endpoint: str) -> int:
+        """Check every line of an input file; returns the request count"""
+        if endpoint not in SUPPORTED_ENDPOINTS:
+            raise BatchError(400, f"Unsupported endpoint {endpoint}")
+        if self.store.get_file(file_id) is None:
+            raise BatchError(404, f"File {file_id} not found")
+
+        seen: Set[str] = set()
+        with open(self.store.file_path(file_id)) as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    raise BatchError(400, f"Line {line_no} is not valid JSON")
+                custom_id = item.get("custom_id")
+                if not custom_id or custom_id in seen:
+                    raise BatchError(400, f"Line {line_no} has a missing or duplicate custom_id")
+                if item.get("url", endpoint) != endpoint:
+                    raise BatchError(400, f"Line {line_no} targets {item.get('url')}, batch endpoint is {endpoint}")
+                if not isinstance(item.get("body"), dict):
+                    raise BatchError(400, f"Line {line_no} has no request body")
+                seen.add(custom_id)
+        if not seen:
+            raise BatchError(400, "Input file is empty")
+        return len(seen)
+
+    async def create_batch(self, input_file_id: str, endpoint: str, completion_window: str = "24h",
+                           metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        batch = await asyncio.to_thread(self._new_batch, input_file_id, endpoint, completion_window, metadata)
+        self.start(batch)
+        return batch
+
+    def _new_batch(self, input_file_id: str, endpoint: str, completion_window: str,
+                   metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        total = self.validate_input(input_file_id, endpoint)
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        output_file = self.store.register_file(f"file-{uuid.uuid4().hex[:24]}", f"{batch_id}_output.jsonl", "batch_output")
+        error_file = self.store.register_file(f"file-{uuid.uuid4().hex[:24]}", f"{batch_id}_error.jsonl", "batch_output")
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": endpoint,
+            "errors": None,
+            "input_file_id": input_file_id,
+            "completion_window": completion_window,
+            "status": "in_progress",
+            "output_file_id": output_file["id"],
+            "error_file_id": error_file["id"],
+            "created_at": int(time.time()),
+            "in_progress_at": int(time.time()),
+            "completed_at": None,
+            "failed_at": None,
+            "cancelled_at": None,
+            "request_counts": {"total": total, "completed": 0, "failed": 0},
+            "metadata": metadata or {},
+        }
+        self.store.save_batch(batch)
+        return batch
+
+    async def cancel_batch(self, batch_id: str) -> Dict[str, Any]:
+        batch = await asyncio.to_thread(self.store.get_batch, batch_id)
+        if batch is None:
+            raise BatchError(404, f"Batch {batch_id} not found")
+        if batch["status"] in ACTIVE_STATUSES:
+            batch["status"] = "cancelling"
+            await asyncio.to_thread(self.store.save_batch, batch)
+            self.cancelling.add(batch_id)
+            task = self.tasks.get(batch_id)
+            if task is None or task.done():
+                await asyncio.to_thread(self._finish, batch, "cancelled")
+        return batch
+
+    def start(self, batch: Dict[str, Any]):
+        task = self.tasks.get(batch["id"])
+        if task is None or task.done():
+            self.tasks[batch["id"]] = asyncio.create_task(self._run(batch["id"]))
+
+    async def resume(self) -> int:
+        """Restart every batch that was still running when the gateway stopped"""
+        resumed = 0
+        for batch in await asyncio.to_thread(self.store.list_batches):
+            if batch["status"] == "cancelling":
+                await asyncio.to_thread(self._finish, batch, "cancelled")
+            elif batch["status"] in ACTIVE_STATUSES:
+                self.start(batch)
+                resumed += 1
+        return resumed
+
+    async def shutdown(self):
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+
+    def _completed_ids(self, batch: Dict[str, Any]) -> Set[str]:
+        done = set()
+        for file_id in (batch["output_file_id"], batch["error_file_id"]):
+            path = self.store.file_path(file_id)
+            _truncate_partial_line(path)
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                for line in f:
+                    done.add(json.loads(line)["custom_id"])
+        return done
+
+    async def _wait_for_idle(self):
+        while self.interactive_depth() > self.settings["idle_queue_depth"]:
+            await asyncio.sleep(self.settings["poll_interval"])
+
+    async def _run(self, batch_id: str):
+        try:
+            await self._process(batch_id)
+        except Exception as e:
+            logger.error(f"Batch {batch_id} failed: {e}")
+            batch = await asyncio.to_thread(self.store.get_batch, batch_id)
+            if batch is not None:
+                batch["errors"] = {"object": "list", "data": [{"code": "batch_failed", "message": str(e)}]}
+                await asyncio.to_thread(self._finish, batch, "failed")
+        finally:
+            self.cancelling.discard(batch_id)
+
+    async def _process(self, batch_id: str):
+        batch = await asyncio.to_thread(self.store.get_batch, batch_id)
+        if batch is None:
+            raise BatchError(404, f"Batch {batch_id} not found")
+        done = await asyncio.to_thread(self._completed_ids, batch)
+        counts = batch["request_counts"]
+        write_lock = asyncio.Lock()
+        slots = asyncio.Semaphore(self.settings["concurrency"])
+        pending: Set[asyncio.Task] = set()
+        output = await asyncio.to_thread(open, self.store.file_path(batch["output_file_id"]), "a")
+        errors = await asyncio.to_thread(open, self.store.file_path(batch["error_file_id"]), "a")
+        since_checkpoint = 0
+
+        async def execute(item: Dict[str, Any]):
+            nonlocal since_checkpoint
+            try:
+                status_code, body = await self.dispatch(batch["endpoint"], item["body"])
+            except Exception as e:
+                status_code, body = 500, {"error": {"message": str(e)}}
+            finally:
+                slots.release()
+            ok = 200 <= status_code < 300
+            line = {
+                "id": f"batch_req_{uuid.uuid4().hex[:24]}",
+                "custom_id": item["custom_id"],
+                "response": {"status_code": status_code, "body": body},
+                "error": None if ok else {"code": str(status_code), "message": json.dumps(body)[:500]},
+            }
+            async with write_lock:
+                counts["completed" if ok else "failed"] += 1
+                since_checkpoint += 1
+                checkpoint = since_checkpoint >= self.settings["checkpoint_every"]
+                if checkpoint:
+                    since_checkpoint = 0
+                await asyncio.to_thread(
+                    self._append, output if ok else errors, json.dumps(line) + "\n",
+                    dict(counts) if checkpoint else None, batch_id
+                )
+            if self.on_result:
+                self.on_result("completed" if ok else "failed")
+
+        try:
+            counts["completed"], counts["failed"] = await asyncio.to_thread(self._count_lines, batch)
+            with await asyncio.to_thread(open, self.store.file_path(batch["input_file_id"])) as f:
+                while True:
+                    line = await asyncio.to_thread(f.readline)
+                    if not line:
+                        break
+                    if not line.strip():
+                        continue
+                    item = json.loads(line)
+                    if item["custom_id"] in done:
+                        continue
+                    if batch_id in self.cancelling:
+                        break
+                    await self._wait_for_idle()
+                    await slots.acquire()
+                    task = asyncio.create_task(execute(item))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+        finally:
+            # On shutdown, in-flight lines are dropped and re-run after the restart
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            output.close()
+            errors.close()
+
+        batch = await asyncio.to_thread(self.store.get_batch, batch_id)
+        batch["request_counts"] = counts
+        await asyncio.to_thread(self._finish, batch, "cancelled" if batch_id in self.cancelling else "completed")
+
+    def _append(self, target, line: str, checkpoint: Optional[Dict[str, int]], batch_id: str):
+        """Append one result line; every checkpoint_every lines also fsync and save the counts"""
+        target.write(line)
+        target.flush()
+        if checkpoint is not None:
+            os.fsync(target.fileno())
+            self._checkpoint(batch_id, checkpoint)
+
+    def _count_lines(self, batch: Dict[str, Any]) -> Tuple[int, int]:
+        counts = []
+        for file_id in (batch["output_file_id"], batch["error_file_id"]):
+            path = self.store.file_path(file_id)
+            if not os.path.exists(path):
+                counts.append(0)
+                continue
+            with open(path) as f:
+                counts.append(sum(1 for _ in f))
+        return counts[0], counts[1]
+
+    def _checkpoint(self, batch_id: str, counts: Dict[str, int]):
+        batch = self.store.get_batch(batch_id)
+        if batch is not None:
+            batch["request_counts"] = dict(counts)
+            self.store.save_batch(batch)
+
+    def _finish(self, batch: Dict[str, Any], status: str):
+        batch["status"] = status
+        batch[f"{status}_at"] = int(time.time())
+        self.store.save_batch(batch)
+        logger.info(f"Batch {batch['id']} {status}: {batch['request_counts']}")
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackendError(Exception):
+    """The shared cache backend did not answer; callers degrade instead of failing the request"""
+
+
+class LocalCache:
+    """In-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _live(self, key: str) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self._live(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl: int):
+        self.entries[key] = (value, time.monotonic() + ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def add(self, key: str, value: str, ttl: int) -> bool:
+        """Set only if the key is absent; returns whether it was stored"""
+        if self._live(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def delete(self, key: str):
+        self.entries.pop(key, None)
+
+
+class RedisCache:
+    """Redis-backed cache with the same interface as LocalCache
+
+    Calls time out after socket_timeout seconds; any failure to talk to
+    Redis is raised as CacheBackendError.
+    """
+
+    def __init__(self, host: str, port: int, socket_timeout: float = 2.0, socket_connect_timeout: float = 2.0,
+                 **kwargs):
+        import redis
+        import redis.asyncio as aioredis
+        self.client = aioredis.Redis(
+            host=host, port=port, decode_responses=True,
+            socket_timeout=socket_timeout, socket_connect_timeout=socket_connect_timeout, **kwargs
+        )
+        self.errors = (redis.RedisError, OSError, asyncio.TimeoutError)
+
+    async def _call(self, operation):
+        try:
+            return await operation
+        except self.errors as e:
+            raise CacheBackendError(f"Redis: {e}") from e
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._call(self.client.get(key))
+
+    async def set(self, key: str, value: str, ttl: int):
+        await self._call(self.client.set(key, value, ex=ttl))
+
+    async def add(self, key: str, value: str, ttl: int) -> bool:
+        return bool(await self._call(self.client.set(key, value, ex=ttl, nx=True)))
+
+    async def delete(self, key: str):
+        await self._call(self.client.delete(key))
+
+
+class FallbackCache:
+    """A shared cache backend that falls back to a local one while it is unreachable
+
+    After a CacheBackendError the primary is skipped for retry_interval
+    seconds, so an outage costs one timeout rather than one per call.
+    Entries written meanwhile stay local to this instance.
+    """
+
+    def __init__(self, primary, fallback, retry_interval: float = 30.0):
+        self.primary = primary
+        self.fallback = fallback
+        self.retry_interval = retry_interval
+        self.down_until = 0.0
+
+    async def _call(self, operation: str, *args):
+        if time.monotonic() >= self.down_until:
+            try:
+                return await getattr(self.primary, operation)(*args)
+            except CacheBackendError as e:
+                logger.warning(f"Shared cache unavailable, using local entries for {self.retry_interval:g}s: {e}")
+                self.down_until = time.monotonic() + self.retry_interval
+        return await getattr(self.fallback, operation)(*args)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._call("get", key)
+
+    async def set(self, key: str, value: str, ttl: int):
+        await self._call("set", key, value, ttl)
+
+    async def add(self, key: str, value: str, ttl: int) -> bool:
+        return await self._call("add", key, value, ttl)
+
+    async def delete(self, key: str):
+        await self._call("delete", key)
@@ -0,0 +1,405 @@
+import bisect
+import hashlib
+import logging
+import math
+import time
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Default knobs, overridable from the `caching.sharding` section of model_configs.yaml
+DEFAULT_SHARDING_CONFIG = {
+    "virtual_nodes": 160,
+    "retry_interval": 10.0,
+}
+
+# Byte-budget bookkeeping keys, next to the cached values
+INDEX_KEY = "cache:index"
+EXPIRY_KEY = "cache:expiry"
+SIZES_KEY = "cache:sizes"
+BYTES_KEY = "cache:bytes"
+BOOKKEEPING_KEYS = [INDEX_KEY, EXPIRY_KEY, SIZES_KEY, BYTES_KEY]
+
+# Store one value and evict until the byte total is back under budget. Entries
+# past their own expiry (Redis has dropped them already) are forgotten first,
+# then the least recently used are deleted. Returns {total bytes, evicted entries}.
+STORE_SCRIPT = """
+local key, value, ttl, now, budget = ARGV[1], ARGV[2], tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5])
+local old = tonumber(redis.call('HGET', KEYS[3], key) or '0')
+redis.call('SET', key, value, 'EX', ttl)
+redis.call('HSET', KEYS[3], key, #value)
+redis.call('ZADD', KEYS[1], now, key)
+redis.call('ZADD', KEYS[2], now + ttl, key)
+local total = redis.call('INCRBY', KEYS[4], #value - old)
+local evicted = 0
+local function drop(victim)
+  local size = tonumber(redis.call('HGET', KEYS[3], victim) or '0')
+  redis.call('DEL', victim)
+  redis.call('ZREM', KEYS[1], victim)
+  redis.call('ZREM', KEYS[2], victim)
+  redis.call('HDEL', KEYS[3], victim)
+  total = redis.call('DECRBY', KEYS[4], size)
+  evicted = evicted + 1
+end
+for _, victim in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now, 'LIMIT', 0, 100)) do
+  drop(victim)
+end
+while budget > 0 and total > budget do
+  local oldest = redis.call('ZRANGE', KEYS[1], 0, 0)
+  if #oldest == 0 then break end
+  drop(oldest[1])
+end
+return {total, evicted}
+"""
+
+# Read keys, refreshing the last access of those present and forgetting the
+# bookkeeping of those Redis has expired or evicted on its own. Returns
+# {total bytes, value1, pttl1, value2, pttl2, ...} with a nil value for misses.
+LOOKUP_SCRIPT = """
+local now = tonumber(ARGV[1])
+local result = {0}
+for i = 2, #ARGV do
+  local key = ARGV[i]
+  local value = redis.call('GET', key)
+  if value then
+    redis.call('ZADD', KEYS[1], 'XX', now, key)
+    result[#result + 1] = value
+    result[#result + 1] = redis.call('PTTL', key)
+  else
+    local size = redis.call('HGET', KEYS[3], key)
+    if size then
+      redis.call('ZREM', KEYS[1], key)
+      redis.call('ZREM', KEYS[2], key)
+      redis.call('HDEL', KEYS[3], key)
+      redis.call('DECRBY', KEYS[4], size)
+    end
+    result[#result + 1] = false
+    result[#result + 1] = -2
+  end
+end
+result[1] = tonumber(redis.call('GET', KEYS[4]) or '0')
+return result
+"""
+
+
+class RedisStore:
+    """Byte values in one Redis instance, optionally under a byte budget
+
+    With max_bytes set, a small index (last access, expiry time and stored
+    size per key) is kept alongside, and every put runs one server-side
+    script that adds the value and evicts expired, then least recently used,
+    entries until the stored bytes are back under budget. Reads run a script
+    too, which refreshes the entry's last access and drops the bookkeeping
+    of entries Redis no longer has, in the same round trip. Redis' own maxmemory policy still
+    applies on top; max_bytes lets the cache share an instance and be sized
+    in bytes rather than entries.
+    """
+
+    name = "redis"
+
+    def __init__(self, client, max_bytes: int = 0):
+        self.client = client
+        self.max_bytes = int(max_bytes or 0)
+        self.stored_bytes = 0
+        self.store_script = client.register_script(STORE_SCRIPT)
+        self.lookup_script = client.register_script(LOOKUP_SCRIPT)
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """(value, seconds to live) or None"""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Tuple[bytes, float]]:
+        """(value, seconds to live) for each key that is present, in one round trip"""
+        if not keys:
+            return {}
+        if self.max_bytes:
+            results = self.lookup_script(keys=BOOKKEEPING_KEYS, args=[time.time(), *keys])
+            self.stored_bytes = int(results[0])
+            results = results[1:]
+        else:
+            pipe = self.client.pipeline(transaction=False)
+            for key in keys:
+                pipe.get(key)
+                pipe.pttl(key)
+            results = pipe.execute()
+        found = {}
+        for i, key in enumerate(keys):
+            value, pttl = results[2 * i], results[2 * i + 1]
+            if value is not None:
+                found[key] = (value, pttl / 1000 if pttl > 0 else math.inf)
+        return found
+
+    def put(self, key: str, value: bytes, ttl: float) -> int:
+        """Store value for ttl seconds; returns the number of entries evicted to make room"""
+        ttl = max(int(math.ceil(ttl)), 1)
+        if not self.max_bytes:
+            self.client.set(key, value, ex=ttl)
+            return 0
+        total, evicted = self.store_script(
+            keys=BOOKKEEPING_KEYS,
+            args=[key, value, ttl, time.time(), self.max_bytes],
+        )
+        self.stored_bytes = int(total)
+        return int(evicted)
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """Set only if absent (a lock); returns whether it was stored"""
+        return bool(self.client.set(key, value, nx=True, ex=max(int(ttl), 1)))
+
+    def delete(self, key: str):
+        self.client.delete(key)
+        if self.max_bytes:
+            # Looking up the now missing key releases its bytes
+            self.get_many([key])
+
+    def get_meta(self, name: str) -> Optional[bytes]:
+        return self.client.get(name)
+
+    def set_meta(self, name: str, value: bytes):
+        self.client.set(name, value)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"max_bytes": self.max_bytes, "stored_bytes": self.stored_bytes if self.max_bytes else None}
+
+
+class CacheUnavailable(Exception):
+    """No node of a sharded cache could be reached"""
+
+
+def ring_hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash ring: each node sits at virtual_nodes * weight points
+
+    A key belongs to the first node clockwise from its hash, so adding or
+    removing a node only moves the keys between it and its neighbours.
+    """
+
+    def __init__(self, weights: Dict[str, float], virtual_nodes: int):
+        points = sorted(
+            (ring_hash(f"{name}#{i}"), name)
+            for name, weight in weights.items()
+            for i in range(max(int(virtual_nodes * weight), 1))
+        )
+        self.hashes = [point for point, _ in points]
+        self.owners = [name for _, name in points]
+        self.size = len(weights)
+
+    def nodes(self, key: str) -> Iterable[str]:
+        """Distinct nodes in ring order from key: the owner first, then its failover successors"""
+        start = bisect.bisect(self.hashes, ring_hash(key))
+        seen = set()
+        for i in range(len(self.owners)):
+            name = self.owners[(start + i) % len(self.owners)]
+            if name not in seen:
+                seen.add(name)
+                yield name
+                if len(seen) == self.size:
+                    return
+
+
+class ShardedRedisStore:
+    """Byte values spread over several Redis nodes by a consistent-hash ring
+
+    Each node is a RedisStore with its weighted share of max_bytes. A node
+    that fails is skipped for retry_interval seconds and its keys go to the
+    next node on the ring (starting cold there), then return once it
+    answers again. Multi-key reads are grouped by node and sent as one
+    pipeline per node. Raises CacheUnavailable when no node answers, so a
+    TieredStore falls through to the tier below.
+    """
+
+    name = "redis"
+
+    def __init__(self, clients: Dict[str, Any], max_bytes: int = 0,
+                 sharding_config: Optional[Dict[str, Any]] = None, weights: Optional[Dict[str, float]] = None):
+        self.settings = {**DEFAULT_SHARDING_CONFIG, **(sharding_config or {})}
+        weights = {name: float((weights or {}).get(name, 1.0)) for name in clients}
+        total = sum(weights.values())
+        self.shards = {
+            name: RedisStore(client, int(max_bytes or 0) * weights[name] / total)
+            for name, client in clients.items()
+        }
+        self.ring = HashRing(weights, int(self.settings["virtual_nodes"]))
+        self.down_until: Dict[str, float] = {}
+        self.on_node_error: Optional[Callable[[str, Exception], None]] = None
+
+    @property
+    def stored_bytes(self) -> int:
+        return sum(shard.stored_bytes for shard in self.shards.values())
+
+    def up(self, name: str) -> bool:
+        return self.down_until.get(name, 0) <= time.monotonic()
+
+    def mark_down(self, name: str, e: Optional[Exception] = None):
+        if self.up(name):
+            logger.warning(f"Cache node {name} failed, moving its keys along the ring: {e}")
+        self.down_until[name] = time.monotonic() + self.settings["retry_interval"]
+        if e is not None and self.on_node_error:
+            self.on_node_error(name, e)
+
+    def _answered(self, name: str):
+        if self.down_until.pop(name, None) is not None:
+            logger.info(f"Cache node {name} is back")
+
+    def node(self, key: str) -> str:
+        """The first node on the ring from key that is not marked down"""
+        for name in self.ring.nodes(key):
+            if self.up(name):
+                return name
+        raise CacheUnavailable("No cache node reachable")
+
+    def _call(self, key: str, operation: Callable[[RedisStore], Any]) -> Any:
+        while True:
+            name = self.node(key)
+            try:
+                result = operation(self.shards[name])
+            except Exception as e:
+                self.mark_down(name, e)
+                continue
+            self._answered(name)
+            return result
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        return self._call(key, lambda shard: shard.get(key))
+
+    def get_many(self, keys: List[str]) -> Dict[str, Tuple[bytes, float]]:
+        found: Dict[str, Tuple[bytes, float]] = {}
+        pending = list(keys)
+        while pending:
+            groups: Dict[str, List[str]] = {}
+            for key in pending:
+                groups.setdefault(self.node(key), []).append(key)
+            pending = []
+            for name, group in groups.items():
+                try:
+                    found.update(self.shards[name].get_many(group))
+                except Exception as e:
+                    # Regrouped onto the next nodes on the ring
+                    self.mark_down(name, e)
+                    pending.extend(group)
+                    continue
+                self._answered(name)
+        return found
+
+    def put(self, key: str, value: bytes, ttl: float) -> int:
+        return self._call(key, lambda shard: shard.put(key, value, ttl))
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        return self._call(key, lambda shard: shard.add(key, value, ttl))
+
+    def delete(self, key: str):
+        self._call(key, lambda shard: shard.delete(key))
+
+    def get_meta(self, name: str) -> Optional[bytes]:
+        return self._call(name, lambda shard: shard.get_meta(name))
+
+    def set_meta(self, name: str, value: bytes):
+        self._call(name, lambda shard: shard.set_meta(name, value))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "nodes": {
+                name: {"up": self.up(name), **shard.stats()} for name, shard in self.shards.items()
+            }
+        }
+
+
+class TieredStore:
+    """Reads fall through the tiers in order and promote hits upward; writes go to every tier
+
+    A tier that raises is skipped (and reported through on_error) rather
+    than failing the request, so a Redis outage degrades to the tiers below.
+    Locks live in the first tier that accepts them.
+    """
+
+    def __init__(self, tiers: List[Any]):
+        self.tiers = tiers
+        self.on_error: Optional[Callable[[str, Exception], None]] = None
+        self.on_evict: Optional[Callable[[str, int], None]] = None
+
+    def _failed(self, tier, e: Exception):
+        logger.debug(f"Cache tier {tier.name} failed: {e}")
+        if self.on_error:
+            self.on_error(tier.name, e)
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        for depth, tier in enumerate(self.tiers):
+            try:
+                found = tier.get(key)
+            except Exception as e:
+                self._failed(tier, e)
+                continue
+            if found is not None:
+                if depth and found[1] != math.inf:
+                    self._put(self.tiers[:depth], key, found[0], found[1])
+                return found
+        return None
+
+    def get_many(self, keys: List[str]) -> Dict[str, Tuple[bytes, float]]:
+        found: Dict[str, Tuple[bytes, float]] = {}
+        for depth, tier in enumerate(self.tiers):
+            missing = [key for key in keys if key not in found]
+            if not missing:
+                break
+            try:
+                hits = tier.get_many(missing)
+            except Exception as e:
+                self._failed(tier, e)
+                continue
+            for key, (value, ttl) in hits.items():
+                if depth and ttl != math.inf:
+                    self._put(self.tiers[:depth], key, value, ttl)
+            found.update(hits)
+        return found
+
+    def put(self, key: str, value: bytes, ttl: float):
+        self._put(self.tiers, key, value, ttl)
+
+    def _put(self, tiers: List[Any], key: str, value: bytes, ttl: float):
+        for tier in tiers:
+            try:
+                evicted = tier.put(key, value, ttl)
+            except Exception as e:
+                self._failed(tier, e)
+                continue
+            if self.on_evict:
+                self.on_evict(tier.name, evicted)
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        for tier in self.tiers:
+            try:
+                return tier.add(key, value, ttl)
+            except Exception as e:
+                self._failed(tier, e)
+        return False
+
+    def delete(self, key: str):
+        for tier in self.tiers:
+            try:
+                tier.delete(key)
+            except Exception as e:
+                self._failed(tier, e)
+
+    def get_meta(self, name: str) -> Optional[bytes]:
+        for tier in self.tiers:
+            try:
+                value = tier.get_meta(name)
+            except Exception as e:
+                self._failed(tier, e)
+                continue
+            if value is not None:
+                return value
+        return None
+
+    def set_meta(self, name: str, value: bytes):
+        for tier in self.tiers:
+            try:
+                tier.set_meta(name, value)
+            except Exception as e:
+                self._failed(tier, e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {tier.name: tier.stats() for tier in self.tiers}
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+import zlib
+from typing import Dict, Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Default knobs, overridable from the `caching.codec` section of model_configs.yaml
+DEFAULT_CODEC_CONFIG = {
+    "compression": "auto",
+    "level": 3,
+    "min_size": 256,
+    "dictionary": True,
+    "dictionary_size": 32768,
+    "train_samples": 200,
+}
+
+# Stored value: FORMAT_VERSION, compression id, 4-byte dictionary id (0 = none), payload
+FORMAT_VERSION = 1
+HEADER_SIZE = 6
+COMPRESSION_IDS = {"none": 0, "zlib": 1, "zstd": 2, "lz4": 3}
+
+# zlib only looks back 32 KiB, so a longer preset dictionary is wasted
+ZLIB_MAX_DICTIONARY = 32768
+
+
+def available_compression() -> List[str]:
+    """Compression libraries importable here, best first"""
+    names = []
+    try:
+        import zstandard  # noqa: F401
+        names.append("zstd")
+    except ImportError:
+        pass
+    try:
+        import lz4.block  # noqa: F401
+        names.append("lz4")
+    except ImportError:
+        pass
+    return names + ["zlib", "none"]
+
+
+def dictionary_id(data: bytes) -> int:
+    return int.from_bytes(hashlib.sha256(data).digest()[:4], "big") or 1
+
+
+class CodecError(Exception):
+    """A stored value that cannot be decoded here"""
+
+
+class CacheCodec:
+    """Compact, compressed encoding for cached responses
+
+    Responses are serialized as compact UTF-8 JSON and compressed with zstd,
+    lz4 or zlib (`compression: auto` picks the best one installed). Small
+    completions compress poorly on their own, so the first train_samples
+    encoded responses are used to build a shared dictionary (a trained zstd
+    dictionary, or a preset dictionary of sample content for lz4/zlib) that
+    later values are compressed against. Every value carries its dictionary
+    id; dictionaries are published through on_dictionary and fetched back
+    through load_dictionary, so instances sharing a cache can read each
+    other's entries. Values stored before the codec (plain JSON) still decode.
+    Safe to call from several threads: zstd (de)compressors are per thread and
+    exactly one caller trains the dictionary.
+    """
+
+    def __init__(self, codec_config: Optional[Dict[str, Any]] = None):
+        self.settings = {**DEFAULT_CODEC_CONFIG, **(codec_config or {})}
+        available = available_compression()
+        compression = self.settings["compression"]
+        if compression == "auto":
+            compression = available[0]
+        elif compression not in available:
+            logger.warning(f"Cache compression {compression} is not installed, using {available[0]}")
+            compression = available[0]
+        self.compression = compression
+        self.dictionaries: Dict[int, bytes] = {}
+        self.dictionary_id = 0
+        self.samples: List[bytes] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.load_dictionary: Optional[Callable[[int], Optional[bytes]]] = None
+        self.on_dictionary: Optional[Callable[[int, bytes], None]] = None
+        self.on_encode: Optional[Callable[[int, int, float], None]] = None
+        self.on_decode: Optional[Callable[[float], None]] = None
+
+    @property
+    def training(self) -> bool:
+        return bool(self.settings["dictionary"]) and self.dictionary_id == 0 and self.compression != "none"
+
+    def use_dictionary(self, data: bytes) -> int:
+        """Register a dictionary and compress new values against it"""
+        self.dictionary_id = self.add_dictionary(data)
+        self.samples = []
+        return self.dictionary_id
+
+    def add_dictionary(self, data: bytes) -> int:
+        ident = dictionary_id(data)
+        self.dictionaries[ident] = data
+        return ident
+
+    def encode(self, value: Any) -> bytes:
+        started = time.perf_counter()
+        raw = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+        if self.training:
+            self._sample(raw)
+        compression, ident, payload = "none", 0, raw
+        if self.compression != "none" and len(raw) >= self.settings["min_size"]:
+            ident = self.dictionary_id
+            compressed = self._compress(raw, ident)
+            if len(compressed) < len(raw):
+                compression, payload = self.compression, compressed
+            else:
+                ident = 0
+        stored = bytes((FORMAT_VERSION, COMPRESSION_IDS[compression])) + ident.to_bytes(4, "big") + payload
+        if self.on_encode:
+            self.on_encode(len(raw), len(stored), time.perf_counter() - started)
+        return stored
+
+    def decode(self, stored: bytes) -> Any:
+        started = time.perf_counter()
+        if stored[:1] in (b"{", b"["):
+            value = json.loads(stored)
+        else:
+            if len(stored) < HEADER_SIZE or stored[0] != FORMAT_VERSION:
+                raise CodecError("unknown cache value format")
+            compression = stored[1]
+            ident = int.from_bytes(stored[2:HEADER_SIZE], "big")
+            value = json.loads(self._decompress(stored[HEADER_SIZE:], compression, ident))
+        if self.on_decode:
+            self.on_decode(time.perf_counter() - started)
+        return value
+
+    def _dictionary(self, ident: int) -> Optional[bytes]:
+        if ident == 0:
+            return None
+        if ident not in self.dictionaries and self.load_dictionary:
+            data = self.load_dictionary(ident)
+            if data:
+                self.add_dictionary(data)
+        if ident not in self.dictionaries:
+            raise CodecError(f"dictionary {ident:08x} is not available")
+        return self.dictionaries[ident]
+
+    def _compress(self, raw: bytes, ident: int) -> bytes:
+        dictionary = self._dictionary(ident)
+        level = int(self.settings["level"])
+        if self.compression == "zstd":
+            return self._zstd_codec(ident, dictionary).compress(raw)
+        if self.compression == "lz4":
+            import lz4.block
+            return lz4.block.compress(raw, dict=dictionary or b"")
+        compressor = zlib.compressobj(level, zdict=dictionary) if dictionary else zlib.compressobj(level)
+        return compressor.compress(raw) + compressor.flush()
+
+    def _decompress(self, payload: bytes, compression: int, ident: int) -> bytes:
+        dictionary = self._dictionary(ident)
+        try:
+            if compression == COMPRESSION_IDS["none"]:
+                return payload
+            if compression == COMPRESSION_IDS["zstd"]:
+                return self._zstd_codec(ident, dictionary, decompress=True).decompress(payload)
+            if compression == COMPRESSION_IDS["lz4"]:
+                import lz4.block
+                return lz4.block.decompress(payload, dict=dictionary or b"")
+            if compression == COMPRESSION_IDS["zlib"]:
+                decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+                return decompressor.decompress(payload) + decompressor.flush()
+        except ImportError as e:
+            raise CodecError(f"compression library missing: {e}")
+        raise CodecError(f"unknown compression id {compression}")
+
+    def _zstd_codec(self, ident: int, dictionary: Optional[bytes], decompress: bool = False):
+        """(De)compressors are reused: loading a dictionary into one is the expensive part
+
+        They are not thread-safe, so each thread keeps its own.
+        """
+        codecs = self._local.__dict__.setdefault("zstd", {})
+        slot = (ident, decompress)
+        if slot not in codecs:
+            import zstandard
+            dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            if decompress:
+                codecs[slot] = zstandard.ZstdDecompressor(dict_data=dict_data)
+            else:
+                codecs[slot] = zstandard.ZstdCompressor(level=int(self.settings["level"]), dict_data=dict_data)
+        return codecs[slot]
+
+    def _sample(self, raw: bytes):
+        with self._lock:
+            if not self.training:
+                return
+            self.samples.append(raw)
+            # Only the caller that completes the sample set trains on it
+            if len(self.samples) != self.settings["train_samples"]:
+                return
+            samples = list(self.samples)
+        try:
+            data = self._train(samples)
+        except Exception as e:
+            logger.warning(f"Cache dictionary training failed, compressing without one: {e}")
+            self.settings["dictionary"] = False
+            self.samples = []
+            return
+        ident = self.use_dictionary(data)
+        logger.info(f"Trained {len(data)}-byte {self.compression} cache dictionary {ident:08x}")
+        if self.on_dictionary:
+            self.on_dictionary(ident, data)
+
+    def _train(self, samples: List[bytes]) -> bytes:
+        size = int(self.settings["dictionary_size"])
+        if self.compression == "zstd":
+            import zstandard
+            return zstandard.train_dictionary(size, samples).as_bytes()
+        # lz4/zlib take raw content: the most recent samples, newest last where matches are cheapest
+        if self.compression == "zlib":
+            size = min(size, ZLIB_MAX_DICTIONARY)
+        return b"".join(samples)[-size:]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "compression": self.compression,
+            "dictionary_id": f"{self.dictionary_id:08x}" if self.dictionary_id else None,
+            "dictionary_bytes": len(self.dictionaries.get(self.dictionary_id, b"")),
+            "training_samples": len(self.samples),
+        }
@@ -0,0 +1,196 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Default knobs, overridable from the `caching.disk` section of model_configs.yaml
+DEFAULT_DISK_CACHE_CONFIG = {
+    "enabled": False,
+    "path": "/app/data/cache/responses.db",
+    "max_bytes": 4294967296,
+    "mmap_bytes": 268435456,
+    "touch_interval": 60,
+    "evict_batch": 64,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value BLOB NOT NULL
+);
+"""
+
+
+class DiskStore:
+    """Embedded on-disk cache tier: SQLite in WAL mode with a byte budget and LRU/TTL eviction
+
+    Every put is one transaction, so a crash or kill leaves the file at the
+    last committed write (WAL with synchronous=NORMAL; a power loss can drop
+    the last few writes but never corrupts the file). Reads go through a
+    memory map of the database file, so hot entries are served from the
+    page cache. On open the existing contents are kept: a restarted gateway
+    starts warm. Last-access times are updated at most every touch_interval
+    seconds per entry, which keeps hits from turning into writes; eviction
+    removes expired entries, then the least recently used, until the stored
+    bytes fit max_bytes. Same interface as RedisStore, so it serves as the
+    tier under Redis or on its own.
+    """
+
+    name = "disk"
+
+    def __init__(self, disk_config: Optional[Dict[str, Any]] = None):
+        self.settings = {**DEFAULT_DISK_CACHE_CONFIG, **(disk_config or {})}
+        self.max_bytes = int(self.settings["max_bytes"] or 0)
+        path = self.settings["path"]
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One connection shared by the event loop and worker threads, serialized by the lock
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(f"PRAGMA mmap_size={int(self.settings['mmap_bytes'])}")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.executescript(SCHEMA)
+        self.stored_bytes = self._purge_expired() or 0
+        self.entries = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        logger.info(f"Disk cache {path}: {self.entries} entries, {self.stored_bytes} bytes")
+
+    def _purge_expired(self) -> int:
+        with self.lock:
+            self.db.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+            return self.db.execute("SELECT SUM(size) FROM entries").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT value, expires_at, accessed_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                return None
+            if now - row[2] >= self.settings["touch_interval"]:
+                self.db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0], row[1] - now
+
+    def get_many(self, keys: List[str]) -> Dict[str, Tuple[bytes, float]]:
+        found = {}
+        for key in keys:
+            entry = self.get(key)
+            if entry is not None:
+                found[key] = entry
+        return found
+
+    def put(self, key: str, value: bytes, ttl: float) -> int:
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                old = self.db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                self.db.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), now + ttl, now),
+                )
+                self.stored_bytes += len(value) - (old[0] if old else 0)
+                self.entries += 0 if old else 1
+                evicted = self._evict(now) if self.max_bytes and self.stored_bytes > self.max_bytes else 0
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                self._recount()
+                raise
+        return evicted
+
+    def _evict(self, now: float) -> int:
+        """Drop expired, then least recently used, entries until under budget (inside the put's transaction)"""
+        evicted = 0
+        expired = self.db.execute(
+            "SELECT COUNT(*), SUM(size) FROM entries WHERE expires_at <= ?", (now,)
+        ).fetchone()
+        if expired[0]:
+            self.db.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+            self.stored_bytes -= expired[1]
+            self.entries -= expired[0]
+            evicted += expired[0]
+        while self.stored_bytes > self.max_bytes and self.entries > 1:
+            victims = self.db.execute(
+                "SELECT key, size FROM entries ORDER BY accessed_at LIMIT ?", (int(self.settings["evict_batch"]),)
+            ).fetchall()
+            for victim, size in victims:
+                if self.stored_bytes <= self.max_bytes:
+                    break
+                self.db.execute("DELETE FROM entries WHERE key = ?", (victim,))
+                self.stored_bytes -= size
+                self.entries -= 1
+                evicted += 1
+        return evicted
+
+    def _recount(self):
+        self.stored_bytes, self.entries = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries"
+        ).fetchone()
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.db.execute("SELECT expires_at, size FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[0] > now:
+                    self.db.execute("COMMIT")
+                    return False
+                self.db.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), now + ttl, now),
+                )
+                self.stored_bytes += len(value) - (row[1] if row else 0)
+                self.entries += 0 if row else 1
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return True
+
+    def delete(self, key: str):
+        with self.lock:
+            row = self.db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.stored_bytes -= row[0]
+                self.entries -= 1
+
+    def get_meta(self, name: str) -> Optional[bytes]:
+        with self.lock:
+            row = self.db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, name: str, value: bytes):
+        if isinstance(value, (int, str)):
+            value = str(value).encode()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.settings["path"],
+            "max_bytes": self.max_bytes,
+            "stored_bytes": self.stored_bytes,
+            "entries": self.entries,
+        }
@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Dict, Any, Awaitable, Callable, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from fastapi.responses import JSONResponse
+
+from .cache import CacheBackendError
+
+logger = logging.getLogger(__name__)
+
+# Default knobs, overridable from the `idempotency` section of model_configs.yaml
+DEFAULT_IDEMPOTENCY_CONFIG = {
+    "enabled": True,
+    "header": "Idempotency-Key",
+    "ttl_seconds": 3600,
+    "lock_ttl_seconds": 300,
+    "max_entries": 10000,
+    "remote_wait_seconds": 30,
+    "remote_poll_interval": 0.25,
+}
+
+# Response headers worth replaying alongside a stored body
+REPLAYED_HEADERS = ("location", "x-generation-id")
+
+
+def body_hash(data: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """Deduplicates retried POSTs that carry the same Idempotency-Key
+
+    A retry that arrives while the first request is still running in this
+    process awaits the same result. Finished 2xx results are stored in the
+    cache backend for ttl_seconds and replayed. With a shared backend (Redis)
+    an in-progress marker lets other gateway instances wait for the result
+    instead of generating it again. Reusing a key with a different body is a
+    client error (422). If the backend cannot be reached the request runs
+    without cross-instance deduplication rather than failing.
+    """
+
+    def __init__(self, idempotency_config: Optional[Dict[str, Any]], backend):
+        self.settings = {**DEFAULT_IDEMPOTENCY_CONFIG, **(idempotency_config or {})}
+        self.backend = backend
+        self.inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self.on_event: Optional[Callable[[str], None]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings["enabled"])
+
+    @property
+    def header(self) -> str:
+        return self.settings["header"]
+
+    def _event(self, kind: str):
+        if self.on_event:
+            self.on_event(kind)
+
+    @staticmethod
+    def _serialize(result) -> Optional[Dict[str, Any]]:
+        """Stored form of a handler result, or None if it should not be replayed"""
+        if isinstance(result, dict):
+            return {"status_code": 200, "body": result, "headers": {}}
+        if isinstance(result, JSONResponse) and 200 <= result.status_code < 300:
+            headers = {k: v for k, v in result.headers.items() if k in REPLAYED_HEADERS}
+            return {"status_code": result.status_code, "body": json.loads(result.body), "headers": headers}
+        return None
+
+    def _replay(self, stored: Dict[str, Any]) -> Response:
+        headers = {**stored.get("headers", {}), "Idempotent-Replayed": "true"}
+        return JSONResponse(stored["body"], status_code=stored["status_code"], headers=headers)
+
+    def _unavailable(self, e: CacheBackendError):
+        logger.warning(f"Idempotency backend unavailable, running without deduplication: {e}")
+        self._event("unavailable")
+
+    def _check_hash(self, stored_hash: str, request_hash: str):
+        if stored_hash != request_hash:
+            self._event("mismatch")
+            raise HTTPException(
+                status_code=422, detail=f"{self.header} was already used with a different request body"
+            )
+
+    async def run(self, key: str, data: Dict[str, Any], handler: Callable[[], Awaitable[Any]]):
+        """Run handler once per key; retries attach to or replay the first run"""
+        request_hash = body_hash(data)
+
+        # Same process, still running: share the result
+        running = self.inflight.get(key)
+        if running is not None:
+            self._check_hash(running[0], request_hash)
+            self._event("attached")
+            result = await asyncio.shield(running[1])
+            return self._replay(result) if result is not None else await handler()
+
+        try:
+            stored = await self._load(key)
+        except CacheBackendError as e:
+            self._unavailable(e)
+            return await self._execute(key, request_hash, handler, shared=False)
+        if stored is not None:
+            self._check_hash(stored["body_hash"], request_hash)
+            if stored.get("state") == "done":
+                self._event("replayed")
+                return self._replay(stored)
+            # Another gateway instance is running it
+            stored = await self._wait_remote(key)
+            if stored is None:
+                # It failed and released the key; run it here instead
+                return await self.run(key, data, handler)
+            if stored.get("state") == "done":
+                self._event("replayed")
+                return self._replay(stored)
+            self._event("conflict")
+            raise HTTPException(status_code=409, detail=f"A request with this {self.header} is still in progress")
+
+        marker = json.dumps({"state": "in_progress", "body_hash": request_hash})
+        try:
+            claimed = await self.backend.add(key, marker, self.settings["lock_ttl_seconds"])
+        except CacheBackendError as e:
+            self._unavailable(e)
+            return await self._execute(key, request_hash, handler, shared=False)
+        if not claimed:
+            # Lost the race to another instance
+            return await self.run(key, data, handler)
+        return await self._execute(key, request_hash, handler, shared=True)
+
+    async def _execute(self, key: str, request_hash: str, handler: Callable[[], Awaitable[Any]], shared: bool):
+        """Run handler as the owner of key; shared: we hold the backend marker and record the outcome there"""
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = (request_hash, future)
+        try:
+            result = await handler()
+        except BaseException as e:
+            self.inflight.pop(key, None)
+            if shared:
+                await self._release(key)
+            future.set_exception(e if isinstance(e, Exception) else HTTPException(status_code=499))
+            future.exception()  # retrieved; attached retries re-raise it themselves
+            raise
+
+        stored = self._serialize(result)
+        if stored is not None:
+            stored.update(state="done", body_hash=request_hash)
+        if shared:
+            try:
+                if stored is None:
+                    await self.backend.delete(key)
+                else:
+                    await self.backend.set(key, json.dumps(stored), self.settings["ttl_seconds"])
+            except CacheBackendError as e:
+                # The client still gets its result; retries are just not replayed
+                self._unavailable(e)
+        self.inflight.pop(key, None)
+        future.set_result(stored)
+        return result
+
+    async def _release(self, key: str):
+        try:
+            await self.backend.delete(key)
+        except CacheBackendError as e:
+            # The marker expires after lock_ttl_seconds
+            self._unavailable(e)
+
+    async def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = await self.backend.get(key)
+        return json.loads(raw) if raw else None
+
+    async def _wait_remote(self, key: str) -> Optional[Dict[str, Any]]:
+        """Poll until the remote run finishes, disappears or we give up"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.settings["remote_wait_seconds"]
+        stored = None
+        while loop.time() < deadline:
+            await asyncio.sleep(self.settings["remote_poll_interval"])
+            try:
+                stored = await self._load(key)
+            except CacheBackendError:
+                # run() finds the backend down too and goes ahead without it
+                return None
+            if stored is None or stored.get("state") == "done":
+                return stored
+        return stored
@@ -0,0 +1,384 @@
+import asyncio
+import logging
+import os
+import signal
+import time
+from typing import Dict, Any, Callable, List, Optional
+
+import httpx
+
+from .prewarm import Prewarmer
+
+logger = logging.getLogger(__name__)
+
+# Default knobs, overridable from the `lifecycle` section of model_configs.yaml
+DEFAULT_LIFECYCLE_CONFIG = {
+    "enabled": False,
+    "gpu_memory_budget": 0.90,
+    "idle_timeout": 600,
+    "startup_timeout": 300,
+    "stop_timeout": 30,
+    "health_poll_interval": 1.0,
+    "reap_interval": 30,
+    "eviction_wait": 60,
+    "host": "127.0.0.1",
+    "log_dir": "/var/log/models",
+    "command": [
+        "python", "-m", "vllm.entrypoints.openai.api_server",
+        "--host", "{host}", "--port", "{port}",
+        "--model", "{model_path}", "--served-model-name", "{name}",
+        "--max-model-len", "2048", "--gpu-memory-utilization", "{gpu_memory}",
+        "--dtype", "auto", "--trust-remote-code",
+    ],
+}
+
+
+class LifecycleError(Exception):
+    """A model could not be made ready; mapped to a 503 by the gateway"""
+
+
+def render_command(template: List[str], **values) -> List[str]:
+    return [str(part).format(**values) for part in template]
+
+
+class BackendProcess:
+    """One model server process with a readiness probe"""
+
+    def __init__(self, name: str, command: List[str], health_url: str, log_path: Optional[str] = None,
+                 env: Optional[Dict[str, str]] = None, endpoint: Optional[str] = None):
+        self.name = name
+        self.endpoint = endpoint
+        self.command = command
+        self.health_url = health_url
+        self.log_path = log_path
+        self.env = env
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.started_at: Optional[float] = None
+        self._log_file = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else None
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self, stdout=None):
+        """Spawn the process; output goes to log_path unless a pipe is requested"""
+        if stdout is None and self.log_path:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            self._log_file = open(self.log_path, "ab")
+            stdout = self._log_file
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdout=stdout,
+            stderr=asyncio.subprocess.STDOUT,
+            env={**os.environ, **(self.env or {})},
+            start_new_session=True,
+        )
+        self.started_at = time.monotonic()
+
+    async def wait_ready(self, timeout: float, poll_interval: float = 1.0) -> bool:
+        """Poll the health endpoint until it answers 200, the process dies or time runs out"""
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient(timeout=httpx.Timeout(min(5.0, timeout))) as client:
+            while time.monotonic() < deadline:
+                if not self.running:
+                    return False
+                try:
+                    response = await client.get(self.health_url)
+                    if response.status_code == 200:
+                        return True
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(poll_interval)
+        return False
+
+    async def probe(self, timeout: float = 5.0) -> bool:
+        """One health check; False on any error or non-200"""
+        try:
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                return (await client.get(self.health_url)).status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    async def stop(self, timeout: float = 30.0):
+        """SIGTERM the process group, escalating to SIGKILL after timeout"""
+        if self.running:
+            try:
+                os.killpg(self.process.pid, signal.SIGTERM)
+                await asyncio.wait_for(self.process.wait(), timeout)
+            except asyncio.TimeoutError:
+                os.killpg(self.process.pid, signal.SIGKILL)
+                await self.process.wait()
+            except ProcessLookupError:
+                pass
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+
+def build_backend_process(name: str, model_config: Dict[str, Any], settings: Dict[str, Any]) -> BackendProcess:
+    """BackendProcess for models.<name>, rendered from the lifecycle command template"""
+    host = settings["host"]
+    values = {
+        "name": name,
+        "host": host,
+        "port": model_config["port"],
+        "model_path": model_config.get("name", name),
+        "gpu_memory": model_config.get("gpu_memory", 0.3),
+    }
+    command = render_command(model_config.get("launch_command", settings["command"]), **values)
+    endpoint = f"http://{host}:{values['port']}"
+    health_url = endpoint + model_config.get("healthcheck_endpoint", "/health")
+    log_path = os.path.join(settings["log_dir"], f"{name}.log")
+    return BackendProcess(name, command, health_url, log_path, model_config.get("launch_env"), endpoint)
+
+
+class ManagedModel:
+    """Lifecycle state of one model under the manager"""
+
+    def __init__(self, name: str, gpu_memory: float, endpoint: str, process: BackendProcess):
+        self.name = name
+        self.gpu_memory = gpu_memory
+        self.endpoint = endpoint
+        self.process = process
+        self.state = "stopped"
+        self.inflight = 0
+        self.requests = 0.0
+        self.last_used = 0.0
+        # The cold start in progress, awaited (shielded) by every request for the model
+        self.ready: Optional[asyncio.Task] = None
+
+    @property
+    def resident(self) -> bool:
+        return self.state in ("starting", "ready")
+
+
+class Lease:
+    """Marks a model as in use so it is not evicted; release() is idempotent"""
+
+    def __init__(self, model: ManagedModel):
+        self.model = model
+        self.released = False
+
+    @property
+    def endpoint(self) -> str:
+        return self.model.endpoint
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.model.inflight -= 1
+            self.model.last_used = time.monotonic()
+
+
+class ModelLifecycleManager:
+    """Starts model servers on demand within a GPU memory budget
+
+    Models are launched on their first request; concurrent requests wait on
+    the same cold start. When starting a model would exceed gpu_memory_budget
+    (the sum of models.<name>.gpu_memory), idle models are stopped in least
+    recently used order. Models idle for idle_timeout are stopped as well.
+    With prewarming enabled, the weights of stopped models are periodically
+    read into the page cache, most requested first, so their next cold start
+    does not wait on disk.
+    """
+
+    def __init__(self, lifecycle_config: Optional[Dict[str, Any]], model_configs: Dict[str, Any],
+                 prewarm_config: Optional[Dict[str, Any]] = None):
+        self.settings = {**DEFAULT_LIFECYCLE_CONFIG, **(lifecycle_config or {})}
+        self.models: Dict[str, ManagedModel] = {}
+        self.changed = asyncio.Condition()
+        self.reaper: Optional[asyncio.Task] = None
+        self.prewarmer = Prewarmer(prewarm_config, model_configs)
+        self.prewarm_task: Optional[asyncio.Task] = None
+        self.on_event: Optional[Callable[[str, str, float], None]] = None
+        for name, model_config in model_configs.items():
+            self.models[name] = self._build(name, model_config)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings["enabled"])
+
+    def _build(self, name: str, model_config: Dict[str, Any]) -> ManagedModel:
+        process = build_backend_process(name, model_config, self.settings)
+        return ManagedModel(name, float(model_config.get("gpu_memory", 0.3)), process.endpoint, process)
+
+    def _emit(self, kind: str, model: str, seconds: float):
+        if self.on_event:
+            self.on_event(kind, model, seconds)
+
+    def reserved_memory(self) -> float:
+        return sum(m.gpu_memory for m in self.models.values() if m.resident or m.state == "stopping")
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "gpu_memory_budget": self.settings["gpu_memory_budget"],
+            "gpu_memory_reserved": round(self.reserved_memory(), 3),
+            "models": {
+                m.name: {
+                    "state": m.state,
+                    "pid": m.process.pid if m.process.running else None,
+                    "gpu_memory": m.gpu_memory,
+                    "inflight": m.inflight,
+                    "idle_seconds": round(now - m.last_used, 1) if m.last_used else None,
+                }
+                for m in self.models.values()
+            },
+        }
+
+    async def lease(self, name: str) -> Lease:
+        """Make a model ready (starting it if needed) and mark it in use"""
+        model = self.models.get(name)
+        if model is None:
+            raise LifecycleError(f"Unknown model {name}")
+        model.inflight += 1
+        model.requests += 1
+        model.last_used = time.monotonic()
+        try:
+            await self._ensure_ready(model)
+        except BaseException:
+            model.inflight -= 1
+            raise
+        return Lease(model)
+
+    async def _ensure_ready(self, model: ManagedModel):
+        while True:
+            if model.state == "ready" and model.process.running:
+                return
+            if model.state == "stopping":
+                async with self.changed:
+                    await self.changed.wait_for(lambda: model.state != "stopping")
+                continue
+            if model.state != "starting":
+                # Stopped, or crashed while marked ready. The start runs in its own
+                # task so a requester going away does not abort it for the others.
+                model.state = "starting"
+                model.ready = asyncio.create_task(self._start(model))
+                model.ready.add_done_callback(lambda task: task.cancelled() or task.exception())
+            starting = model.ready
+            try:
+                await asyncio.shield(starting)
+            except asyncio.CancelledError:
+                if starting.cancelled():
+                    raise LifecycleError(f"Start of {model.name} was cancelled")
+                raise
+
+    async def _start(self, model: ManagedModel):
+        started = time.monotonic()
+        try:
+            await self._make_room(model)
+            logger.info(f"Starting {model.name} ({model.gpu_memory:.2f} of GPU memory)")
+            await model.process.start()
+            ok = await model.process.wait_ready(
+                self.settings["startup_timeout"], self.settings["health_poll_interval"]
+            )
+            if not ok:
+                raise LifecycleError(f"{model.name} did not become ready within {self.settings['startup_timeout']}s")
+        except BaseException:
+            # Never leave a half-started server holding GPU memory the budget no longer counts
+            try:
+                await asyncio.shield(model.process.stop(self.settings["stop_timeout"]))
+            finally:
+                model.state = "stopped"
+                await self._notify()
+            raise
+        model.state = "ready"
+        self._emit("load", model.name, time.monotonic() - started)
+        logger.info(f"{model.name} ready after {time.monotonic() - started:.1f}s")
+        await self._notify()
+
+    async def _make_room(self, model: ManagedModel):
+        """Evict idle models (LRU) until the new one fits the memory budget"""
+        budget = float(self.settings["gpu_memory_budget"])
+        if model.gpu_memory > budget:
+            raise LifecycleError(f"{model.name} needs {model.gpu_memory} of GPU memory, budget is {budget}")
+        deadline = time.monotonic() + self.settings["eviction_wait"]
+        while self.reserved_memory() > budget + 1e-9:
+            victims = sorted(
+                (m for m in self.models.values() if m is not model and m.state == "ready" and m.inflight == 0),
+                key=lambda m: m.last_used,
+            )
+            if victims:
+                await self._stop(victims[0], reason="evicted")
+                continue
+            # Everything resident is busy; wait for a lease to end or a model to stop
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LifecycleError(f"No GPU memory for {model.name}: all resident models are busy")
+            async with self.changed:
+                try:
+                    await asyncio.wait_for(self.changed.wait(), min(remaining, 1.0))
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _stop(self, model: ManagedModel, reason: str):
+        model.state = "stopping"
+        started = time.monotonic()
+        logger.info(f"Stopping {model.name} ({reason})")
+        try:
+            await model.process.stop(self.settings["stop_timeout"])
+        finally:
+            model.state = "stopped"
+            self._emit("unload", model.name, time.monotonic() - started)
+            await self._notify()
+
+    async def _notify(self):
+        async with self.changed:
+            self.changed.notify_all()
+
+    async def reap_idle(self):
+        """Stop models that have been idle longer than idle_timeout (scale to zero)"""
+        now = time.monotonic()
+        for model in list(self.models.values()):
+            if model.state == "ready" and model.inflight == 0 and now - model.last_used > self.settings["idle_timeout"]:
+                await self._stop(model, reason="idle")
+
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(self.settings["reap_interval"])
+            try:
+                await self.reap_idle()
+            except Exception as e:
+                logger.error(f"Idle reaper failed: {e}")
+
+    async def prewarm_stopped(self) -> Dict[str, Any]:
+        """Prewarm non-resident models by recent request count, then halve the counts"""
+        frequency = {m.name: m.requests for m in self.models.values()}
+        stopped = [m.name for m in self.models.values() if not m.resident]
+        for model in self.models.values():
+            model.requests /= 2
+        return await self.prewarmer.prewarm(stopped, frequency) if stopped else {}
+
+    async def _prewarm_loop(self):
+        while True:
+            try:
+                await self.prewarm_stopped()
+            except Exception as e:
+                logger.error(f"Prewarm failed: {e}")
+            await asyncio.sleep(self.prewarmer.settings["interval"])
+
+    def start(self):
+        if self.reaper is None:
+            self.reaper = asyncio.create_task(self._reap_loop())
+        if self.prewarmer.enabled and self.prewarm_task is None:
+            self.prewarm_task = asyncio.create_task(self._prewarm_loop())
+
+    async def shutdown(self):
+        for task in (self.reaper, self.prewarm_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self.reaper = self.prewarm_task = None
+        # Cold starts in progress stop their own process when cancelled
+        starting = [m.ready for m in self.models.values() if m.state == "starting" and m.ready is not None]
+        for task in starting:
+            task.cancel()
+        await asyncio.gather(*starting, return_exceptions=True)
+        await asyncio.gather(
+            *(self._stop(m, reason="shutdown") for m in self.models.values() if m.process.running),
+            return_exceptions=True,
+        )
@@ -1,31 +1,139 @@
-from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi import APIRouter, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 import httpx
 import asyncio
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Callable, Optional, List, Tuple
 import json
+import os
 import time
-import redis
 import hashlib
 from contextlib import asynccontextmanager
 import logging
-from prometheus_client import Counter, Histogram, generate_latest
-import yaml
+from prometheus_client import Counter, Histogram, Gauge, generate_latest, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+
+from .timeouts import TimeoutPolicy, estimate_prompt_tokens
+from .scheduler import DeficitRoundRobinQueue, LoadShedError, Slot, build_backend_queues
+from .tenants import Tenant, TenantResolver
+from .predictor import CompletionLengthPredictor, LengthPrediction
+from .batch import BatchError, BatchRunner
+from .background import GenerationStore, sse_error
+from .admission import TinyLfuAdmission
+from .cache import FallbackCache, LocalCache, RedisCache
+from .codec import CacheCodec
+from .request_log import RequestLog
+from .response_cache import CachedResponse, ResponseCache, freshness_policy
+from .cache_store import RedisStore, ShardedRedisStore, TieredStore
+from .disk_cache import DiskStore
+from .sample_pool import SamplePools
+from .prefix_reuse import PrefixReuse
+from .semantic_cache import SemanticCache
+from .idempotency import IdempotencyStore
+from .negative_cache import NegativeCache
+from .backend_health import BackendHealth
+from .prompt_registry import PromptError, PromptRegistry
+from .lifecycle import Lease, LifecycleError, ModelLifecycleManager
+from .warmup import BackendWarmup, ReadinessGate, build_http_client
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load configuration
-with open('/app/configs/model_configs.yaml', 'r') as f:
-    config = yaml.safe_load(f)
+# Configuration is loaded by create_app(), not at import time
+DEFAULT_CONFIG_PATH = '/app/configs/model_configs.yaml'
+config: Dict[str, Any] = {}
+
+def load_config(path: Optional[str] = None) -> Dict[str, Any]:
+    """Read the gateway config from path, $GATEWAY_CONFIG or the container default"""
+    import yaml
+    with open(path or os.environ.get('GATEWAY_CONFIG', DEFAULT_CONFIG_PATH), 'r') as f:
+        return yaml.safe_load(f)
 
 # Metrics
 request_counter = Counter('model_requests_total', 'Total requests per model', ['model'])
 request_duration = Histogram('model_request_duration_seconds', 'Request duration', ['model'])
 cache_hits = Counter('cache_hits_total', 'Cache hits')
 cache_misses = Counter('cache_misses_total', 'Cache misses')
+cache_admissions = Counter('cache_admissions_total', 'Responses the admission filter let into the cache')
+cache_rejections = Counter('cache_rejections_total', 'Responses the admission filter kept out of the cache')
+cache_compression_ratio = Histogram(
+    'cache_compression_ratio', 'Encoded JSON bytes / stored bytes per cached response',
+    buckets=(1, 1.25, 1.5, 2, 3, 4, 6, 8, 12, 16)
+)
+codec_buckets = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+cache_encode_seconds = Histogram('cache_encode_seconds', 'Time to encode and compress a cached response', buckets=codec_buckets)
+cache_decode_seconds = Histogram('cache_decode_seconds', 'Time to decompress and decode a cached response', buckets=codec_buckets)
+cache_stored_bytes = Gauge('cache_stored_bytes', 'Bytes held by a response cache tier (with a max_bytes budget)', ['tier'])
+cache_evictions = Counter('cache_evictions_total', 'Cached responses evicted to stay under max_bytes', ['tier'])
+cache_backend_errors = Counter('cache_backend_errors_total', 'Response cache tier operations that failed and were skipped', ['tier'])
+cache_node_up = Gauge('cache_node_up', 'Whether a sharded cache node is taking its keys (0 while failed over)', ['node'])
+cache_node_errors = Counter('cache_node_errors_total', 'Sharded cache node failures that moved keys along the ring', ['node'])
+cache_stale_hits = Counter('cache_stale_hits_total', 'Cached responses served past their ttl while being refreshed')
+cache_refreshes = Counter('cache_refreshes_total', 'Background cache refreshes', ['trigger', 'outcome'])
+sample_pool_requests = Counter(
+    'cache_sample_pool_requests_total', 'Sampled requests answered from a full pool or sent live to fill it', ['outcome']
+)
+prefix_reuse_requests = Counter(
+    'cache_prefix_reuse_total', 'Deterministic requests looked up in the max_tokens-independent prefix index', ['outcome']
+)
+semantic_cache_lookups = Counter('semantic_cache_lookups_total', 'Semantic cache lookups', ['outcome'])
+semantic_cache_similarity = Histogram(
+    'semantic_cache_similarity', 'Cosine similarity of the nearest semantic cache entry', ['outcome'],
+    buckets=(0.5, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.96, 0.98, 0.99, 1.0)
+)
+semantic_cache_entries = Gauge('semantic_cache_entries', 'Responses held by the semantic cache')
+upstream_timeouts = Counter('upstream_timeouts_total', 'Upstream requests that hit their deadline', ['model'])
+request_timeout_seconds = Histogram(
+    'model_request_timeout_seconds', 'Computed per-request upstream timeout', ['model'],
+    buckets=(1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+)
+decode_speed = Gauge('model_decode_tokens_per_second', 'Observed per-request decode speed', ['model'])
+requests_shed = Counter('requests_shed_total', 'Requests rejected by load shedding', ['model', 'reason'])
+queue_wait = Histogram('gateway_queue_wait_seconds', 'Time spent queued for a backend slot', ['model'])
+queue_depth = Gauge('gateway_queue_depth', 'Requests queued for a backend slot', ['model'])
+inflight_requests = Gauge('gateway_inflight_requests', 'Requests dispatched to a backend', ['model'])
+estimated_queue_wait = Gauge('gateway_estimated_queue_wait_seconds', 'Estimated queue wait', ['model'])
+tenant_served_tokens = Counter('tenant_served_tokens_total', 'Prompt + completion tokens served per tenant', ['tenant', 'tier'])
+tenant_requests = Counter('tenant_requests_total', 'Requests per tenant', ['tenant', 'tier'])
+token_buckets = (8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+predicted_completion_tokens = Histogram(
+    'predicted_completion_tokens', 'Predicted typical completion length', ['model'], buckets=token_buckets
+)
+observed_completion_tokens = Histogram(
+    'observed_completion_tokens', 'Observed completion length', ['model'], buckets=token_buckets
+)
+prediction_error_ratio = Histogram(
+    'completion_length_prediction_error_ratio', 'Observed / predicted typical completion length', ['model'],
+    buckets=(0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2, 4, 10)
+)
+predictions_by_level = Counter('completion_length_predictions_total', 'Predictions by key level', ['model', 'level'])
+batch_requests = Counter('batch_requests_total', 'Batch API requests processed', ['status'])
+batch_jobs_active = Gauge('batch_jobs_active', 'Batch jobs currently running')
+background_active = Gauge('background_generations_active', 'Background generations still running')
+background_reconnects = Counter('background_generation_reconnects_total', 'Clients reattaching to a background generation')
+idempotency_events = Counter('idempotency_events_total', 'Idempotency-Key handling outcomes', ['outcome'])
+negative_cache_hits = Counter('negative_cache_hits_total', 'Requests answered with a remembered upstream rejection', ['status'])
+negative_cache_stores = Counter('negative_cache_stores_total', 'Upstream rejections remembered for repeats', ['status'])
+backend_fast_fails = Counter('backend_fast_fails_total', 'Requests failed fast because their backend is unreachable', ['model'])
+backend_circuit_open = Gauge('backend_circuit_open', '1 while requests to the backend fail fast', ['model'])
+prompt_expansions = Counter('prompt_expansions_total', 'Prompt references expanded before forwarding', ['cached'])
+model_load_seconds = Histogram(
+    'model_load_seconds', 'Time to start a model server until ready', ['model'],
+    buckets=(1, 5, 10, 20, 30, 60, 120, 300, 600)
+)
+model_unload_seconds = Histogram('model_unload_seconds', 'Time to stop a model server', ['model'])
+model_resident = Gauge('model_resident', 'Whether the model server is starting or running (1) or stopped (0)', ['model'])
+model_prewarm_bytes = Counter('model_prewarm_bytes_total', 'Weight file bytes read into the page cache', ['model'])
+model_prewarm_seconds = Histogram('model_prewarm_seconds', 'Time to prewarm a model\'s weight files', ['model'])
+gpu_memory_reserved = Gauge('gpu_memory_reserved_fraction', 'GPU memory fraction reserved by resident models')
+gateway_ready = Gauge('gateway_ready', 'Whether the readiness gate has passed (1) or not (0)')
+backend_warmup_seconds = Histogram(
+    'backend_warmup_seconds', 'Time to open pooled connections and send warmup requests', ['model'],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+predictor_keys = Gauge('completion_length_predictor_keys', 'Sketches held by the completion length predictor')
 
 # Model endpoints
 MODEL_ENDPOINTS = {
@@ -34,44 +142,156 @@ MODEL_ENDPOINTS = {
     "gemma2_2b": "http://gemma-model:8003"
 }
 
-# Redis client for caching
-redis_client = None
-if config['caching']['enabled']:
-    try:
-        redis_client = redis.Redis(
-            host=config['caching']['redis_host'],
-            port=config['caching']['redis_port'],
-            decode_responses=True
+# Pooled upstream connections, created on first use and warmed by the readiness gate
+http_client: Optional[httpx.AsyncClient] = None
+
+def upstream_client() -> httpx.AsyncClient:
+    global http_client
+    if http_client is None:
+        http_client = build_http_client(config.get('warmup'))
+    return http_client
+
+# Response cache; connected during startup, None while no tier is available
+response_cache: Optional[ResponseCache] = None
+disk_store: Optional[DiskStore] = None
+
+# Response cache calls block: a Redis round trip (up to socket_timeout on a node that
+# stopped answering) or SQLite's busy_timeout for the write lock
+async def cache_io(fn: Callable, *args):
+    """Run a response cache call off the event loop"""
+    return await asyncio.to_thread(fn, *args)
+
+def use_cache_tiers(tiers: List[Any]):
+    """Serve the response cache from these tiers, fastest first"""
+    global response_cache
+    store = TieredStore(tiers)
+    store.on_error = lambda tier, e: cache_backend_errors.labels(tier=tier).inc()
+    store.on_evict = lambda tier, evicted: cache_evictions.labels(tier=tier).inc(evicted)
+    for tier in tiers:
+        cache_stored_bytes.labels(tier=tier.name).set_function(lambda t=tier: t.stored_bytes)
+    # Also adopts the compression dictionary published by other instances or an earlier run
+    response_cache = ResponseCache(store, cache_codec)
+
+async def connect_cache():
+    """Open the disk tier, then Redis off the event loop, retrying Redis every reconnect_interval seconds
+
+    With caching.disk enabled the cache serves from disk alone right away
+    and Redis is put in front of it once it answers; without it caching
+    stays off until Redis answers.
+    """
+    global disk_store
+    caching = config['caching']
+    if not caching['enabled']:
+        return
+    disk_config = caching.get('disk') or {}
+    if disk_config.get('enabled'):
+        try:
+            disk_store = await asyncio.to_thread(DiskStore, disk_config)
+            await asyncio.to_thread(use_cache_tiers, [disk_store])
+            logger.info("Disk caching enabled")
+        except Exception as e:
+            logger.warning(f"Disk cache unavailable: {e}")
+    # redis_nodes shards the cache over several instances; otherwise the single redis_host
+    nodes = caching.get('redis_nodes') or (
+        [{"host": caching['redis_host'], "port": caching['redis_port']}] if caching.get('redis_host') else []
+    )
+    if not nodes:
+        return
+    import redis
+    clients = {
+        node.get('name') or f"{node['host']}:{node.get('port', 6379)}": redis.Redis(
+            host=node['host'],
+            port=node.get('port', 6379),
+            socket_connect_timeout=caching.get('connect_timeout', 2.0),
+            socket_timeout=caching.get('socket_timeout', 2.0)
+        )
+        for node in nodes
+    }
+    interval = caching.get('reconnect_interval', 30)
+    while True:
+        answered = await asyncio.gather(*(asyncio.to_thread(ping_redis, name, c) for name, c in clients.items()))
+        if any(answered):
+            break
+        if not interval:
+            return
+        logger.warning(f"No Redis node answered, retrying in {interval}s")
+        await asyncio.sleep(interval)
+    if len(clients) == 1:
+        redis_store = RedisStore(next(iter(clients.values())), caching.get('max_bytes'))
+    else:
+        redis_store = ShardedRedisStore(
+            clients, caching.get('max_bytes'), caching.get('sharding'),
+            {name: node.get('weight', 1.0) for name, node in zip(clients, nodes)}
         )
-        redis_client.ping()
-        logger.info("Redis caching enabled")
-    except:
-        logger.warning("Redis connection failed, caching disabled")
-        redis_client = None
+        redis_store.on_node_error = lambda node, e: cache_node_errors.labels(node=node).inc()
+        for name, up in zip(clients, answered):
+            if not up:
+                redis_store.mark_down(name)
+            cache_node_up.labels(node=name).set_function(lambda n=name: 1 if redis_store.up(n) else 0)
+    await asyncio.to_thread(use_cache_tiers, [redis_store] + ([disk_store] if disk_store else []))
+    # Idempotency records and remembered rejections move to Redis so retries are
+    # recognized across gateway instances (on the first node); the in-memory
+    # backends take over while it is unreachable
+    shared = RedisCache(
+        nodes[0]['host'], nodes[0].get('port', 6379),
+        socket_timeout=caching.get('socket_timeout', 2.0),
+        socket_connect_timeout=caching.get('connect_timeout', 2.0)
+    )
+    retry = interval or 30
+    idempotency.backend = FallbackCache(shared, idempotency.backend, retry)
+    negative_cache.backend = FallbackCache(shared, negative_cache.backend, retry)
+    logger.info(f"Redis caching enabled on {len(clients)} node(s)")
+
+def ping_redis(name: str, client) -> bool:
+    import redis
+    try:
+        client.ping()
+        return True
+    except redis.RedisError as e:
+        logger.warning(f"Redis node {name} did not answer: {e}")
+        return False
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("API Gateway starting up...")
+    # Local state is read here rather than when the app is built; registered
+    # prompts are needed before the readiness gate warms backends with them
+    await asyncio.to_thread(batch_runner.store.open)
+    await asyncio.to_thread(prompt_registry.load)
+    # Caching turns on once a tier is open; startup does not wait for it
+    cache_task = asyncio.create_task(connect_cache())
+    if lifecycle_manager.enabled:
+        lifecycle_manager.start()
+    gate_task = None
+    if readiness_gate.enabled:
+        # On-demand backends are not running yet, so there is nothing to gate on
+        endpoints = {} if lifecycle_manager.enabled else dict(MODEL_ENDPOINTS)
+        gate_task = asyncio.create_task(readiness_gate.run(upstream_client(), endpoints))
+        if readiness_gate.settings["block_startup"]:
+            await gate_task
+    if batch_runner.enabled:
+        resumed = await batch_runner.resume()
+        if resumed:
+            logger.info(f"Resumed {resumed} batch job(s)")
     yield
     # Shutdown
     logger.info("API Gateway shutting down...")
-
-app = FastAPI(
-    title="Multi-Model API Gateway",
-    description="Unified gateway for multiple LLM models",
-    version="1.0.0",
-    lifespan=lifespan
-)
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    if not cache_task.done():
+        cache_task.cancel()
+    await batch_runner.shutdown()
+    await generation_store.shutdown()
+    if gate_task is not None and not gate_task.done():
+        gate_task.cancel()
+        await asyncio.gather(gate_task, return_exceptions=True)
+    await readiness_gate.shutdown()
+    if lifecycle_manager.enabled:
+        await lifecycle_manager.shutdown()
+    if http_client is not None:
+        await http_client.aclose()
+    if disk_store is not None:
+        disk_store.close()
+    request_log.flush()
 
 class ModelRouter:
     def __init__(self):
@@ -94,42 +314,555 @@ class ModelRouter:
             return MODEL_ENDPOINTS[model_name]
         return MODEL_ENDPOINTS[self.get_next_model()]
 
-router = ModelRouter()
+class TenantQueueCollector:
+    """Per-tenant queue depth across all backends, computed at scrape time"""
+
+    def collect(self):
+        family = GaugeMetricFamily('tenant_queue_depth', 'Requests queued per tenant', labels=['tenant'])
+        depths: Dict[str, int] = {}
+        for queue in backend_queues.values():
+            if isinstance(queue.waiting, DeficitRoundRobinQueue):
+                for tenant in queue.waiting.queues:
+                    depths[tenant] = depths.get(tenant, 0) + queue.waiting.depth(tenant)
+        for tenant, depth in depths.items():
+            family.add_metric([tenant], depth)
+        yield family
+
 
 def generate_cache_key(request_data: Dict[str, Any]) -> str:
     """Generate cache key from request data"""
     data_str = json.dumps(request_data, sort_keys=True)
     return hashlib.md5(data_str.encode()).hexdigest()
 
+def resolve_model(model_name: Optional[str]) -> str:
+    """Resolve the requested model, falling back to weighted round-robin"""
+    if model_name and model_name in MODEL_ENDPOINTS:
+        return model_name
+    return router.get_next_model()
+
+def count_stream_tokens(chunk: bytes) -> int:
+    """Approximate generated tokens in an SSE chunk (one token per data event)"""
+    return chunk.count(b"data:") - chunk.count(b"data: [DONE]")
+
+async def acquire_backend_slot(model: str, expected_seconds: float, deadline: float,
+                               tenant: Tenant, cost_tokens: int) -> Optional[Slot]:
+    """Queue for a backend slot, shedding the request if it cannot meet its deadline"""
+    if not scheduling_enabled or model not in backend_queues:
+        return None
+    queue = backend_queues[model]
+    try:
+        slot = await queue.acquire(expected_seconds, deadline, tenant.name, cost_tokens, tenant.weight)
+    except LoadShedError as e:
+        requests_shed.labels(model=model, reason=e.reason).inc()
+        logger.warning(str(e))
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    queue_wait.labels(model=model).observe(slot.queued_seconds)
+    return slot
+
+def release_slot(slot: Optional[Slot]):
+    if slot is not None:
+        slot.release()
+
+async def lease_model(model: str) -> Optional[Lease]:
+    """Make sure an on-demand model is running, holding the request through a cold start"""
+    if not lifecycle_manager.enabled:
+        return None
+    try:
+        return await lifecycle_manager.lease(model)
+    except LifecycleError as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+def record_completion_length(model: str, tenant: Tenant, path: str, data: Dict[str, Any],
+                             completion_tokens: int, prediction: Optional[LengthPrediction]):
+    """Feed an observed completion length back into the predictor"""
+    if completion_tokens <= 0:
+        return
+    length_predictor.observe(model, tenant.name, path, data, completion_tokens)
+    observed_completion_tokens.labels(model=model).observe(completion_tokens)
+    if prediction is not None and prediction.samples:
+        prediction_error_ratio.labels(model=model).observe(completion_tokens / prediction.typical)
+
 async def forward_request(
     endpoint: str,
     method: str,
     path: str,
     data: Optional[Dict[str, Any]] = None,
-    stream: bool = False
+    timeout: float = 300.0
 ):
     """Forward request to model server"""
-    if stream:
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            url = f"{endpoint}{path}"
-            async with client.stream("POST", url, json=data) as response:
-                async for chunk in response.aiter_bytes():
-                    yield chunk
+    client_timeout = httpx.Timeout(timeout, connect=min(timeout_policy.connect_timeout, timeout))
+    client = upstream_client()
+    url = f"{endpoint}{path}"
+
+    if method == "GET":
+        response = await asyncio.wait_for(client.get(url, timeout=client_timeout), timeout)
+    elif method == "POST":
+        response = await asyncio.wait_for(client.post(url, json=data, timeout=client_timeout), timeout)
+    else:
+        raise HTTPException(status_code=405, detail="Method not allowed")
+
+    response.raise_for_status()
+    return response.json()
+
+async def forward_stream(
+    model: str,
+    endpoint: str,
+    path: str,
+    data: Dict[str, Any],
+    timeout: float,
+    release: Optional[Callable[[], None]] = None,
+    tenant: Optional[Tenant] = None,
+    prediction: Optional[LengthPrediction] = None
+):
+    """Stream a response from the model server, enforcing an overall deadline"""
+    start_time = time.monotonic()
+    deadline = start_time + timeout
+    tokens = 0
+    client_timeout = httpx.Timeout(timeout, connect=min(timeout_policy.connect_timeout, timeout))
+    try:
+        async with upstream_client().stream("POST", f"{endpoint}{path}", json=data, timeout=client_timeout) as response:
+            backend_health.success(model)
+            chunks = response.aiter_bytes()
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+                except StopAsyncIteration:
+                    break
+                tokens += count_stream_tokens(chunk)
+                yield chunk
+    except httpx.ConnectError:
+        backend_health.failure(model)
+        raise
+    except (httpx.TimeoutException, asyncio.TimeoutError) as e:
+        if isinstance(e, httpx.ConnectTimeout):
+            backend_health.failure(model)
+        # Headers are already sent: end the stream with an error event so it is not taken as complete
+        upstream_timeouts.labels(model=model).inc()
+        logger.warning(f"Stream from {model} exceeded its {timeout:.1f}s deadline")
+        yield sse_error(f"Upstream {model} did not finish within {timeout:.1f}s")
+        return
+    finally:
+        if release is not None:
+            release()
+
+    timeout_policy.observe(model, data, tokens, time.monotonic() - start_time)
+    decode_speed.labels(model=model).set(timeout_policy.tracker.tokens_per_second(model))
+    if tenant is not None:
+        tenant_served_tokens.labels(tenant=tenant.name, tier=tenant.tier).inc(estimate_prompt_tokens(data) + tokens)
+        record_completion_length(model, tenant, path, data, tokens, prediction)
+
+class Generation:
+    """An admitted request: resolved model, length prediction, upstream budget and backend slot"""
+
+    def __init__(self, model: str, tenant: Tenant, prediction: LengthPrediction,
+                 timeout: float, slot: Optional[Slot], lease: Optional[Lease] = None):
+        self.model = model
+        self.endpoint = lease.endpoint if lease is not None else MODEL_ENDPOINTS[model]
+        self.tenant = tenant
+        self.prediction = prediction
+        self.timeout = timeout
+        self.slot = slot
+        self.lease = lease
+        self.start_time = time.time()
+
+    def release(self):
+        release_slot(self.slot)
+        if self.lease is not None:
+            self.lease.release()
+
+    def detach(self) -> Callable[[], None]:
+        """Hand the slot and lease to a stream; this Generation no longer releases them"""
+        slot, lease = self.slot, self.lease
+        self.slot, self.lease = None, None
+
+        def release():
+            release_slot(slot)
+            if lease is not None:
+                lease.release()
+        return release
+
+async def admit_generation(data: Dict[str, Any], path: str, tenant: Tenant, headers) -> Generation:
+    """Resolve the model, compute the deadline and wait for a backend slot"""
+    model = resolve_model(data.get("model"))
+
+    # A backend that keeps refusing connections is not waited on
+    retry_after = backend_health.check(model)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=503, detail=f"Upstream {model} is unreachable",
+            headers={"Retry-After": str(max(int(retry_after + 0.999), 1))}
+        )
+
+    # On-demand models are started (or kept from eviction) before the deadline clock starts
+    lease = await lease_model(model)
+    try:
+        return await _admit_generation(data, path, tenant, headers, model, lease)
+    except BaseException:
+        if lease is not None:
+            lease.release()
+        raise
+
+async def _admit_generation(data: Dict[str, Any], path: str, tenant: Tenant, headers,
+                            model: str, lease: Optional[Lease]) -> Generation:
+    # Predicted completion length orders the queue; the deadline still allows for max_tokens,
+    # so a long but legitimate generation is not cut off at the predicted tail
+    prediction = length_predictor.predict(
+        model, tenant.name, path, data, timeout_policy.requested_max_tokens(model, data)
+    )
+    predicted_completion_tokens.labels(model=model).observe(prediction.typical)
+    predictions_by_level.labels(model=model, level=prediction.key_level).inc()
+
+    # Per-request deadline from prompt size, max_tokens and observed decode speed
+    timeout = timeout_policy.compute(model, data, headers)
+    request_timeout_seconds.labels(model=model).observe(timeout)
+    deadline = time.monotonic() + timeout
+
+    # Track metrics
+    request_counter.labels(model=model).inc()
+    tenant_requests.labels(tenant=tenant.name, tier=tenant.tier).inc()
+
+    # Wait for a backend slot; time spent queued counts against the deadline
+    cost_tokens = estimate_prompt_tokens(data) + prediction.typical
+    slot = await acquire_backend_slot(
+        model, timeout_policy.expected_seconds(model, data, prediction.typical), deadline, tenant, cost_tokens
+    )
+    return Generation(model, tenant, prediction, max(deadline - time.monotonic(), 0.001), slot, lease)
+
+async def complete_generation(generation: Generation, path: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a non-streaming generation upstream and record what we learn from it"""
+    model, tenant = generation.model, generation.tenant
+    try:
+        response = await forward_request(generation.endpoint, "POST", path, data, timeout=generation.timeout)
+    except HTTPException:
+        raise
+    except httpx.HTTPStatusError as e:
+        backend_health.success(model)
+        raise HTTPException(status_code=e.response.status_code, detail=str(e))
+    except httpx.ConnectError as e:
+        backend_health.failure(model)
+        logger.error(f"Upstream {model} is unreachable: {e}")
+        raise HTTPException(status_code=502, detail=f"Upstream {model} is unreachable: {e}")
+    except (httpx.TimeoutException, asyncio.TimeoutError) as e:
+        if isinstance(e, httpx.ConnectTimeout):
+            backend_health.failure(model)
+        upstream_timeouts.labels(model=model).inc()
+        logger.warning(f"Request to {model} exceeded its {generation.timeout:.1f}s deadline")
+        raise HTTPException(
+            status_code=504, detail=f"Upstream {model} did not respond within {generation.timeout:.1f}s"
+        )
+    except Exception as e:
+        logger.error(f"Error forwarding request: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    backend_health.success(model)
+
+    # Track duration and decode speed
+    elapsed = time.time() - generation.start_time
+    request_duration.labels(model=model).observe(elapsed)
+    usage = response.get("usage") or {}
+    completion_tokens = usage.get("completion_tokens", 0)
+    timeout_policy.observe(model, data, completion_tokens, elapsed)
+    record_completion_length(model, tenant, path, data, completion_tokens, generation.prediction)
+    tenant_served_tokens.labels(tenant=tenant.name, tier=tenant.tier).inc(usage.get("total_tokens", 0))
+    decode_speed.labels(model=model).set(timeout_policy.tracker.tokens_per_second(model))
+    return response
+
+async def proxy_generation(request: Request, path: str, cache_namespace: str):
+    """Shared handler for completion and chat completion requests"""
+    data = await request.json()
+
+    # Retries carrying the same Idempotency-Key attach to or replay the first run
+    idempotency_key = request.headers.get(idempotency.header)
+    if idempotency_key and idempotency.enabled and not data.get("stream", False):
+        tenant = tenant_resolver.resolve(request.headers)
+        scoped_key = f"idempotency:{tenant.owner}:{path}:{idempotency_key}"
+        return await idempotency.run(
+            scoped_key, data, lambda: handle_generation(request, data, path, cache_namespace)
+        )
+    return await handle_generation(request, data, path, cache_namespace)
+
+async def handle_generation(request: Request, data: Dict[str, Any], path: str, cache_namespace: str):
+    """Cache lookup, admission and upstream call for one generation request"""
+    data = dict(data)
+    background = bool(data.pop("background", False)) and generation_store.enabled
+
+    tenant = tenant_resolver.resolve(request.headers)
+
+    # Prompt references are pinned to a version here (so they key the caches)
+    # and expanded only for the upstream call
+    data = pin_prompts(data)
+
+    # A request the backend just rejected gets the same error without another round trip
+    negative_key = None
+    if negative_cache.enabled and not data.get("stream", False):
+        negative_key = negative_cache.key(path, data)
+        rejection = await negative_cache.lookup(negative_key)
+        if rejection is not None:
+            raise rejection
+
+    # Check cache if enabled
+    cached = None
+    found = {}
+    prefix_key = None
+    pooled = sample_pools.pooled(data)
+    if response_cache and not data.get("stream", False):
+        policy = freshness_policy(config['caching'], path)
+        cache_key = f"{cache_namespace}:{generate_cache_key(data)}"
+        cache_admission.record(cache_key)
+        lookups = [cache_key]
+        # Deterministic requests can be cut from a longer cached completion of the same prompt
+        if prefix_reuse.eligible(data) and data["model"] in MODEL_ENDPOINTS:
+            prefix_key = f"{cache_namespace}:prefix:{prefix_reuse.key(data)}"
+            cache_admission.record(prefix_key)
+            lookups.append(prefix_key)
+        # One round trip per cache node for both lookups
+        found = await cache_io(response_cache.get_many, lookups)
+        cached = found.get(cache_key)
+        served = sample_pools.serve(cache_key, data, cached.value, cached.samples) if cached is not None else None
+        if pooled and cached is not None:
+            sample_pool_requests.labels(outcome="served" if served is not None else "filling").inc()
+        if served is not None:
+            freshness = cached.freshness(policy['xfetch_beta'])
+            if freshness != "fresh":
+                # Stale or XFetch-early: answer now, regenerate in the background
+                if freshness == "stale":
+                    cache_stale_hits.inc()
+                schedule_cache_refresh(cache_key, data, path, tenant, dict(request.headers), policy, freshness)
+            cache_hits.inc()
+            request_log.record(path, cache_key, "hit", cost=cached.delta)
+            return served
+        else:
+            cache_misses.inc()
+
+    if prefix_key:
+        reused = await serve_from_prefix(prefix_key, found.get(prefix_key), data, path)
+        if reused is not None:
+            request_log.record(path, cache_key, "prefix", cost=found[prefix_key].delta)
+            return reused
+
+    # Near-duplicates of a cached prompt are answered without a backend call;
+    # not for sampled requests, which would get one frozen answer
+    semantic_query = None
+    if semantic_cache.enabled and not data.get("stream", False) and not pooled:
+        hit, semantic_query = await semantic_cache.lookup(path, cache_namespace, data)
+        if hit is not None:
+            if request_log.enabled:
+                request_log.record(
+                    path, f"{cache_namespace}:{generate_cache_key(data)}", "semantic", similarity=hit.similarity
+                )
+            return JSONResponse(hit.value, headers={
+                "X-Cache": "semantic", "X-Cache-Similarity": f"{hit.similarity:.4f}"
+            })
+
+    upstream_data = expand_prompts(data)
+    generation = await admit_generation(upstream_data, path, tenant, request.headers)
+
+    try:
+        # Detached generation the client can poll or reconnect to
+        if background:
+            return start_background_generation(generation, path, upstream_data)
+
+        # Stream handling
+        if data.get("stream", False):
+            release = generation.detach()
+            return StreamingResponse(
+                forward_stream(
+                    generation.model, generation.endpoint, path, upstream_data, generation.timeout,
+                    release, tenant, generation.prediction
+                ),
+                media_type="text/event-stream",
+                background=BackgroundTask(release)
+            )
+
+        # Regular request
+        started = time.monotonic()
+        try:
+            response = await complete_generation(generation, path, upstream_data)
+        except HTTPException as e:
+            if negative_key:
+                await negative_cache.remember(negative_key, e)
+            raise
+
+        # Cache response if enabled
+        if response_cache:
+            cache_key = f"{cache_namespace}:{generate_cache_key(data)}"
+            if cache_admission.admit(cache_key):
+                await cache_io(
+                    store_cached_response, response_cache, cache_key, data, response,
+                    freshness_policy(config['caching'], path), time.monotonic() - started
+                )
+            if prefix_key and cache_admission.admit(prefix_key):
+                track_cache_task(index_prefix(
+                    response_cache, prefix_key, data, generation.endpoint, response,
+                    freshness_policy(config['caching'], path)
+                ))
+        if semantic_query is not None:
+            semantic_cache.store(semantic_query, response)
+        if request_log.enabled:
+            request_log.record(
+                path, f"{cache_namespace}:{generate_cache_key(data)}", "miss",
+                size=len(json.dumps(response)), cost=time.monotonic() - started,
+                similarity=semantic_query.similarity if semantic_query is not None else None
+            )
+
+        return response
+    finally:
+        generation.release()
+
+def pin_prompts(data: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        return prompt_registry.pin(data, MODEL_ENDPOINTS)
+    except PromptError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+def expand_prompts(data: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        return prompt_registry.expand(data)
+    except PromptError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+def store_cached_response(cache: ResponseCache, cache_key: str, data: Dict[str, Any], response: Dict[str, Any],
+                          policy: Dict[str, Any], delta: float):
+    """Cache a response, or add it to the key's sample pool for sampled requests"""
+    if sample_pools.pooled(data):
+        # Re-read: concurrent requests may have filled the pool since the lookup
+        current = cache.get(cache_key)
+        samples = current.samples if current is not None else None
+        cache.set_samples(cache_key, sample_pools.add(samples, response), policy, delta)
     else:
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            url = f"{endpoint}{path}"
+        cache.set(cache_key, response, policy, delta)
 
-            if method == "GET":
-                response = await client.get(url)
-            elif method == "POST":
-                response = await client.post(url, json=data)
-            else:
-                raise HTTPException(status_code=405, detail="Method not allowed")
+async def serve_from_prefix(prefix_key: str, cached: Optional[CachedResponse], data: Dict[str, Any],
+                            path: str) -> Optional[Dict[str, Any]]:
+    if cached is None or cached.freshness(0) == "stale":
+        prefix_reuse_requests.labels(outcome="miss").inc()
+        return None
+    try:
+        response = await prefix_reuse.serve(cached.value, data, path, MODEL_ENDPOINTS[data["model"]])
+    except (httpx.HTTPError, KeyError, ValueError) as e:
+        # Backend tokenizer unavailable (e.g. an on-demand model that is stopped): generate instead
+        logger.debug(f"Prefix reuse of {prefix_key} failed: {e}")
+        prefix_reuse_requests.labels(outcome="error").inc()
+        return None
+    if response is None:
+        prefix_reuse_requests.labels(outcome="miss").inc()
+        return None
+    truncated = response["usage"]["completion_tokens"] < cached.value["response"]["usage"]["completion_tokens"]
+    prefix_reuse_requests.labels(outcome="truncated" if truncated else "whole").inc()
+    return response
+
+async def index_prefix(cache: ResponseCache, prefix_key: str, data: Dict[str, Any], endpoint: str,
+                       response: Dict[str, Any], policy: Dict[str, Any]):
+    """Keep the longest completion per prompt, with its token ids, for shorter max_tokens to reuse"""
+    try:
+        entry = await prefix_reuse.index_entry(data, endpoint, response)
+        if entry is None:
+            return
+        existing = await cache_io(cache.get, prefix_key)
+        current = existing.value if existing is not None and existing.freshness(0) != "stale" else None
+        if prefix_reuse.longer(entry, current):
+            await cache_io(cache.set, prefix_key, entry, policy)
+    except Exception as e:
+        logger.warning(f"Indexing {prefix_key} for prefix reuse failed: {e}")
 
-            response.raise_for_status()
-            return response.json()
+# Cache writes that run after the response has been sent
+cache_tasks: set = set()
 
-@app.get("/")
+def track_cache_task(coro):
+    task = asyncio.create_task(coro)
+    cache_tasks.add(task)
+    task.add_done_callback(cache_tasks.discard)
+
+# Cache refreshes running in this process, by cache key
+cache_refresh_tasks: Dict[str, asyncio.Task] = {}
+
+def schedule_cache_refresh(cache_key: str, data: Dict[str, Any], path: str, tenant: Tenant,
+                           headers: Dict[str, str], policy: Dict[str, Any], trigger: str):
+    """Regenerate a cached response off the request path, once per key"""
+    if cache_key in cache_refresh_tasks:
+        return
+    task = asyncio.create_task(refresh_cached_response(cache_key, data, path, tenant, headers, policy, trigger))
+    cache_refresh_tasks[cache_key] = task
+    task.add_done_callback(lambda _: cache_refresh_tasks.pop(cache_key, None))
+
+async def refresh_cached_response(cache_key: str, data: Dict[str, Any], path: str, tenant: Tenant,
+                                  headers: Dict[str, str], policy: Dict[str, Any], trigger: str):
+    cache = response_cache
+    if cache is None or not await cache_io(cache.claim_refresh, cache_key, policy['refresh_lock_seconds']):
+        return
+    try:
+        upstream_data = expand_prompts(data)
+        generation = await admit_generation(upstream_data, path, tenant, headers)
+        try:
+            started = time.monotonic()
+            response = await complete_generation(generation, path, upstream_data)
+        finally:
+            generation.release()
+        # A pool gets the new sample in place of its oldest one
+        await cache_io(store_cached_response, cache, cache_key, data, response, policy, time.monotonic() - started)
+        cache_refreshes.labels(trigger=trigger, outcome="refreshed").inc()
+    except Exception as e:
+        # The entry keeps being served until it drops out of its stale window
+        logger.warning(f"Cache refresh of {cache_key} failed: {e}")
+        cache_refreshes.labels(trigger=trigger, outcome="failed").inc()
+    finally:
+        await cache_io(cache.release_refresh, cache_key)
+
+def start_background_generation(generation: Generation, path: str, data: Dict[str, Any]):
+    """Run the generation upstream in a task that survives client disconnects"""
+    record = generation_store.create(generation.model, generation.tenant.owner, path)
+    if record is None:
+        raise HTTPException(
+            status_code=503, detail="Too many background generations in progress", headers={"Retry-After": "5"}
+        )
+
+    client_stream = data.get("stream", False)
+    upstream_data = {**data, "stream": True}
+    if not client_stream:
+        # Polling clients get usage in the assembled output
+        upstream_data["stream_options"] = {"include_usage": True}
+
+    generation_store.start(record, forward_stream(
+        generation.model, generation.endpoint, path, upstream_data, generation.timeout,
+        generation.detach(), generation.tenant, generation.prediction
+    ))
+    headers = {"X-Generation-Id": record.id, "Location": f"/v1/generations/{record.id}"}
+    if client_stream:
+        return StreamingResponse(generation_store.subscribe(record), media_type="text/event-stream", headers=headers)
+    return JSONResponse(record.to_dict(), status_code=202, headers=headers)
+
+def get_background_generation(generation_id: str, request: Request):
+    tenant = tenant_resolver.resolve(request.headers)
+    record = generation_store.get(generation_id, tenant.owner)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Generation {generation_id} not found")
+    return record
+
+async def run_batch_request(path: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+    """Execute one batch line through the same queues as interactive traffic"""
+    try:
+        data = expand_prompts(pin_prompts({**body, "stream": False}))
+        generation = await admit_generation(data, path, batch_tenant, {})
+        try:
+            return 200, await complete_generation(generation, path, data)
+        finally:
+            generation.release()
+    except HTTPException as e:
+        return e.status_code, {"error": {"message": str(e.detail), "code": e.status_code}}
+
+def interactive_queue_depth() -> int:
+    return sum(len(queue) for queue in backend_queues.values())
+
+routes = APIRouter()
+
+@routes.get("/")
 async def root():
     return {
         "message": "Multi-Model API Gateway",
@@ -138,31 +871,66 @@ async def root():
             "models": "/v1/models",
             "completions": "/v1/completions",
             "chat": "/v1/chat/completions",
+            "files": "/v1/files",
+            "batches": "/v1/batches",
+            "prompts": "/v1/prompts",
+            "generations": "/v1/generations/{id}",
             "health": "/health",
+            "ready": "/ready",
             "metrics": "/metrics"
         }
     }
 
-@app.get("/health")
+@routes.get("/health")
 async def health_check():
     """Check health of all model servers"""
-    statuses = {}
-    for model_name, endpoint in MODEL_ENDPOINTS.items():
+    async def probe(model: str, endpoint: str) -> bool:
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"{endpoint}/health")
-                statuses[model_name] = response.status_code == 200
-        except:
-            statuses[model_name] = False
+            response = await upstream_client().get(f"{endpoint}/health", timeout=5.0)
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            # Also what fast-fail goes by
+            backend_health.failure(model)
+            return False
+        except httpx.HTTPError:
+            return False
+        backend_health.success(model)
+        return response.status_code == 200
 
+    results = await asyncio.gather(*(probe(model, endpoint) for model, endpoint in MODEL_ENDPOINTS.items()))
+    statuses = dict(zip(MODEL_ENDPOINTS, results))
     all_healthy = all(statuses.values())
     return {
         "status": "healthy" if all_healthy else "degraded",
         "models": statuses,
+        "fast_fail": backend_health.status(),
         "timestamp": time.time()
     }
 
-@app.get("/v1/models")
+@routes.get("/ready")
+async def readiness():
+    """200 once backends have been probed and warmed; 503 until then"""
+    return JSONResponse(readiness_gate.status(), status_code=200 if readiness_gate.ready else 503)
+
+@routes.get("/v1/lifecycle")
+async def lifecycle_status():
+    """On-demand model states and GPU memory reservation"""
+    if not lifecycle_manager.enabled:
+        raise HTTPException(status_code=404, detail="Model lifecycle management is disabled")
+    return lifecycle_manager.status()
+
+@routes.get("/v1/cache")
+async def cache_status():
+    """Response cache backend and admission filter state"""
+    return {
+        "enabled": response_cache is not None,
+        "ttl": config['caching']['ttl'],
+        "admission": cache_admission.stats(),
+        "storage": response_cache.stats() if response_cache else {"codec": cache_codec.stats()},
+        "semantic": semantic_cache.stats(),
+        "request_log": request_log.stats()
+    }
+
+@routes.get("/v1/models")
 async def list_models():
     """List available models"""
     return {
@@ -173,131 +941,375 @@ async def list_models():
         ]
     }
 
-@app.post("/v1/completions")
+@routes.post("/v1/completions")
 async def completions(request: Request):
     """Handle completion requests"""
-    data = await request.json()
-    model_name = data.get("model")
+    return await proxy_generation(request, "/v1/completions", "completion")
 
-    # Check cache if enabled
-    if redis_client and not data.get("stream", False):
-        cache_key = f"completion:{generate_cache_key(data)}"
-        cached_response = redis_client.get(cache_key)
-        if cached_response:
-            cache_hits.inc()
-            return json.loads(cached_response)
-        else:
-            cache_misses.inc()
+@routes.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    """Handle chat completion requests"""
+    return await proxy_generation(request, "/v1/chat/completions", "chat")
 
-    # Get endpoint
-    endpoint = router.get_model_endpoint(model_name)
-    model = model_name or router.get_next_model()
+@routes.get("/v1/models/{model_name}/completions")
+async def model_specific_completions(model_name: str, request: Request):
+    """Handle model-specific completion requests"""
+    if model_name not in MODEL_ENDPOINTS:
+        raise HTTPException(status_code=404, detail=f"Model {model_name} not found")
 
-    # Track metrics
-    request_counter.labels(model=model).inc()
-    start_time = time.time()
+    data = await request.json()
+    data["model"] = model_name
+    return await completions(request)
 
+@routes.get("/v1/generations/{generation_id}")
+async def poll_generation(generation_id: str, request: Request):
+    """Status and output so far of a background generation"""
+    return get_background_generation(generation_id, request).to_dict()
+
+@routes.get("/v1/generations/{generation_id}/events")
+async def generation_events(generation_id: str, request: Request):
+    """Reattach to a background generation's SSE stream, resuming after Last-Event-ID"""
+    record = get_background_generation(generation_id, request)
+    last_event_id = request.headers.get("Last-Event-ID") or request.query_params.get("last_event_id") or "0"
     try:
-        # Stream handling
-        if data.get("stream", False):
-            return StreamingResponse(
-                forward_request(endpoint, "POST", "/v1/completions", data, stream=True),
-                media_type="text/event-stream"
-            )
+        last_event_id = int(last_event_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Last-Event-ID must be an integer")
+    if last_event_id + 1 < record.first_event_id:
+        raise HTTPException(status_code=410, detail=f"Events before {record.first_event_id} are no longer retained")
+    background_reconnects.inc()
+    return StreamingResponse(
+        generation_store.subscribe(record, last_event_id),
+        media_type="text/event-stream",
+        headers={"X-Generation-Id": record.id}
+    )
 
-        # Regular request
-        response = await forward_request(endpoint, "POST", "/v1/completions", data)
+@routes.delete("/v1/generations/{generation_id}")
+async def cancel_generation(generation_id: str, request: Request):
+    record = get_background_generation(generation_id, request)
+    generation_store.cancel(record)
+    return record.to_dict()
 
-        # Cache response if enabled
-        if redis_client:
-            cache_key = f"completion:{generate_cache_key(data)}"
-            redis_client.setex(
-                cache_key,
-                config['caching']['ttl'],
-                json.dumps(response)
-            )
+def batch_error(e: BatchError) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=str(e))
 
-        # Track duration
-        request_duration.labels(model=model).observe(time.time() - start_time)
+@routes.post("/v1/files")
+async def upload_file(request: Request):
+    """Upload a JSONL file for the batch API (multipart `file` field or raw body)"""
+    max_bytes = batch_runner.settings['max_file_bytes']
+    too_large = HTTPException(status_code=413, detail=f"File exceeds {max_bytes} bytes")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes + 64 * 1024:
+        # Multipart framing aside, the upload cannot fit
+        raise too_large
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None:
+            raise HTTPException(status_code=400, detail="Missing file field")
+        content = await upload.read(max_bytes + 1)
+        filename = upload.filename or "upload.jsonl"
+        purpose = form.get("purpose", "batch")
+    else:
+        # Read incrementally so an oversized upload is refused without buffering all of it
+        chunks, size = [], 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > max_bytes:
+                raise too_large
+            chunks.append(chunk)
+        content = b"".join(chunks)
+        filename = request.headers.get("X-Filename", "upload.jsonl")
+        purpose = request.query_params.get("purpose", "batch")
+    if len(content) > max_bytes:
+        raise too_large
+    return await asyncio.to_thread(batch_runner.store.create_file, content, filename, purpose)
 
-        return response
+@routes.get("/v1/files/{file_id}")
+async def get_file(file_id: str):
+    record = await asyncio.to_thread(batch_runner.store.get_file, file_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"File {file_id} not found")
+    return record
 
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(status_code=e.response.status_code, detail=str(e))
-    except Exception as e:
-        logger.error(f"Error forwarding request: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+@routes.get("/v1/files/{file_id}/content")
+async def get_file_content(file_id: str):
+    if await asyncio.to_thread(batch_runner.store.get_file, file_id) is None:
+        raise HTTPException(status_code=404, detail=f"File {file_id} not found")
+    return FileResponse(batch_runner.store.file_path(file_id), media_type="application/jsonl")
 
-@app.post("/v1/chat/completions")
-async def chat_completions(request: Request):
-    """Handle chat completion requests"""
+@routes.post("/v1/batches")
+async def create_batch(request: Request):
+    """Create an OpenAI-style batch job from an uploaded JSONL file"""
     data = await request.json()
-    model_name = data.get("model")
-
-    # Check cache if enabled
-    if redis_client and not data.get("stream", False):
-        cache_key = f"chat:{generate_cache_key(data)}"
-        cached_response = redis_client.get(cache_key)
-        if cached_response:
-            cache_hits.inc()
-            return json.loads(cached_response)
-        else:
-            cache_misses.inc()
+    try:
+        return await batch_runner.create_batch(
+            data.get("input_file_id"),
+            data.get("endpoint", "/v1/chat/completions"),
+            data.get("completion_window", "24h"),
+            data.get("metadata"),
+        )
+    except BatchError as e:
+        raise batch_error(e)
 
-    # Get endpoint
-    endpoint = router.get_model_endpoint(model_name)
-    model = model_name or router.get_next_model()
+@routes.get("/v1/batches")
+async def list_batches():
+    return {"object": "list", "data": await asyncio.to_thread(batch_runner.store.list_batches)}
 
-    # Track metrics
-    request_counter.labels(model=model).inc()
-    start_time = time.time()
+@routes.get("/v1/batches/{batch_id}")
+async def get_batch(batch_id: str):
+    batch = await asyncio.to_thread(batch_runner.store.get_batch, batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail=f"Batch {batch_id} not found")
+    return batch
 
+@routes.post("/v1/batches/{batch_id}/cancel")
+async def cancel_batch(batch_id: str):
     try:
-        # Stream handling
-        if data.get("stream", False):
-            return StreamingResponse(
-                forward_request(endpoint, "POST", "/v1/chat/completions", data, stream=True),
-                media_type="text/event-stream"
-            )
+        return await batch_runner.cancel_batch(batch_id)
+    except BatchError as e:
+        raise batch_error(e)
 
-        # Regular request
-        response = await forward_request(endpoint, "POST", "/v1/chat/completions", data)
-
-        # Cache response if enabled
-        if redis_client:
-            cache_key = f"chat:{generate_cache_key(data)}"
-            redis_client.setex(
-                cache_key,
-                config['caching']['ttl'],
-                json.dumps(response)
-            )
+def prompt_registry_enabled():
+    if not prompt_registry.enabled:
+        raise HTTPException(status_code=404, detail="The prompt registry is disabled")
 
-        # Track duration
-        request_duration.labels(model=model).observe(time.time() - start_time)
+@routes.post("/v1/prompts")
+async def register_prompt(request: Request):
+    """Register a new version of a prompt; requests refer to it with prompt_ref"""
+    prompt_registry_enabled()
+    data = await request.json()
+    model = data.get("model")
+    if model is not None and model not in MODEL_ENDPOINTS:
+        raise HTTPException(status_code=422, detail=f"Model {model} not found")
+    try:
+        version = prompt_registry.register(data.get("id"), data)
+    except PromptError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Storing the prompt failed: {e}")
+    prompt = prompt_registry.get(data["id"])[-1]
 
-        return response
+    # Seed the prefix cache of the backends that will see it, off the request path
+    text = prompt_registry.warmup_text(prompt)
+    if text and readiness_gate.settings["warmup_requests"]:
+        for target in [prompt["model"]] if prompt["model"] else list(MODEL_ENDPOINTS):
+            # Stopped on-demand models are not started just to be warmed
+            managed = lifecycle_manager.models.get(target) if lifecycle_manager.enabled else None
+            if backend_health.is_open(target) or (managed is not None and not managed.resident):
+                continue
+            track_cache_task(readiness_gate.warm_prompts(upstream_client(), target, MODEL_ENDPOINTS[target], [text]))
+    return {"id": data["id"], "version": version, "model": prompt["model"]}
 
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(status_code=e.response.status_code, detail=str(e))
-    except Exception as e:
-        logger.error(f"Error forwarding request: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+@routes.get("/v1/prompts")
+async def list_prompts():
+    prompt_registry_enabled()
+    return {
+        "object": "list",
+        "data": [
+            {"id": prompt_id, "latest_version": len(versions), "model": versions[-1]["model"]}
+            for prompt_id, versions in prompt_registry.prompts.items()
+        ]
+    }
 
-@app.get("/v1/models/{model_name}/completions")
-async def model_specific_completions(model_name: str, request: Request):
-    """Handle model-specific completion requests"""
-    if model_name not in MODEL_ENDPOINTS:
-        raise HTTPException(status_code=404, detail=f"Model {model_name} not found")
+@routes.get("/v1/prompts/{prompt_id}")
+async def get_prompt(prompt_id: str):
+    """Latest version of a prompt"""
+    return await get_prompt_version(prompt_id, "")
 
-    data = await request.json()
-    data["model"] = model_name
-    return await completions(request)
+@routes.get("/v1/prompts/{prompt_id}/{version}")
+async def get_prompt_version(prompt_id: str, version: str):
+    prompt_registry_enabled()
+    ref = f"{prompt_id}@{version}" if version else prompt_id
+    try:
+        prompt_id, number, prompt = prompt_registry.resolve(ref)
+    except PromptError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"id": prompt_id, "version": number, **prompt}
 
-@app.get("/metrics")
+@routes.get("/metrics")
 async def metrics():
     """Prometheus metrics endpoint"""
     return Response(content=generate_latest(), media_type="text/plain")
 
+def _record_prewarm(model: str, nbytes: int, seconds: float):
+    model_prewarm_bytes.labels(model=model).inc(nbytes)
+    model_prewarm_seconds.labels(model=model).observe(seconds)
+
+def _record_cache_encode(raw_bytes: int, stored_bytes: int, seconds: float):
+    cache_compression_ratio.observe(raw_bytes / max(stored_bytes, 1))
+    cache_encode_seconds.observe(seconds)
+
+def _record_backend_health(model: str, kind: str):
+    if kind == "rejected":
+        backend_fast_fails.labels(model=model).inc()
+    elif kind == "opened":
+        logger.warning(f"Upstream {model} unreachable, failing its requests fast")
+    elif kind == "closed":
+        logger.info(f"Upstream {model} reachable again")
+
+def _record_semantic_lookup(outcome: str, similarity: Optional[float]):
+    semantic_cache_lookups.labels(outcome=outcome).inc()
+    if similarity is not None:
+        semantic_cache_similarity.labels(outcome=outcome).observe(similarity)
+
+def _record_warmup(backend: BackendWarmup):
+    if backend.warmup_seconds is not None:
+        backend_warmup_seconds.labels(model=backend.model).observe(backend.warmup_seconds)
+
+# Components built by init_gateway()
+router: ModelRouter
+timeout_policy: TimeoutPolicy
+tenant_resolver: TenantResolver
+length_predictor: CompletionLengthPredictor
+generation_store: GenerationStore
+lifecycle_manager: ModelLifecycleManager
+readiness_gate: ReadinessGate
+scheduling_enabled: bool
+backend_queues: Dict[str, Any]
+idempotency: IdempotencyStore
+negative_cache: NegativeCache
+backend_health: BackendHealth
+prompt_registry: PromptRegistry
+cache_admission: TinyLfuAdmission
+request_log: RequestLog
+cache_codec: CacheCodec
+semantic_cache: SemanticCache
+sample_pools: SamplePools
+prefix_reuse: PrefixReuse
+batch_tenant: Tenant
+batch_runner: BatchRunner
+_tenant_collector: Optional[TenantQueueCollector] = None
+
+def init_gateway(gateway_config: Dict[str, Any]):
+    """Build the gateway's components from a config dict (no I/O; cache tiers connect at startup)"""
+    global config, router, timeout_policy, tenant_resolver, length_predictor, generation_store
+    global lifecycle_manager, readiness_gate, scheduling_enabled, backend_queues, idempotency
+    global negative_cache, backend_health, prompt_registry
+    global cache_admission, request_log, cache_codec, response_cache, semantic_cache, sample_pools, prefix_reuse
+    global batch_tenant, batch_runner, http_client, disk_store, _tenant_collector
+    config = gateway_config
+    response_cache = None
+    disk_store = None
+    http_client = None
+
+    # models.<name>.endpoint overrides the compose service address
+    for name, model_config in config['models'].items():
+        if model_config.get('endpoint'):
+            MODEL_ENDPOINTS[name] = model_config['endpoint']
+
+    router = ModelRouter()
+    timeout_policy = TimeoutPolicy(config.get('timeouts'), config['models'])
+    tenant_resolver = TenantResolver(config.get('tenants'))
+    length_predictor = CompletionLengthPredictor(config.get('prediction'))
+    generation_store = GenerationStore(config.get('background'))
+
+    lifecycle_manager = ModelLifecycleManager(config.get('lifecycle'), config['models'], config.get('prewarm'))
+    if lifecycle_manager.enabled:
+        # Backends are launched by the gateway itself on the configured host/ports
+        for name, managed in lifecycle_manager.models.items():
+            MODEL_ENDPOINTS[name] = managed.endpoint
+            model_resident.labels(model=name).set_function(lambda m=managed: 1 if m.resident else 0)
+        gpu_memory_reserved.set_function(lifecycle_manager.reserved_memory)
+    lifecycle_manager.on_event = lambda kind, model, seconds: (
+        model_load_seconds if kind == "load" else model_unload_seconds
+    ).labels(model=model).observe(seconds)
+    lifecycle_manager.prewarmer.on_model = _record_prewarm
+
+    # Registered prompts are expanded into requests that reference them, and warm their backends
+    prompt_registry = PromptRegistry(config.get('prompts'))
+    prompt_registry.on_expand = lambda cached: prompt_expansions.labels(cached=str(cached).lower()).inc()
+
+    readiness_gate = ReadinessGate(config.get('warmup'), config['models'])
+    readiness_gate.on_backend = _record_warmup
+    readiness_gate.extra_prompts = prompt_registry.warmup_prompts
+    gateway_ready.set_function(lambda: 1 if readiness_gate.ready else 0)
+    background_active.set_function(lambda: sum(1 for g in generation_store.generations.values() if not g.finished))
+    predictor_keys.set_function(lambda: len(length_predictor.sketches))
+
+    scheduling_enabled = config.get('scheduling', {}).get('enabled', True)
+    backend_queues = build_backend_queues(
+        config.get('scheduling'), config['models'],
+        tenant_resolver.settings if tenant_resolver.enabled else None
+    )
+    for model, queue in backend_queues.items():
+        queue_depth.labels(model=model).set_function(queue.__len__)
+        inflight_requests.labels(model=model).set_function(lambda q=queue: q.inflight)
+        estimated_queue_wait.labels(model=model).set_function(queue.current_wait)
+    if tenant_resolver.enabled and _tenant_collector is None:
+        _tenant_collector = TenantQueueCollector()
+        REGISTRY.register(_tenant_collector)
+
+    # Idempotency records start in-process and move to Redis once it is reachable
+    idempotency_config = config.get('idempotency', {})
+    idempotency = IdempotencyStore(idempotency_config, LocalCache(idempotency_config.get('max_entries', 10000)))
+    idempotency.on_event = lambda outcome: idempotency_events.labels(outcome=outcome).inc()
+
+    # Repeated rejected requests and unreachable backends are answered without an upstream call
+    negative_config = config.get('negative_cache', {})
+    negative_cache = NegativeCache(negative_config, LocalCache(negative_config.get('max_entries', 10000)))
+    negative_cache.on_event = lambda kind, status: (
+        negative_cache_hits if kind == "hit" else negative_cache_stores
+    ).labels(status=str(status)).inc()
+    backend_health = BackendHealth(config.get('fast_fail'))
+    backend_health.on_event = _record_backend_health
+    for model in MODEL_ENDPOINTS:
+        backend_circuit_open.labels(model=model).set_function(lambda m=model: 1 if backend_health.is_open(m) else 0)
+
+    # Responses are only cached once their key has been requested often enough
+    cache_admission = TinyLfuAdmission(config['caching'].get('admission'))
+    cache_admission.on_event = lambda outcome: (
+        cache_admissions if outcome == "admitted" else cache_rejections
+    ).inc()
+    # Cacheable requests can be logged for scripts/cache_simulator.py
+    request_log = RequestLog(config['caching'].get('request_log'))
+    cache_codec = CacheCodec(config['caching'].get('codec'))
+    cache_codec.on_encode = _record_cache_encode
+    cache_codec.on_decode = cache_decode_seconds.observe
+    sample_pools = SamplePools(config['caching'].get('sample_pool'))
+    prefix_reuse = PrefixReuse(config['caching'].get('prefix_reuse'), config['models'], upstream_client)
+    semantic_config = {**(config['caching'].get('semantic') or {})}
+    if not config['caching']['enabled']:
+        semantic_config['enabled'] = False
+    semantic_cache = SemanticCache(semantic_config, config['caching'].get('endpoints'), upstream_client)
+    semantic_cache.on_lookup = _record_semantic_lookup
+    semantic_cache_entries.set_function(semantic_cache.__len__)
+
+    batch_config = config.get('batch', {})
+    batch_tenant = Tenant("batch", "batch", float(batch_config.get('tenant_weight', 1)))
+    batch_runner = BatchRunner(batch_config, run_batch_request, interactive_queue_depth)
+    batch_runner.on_result = lambda status: batch_requests.labels(status=status).inc()
+    batch_jobs_active.set_function(lambda: sum(1 for task in batch_runner.tasks.values() if not task.done()))
+
+def create_app(gateway_config: Optional[Dict[str, Any]] = None, config_path: Optional[str] = None) -> FastAPI:
+    """Application factory: `uvicorn --factory api_gateway.main:create_app`, or pass a config dict in tests"""
+    init_gateway(gateway_config if gateway_config is not None else load_config(config_path))
+    application = FastAPI(
+        title="Multi-Model API Gateway",
+        description="Unified gateway for multiple LLM models",
+        version="1.0.0",
+        lifespan=lifespan
+    )
+
+    # CORS middleware
+    application.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    application.include_router(routes)
+    return application
+
+def __getattr__(name: str):
+    # `uvicorn api_gateway.main:app` still works: the app is built on first access, not on import
+    if name == "app":
+        application = create_app()
+        globals()["app"] = application
+        return application
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    uvicorn.run(create_app(), host="0.0.0.0", port=8080)
\ No newline at end of file
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import logging
+from typing import Dict, Any, Callable, Optional
+
+from fastapi import HTTPException
+
+from .cache import CacheBackendError
+
+logger = logging.getLogger(__name__)
+
+# Default knobs, overridable from the `negative_cache` section of model_configs.yaml
+DEFAULT_NEGATIVE_CACHE_CONFIG = {
+    "enabled": True,
+    "ttl_seconds": 30,
+    "statuses": [400, 404, 413, 422],
+    "max_entries": 10000,
+}
+
+
+class NegativeCache:
+    """Remembers upstream rejections of a request for a short while
+
+    A request the backend answered with one of `statuses` (a deterministic
+    client error: malformed, context too long, unknown model name) gets the
+    same error from the gateway for ttl_seconds instead of another upstream
+    round trip. Keyed by endpoint and the full request body, so any change
+    to the request goes upstream again. Kept in the cache backend: in memory,
+    or Redis once reachable so retries landing on other instances are
+    answered too. A backend that fails is treated as a miss (lookup) or
+    skipped (remember); the request itself goes on.
+    """
+
+    def __init__(self, negative_config: Optional[Dict[str, Any]], backend):
+        self.settings = {**DEFAULT_NEGATIVE_CACHE_CONFIG, **(negative_config or {})}
+        self.backend = backend
+        self.statuses = {int(status) for status in self.settings["statuses"]}
+        self.on_event: Optional[Callable[[str, int], None]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings["enabled"])
+
+    @staticmethod
+    def key(path: str, data: Dict[str, Any]) -> str:
+        return f"negative:{path}:{hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest()}"
+
+    def _event(self, kind: str, status: int):
+        if self.on_event:
+            self.on_event(kind, status)
+
+    async def lookup(self, key: str) -> Optional[HTTPException]:
+        """The remembered rejection for this request, if any"""
+        try:
+            raw = await self.backend.get(key)
+        except CacheBackendError as e:
+            logger.warning(f"Negative cache lookup failed, treating as a miss: {e}")
+            return None
+        if not raw:
+            return None
+        stored = json.loads(raw)
+        self._event("hit", stored["status_code"])
+        return HTTPException(status_code=stored["status_code"], detail=stored["detail"],
+                             headers={"X-Cache": "negative"})
+
+    async def remember(self, key: str, error: HTTPException):
+        if error.status_code not in self.statuses:
+            return
+        stored = json.dumps({"status_code": error.status_code, "detail": error.detail})
+        try:
+            await self.backend.set(key, stored, int(self.settings["ttl_seconds"]))
+        except CacheBackendError as e:
+            logger.warning(f"Negative cache could not remember a {error.status_code}: {e}")
+            return
+        self._event("stored", error.status_code)
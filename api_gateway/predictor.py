@@ -0,0 +1,188 @@
+import hashlib
+import math
+import re
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+# Default knobs, overridable from the `prediction` section of model_configs.yaml
+DEFAULT_PREDICTION_CONFIG = {
+    "enabled": True,
+    "relative_accuracy": 0.05,
+    "max_buckets": 128,
+    "decay_after": 2000,
+    "max_keys": 5000,
+    "min_samples": 20,
+    "schedule_quantile": 0.5,
+}
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+
+
+class QuantileSketch:
+    """Log-bucketed streaming quantile sketch (DDSketch-style) with bounded memory
+
+    Values land in buckets whose boundaries grow by gamma, so any quantile is
+    answered within relative_accuracy. The lowest buckets are merged when
+    max_buckets is exceeded, and counts are halved every decay_after samples so
+    the sketch follows shifts in traffic.
+    """
+
+    __slots__ = ("gamma", "log_gamma", "max_buckets", "decay_after", "buckets", "zeros", "count", "since_decay")
+
+    def __init__(self, relative_accuracy: float = 0.05, max_buckets: int = 128, decay_after: int = 2000):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.decay_after = decay_after
+        self.buckets: Dict[int, float] = {}
+        self.zeros = 0.0
+        self.count = 0.0
+        self.since_decay = 0
+
+    def add(self, value: float):
+        if value <= 0:
+            self.zeros += 1
+        else:
+            index = math.ceil(math.log(value) / self.log_gamma)
+            self.buckets[index] = self.buckets.get(index, 0.0) + 1
+            if len(self.buckets) > self.max_buckets:
+                self._collapse()
+        self.count += 1
+        self.since_decay += 1
+        if self.decay_after and self.since_decay >= self.decay_after:
+            self._decay()
+
+    def _collapse(self):
+        lowest, second = sorted(self.buckets)[:2]
+        self.buckets[second] += self.buckets.pop(lowest)
+
+    def _decay(self):
+        self.since_decay = 0
+        self.zeros /= 2
+        self.buckets = {i: c / 2 for i, c in self.buckets.items() if c / 2 >= 0.25}
+        self.count = self.zeros + sum(self.buckets.values())
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # Midpoint of the bucket in log space
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return self.gamma ** max(self.buckets) if self.buckets else 0.0
+
+
+class LengthPrediction:
+    """Predicted completion length for one request"""
+
+    __slots__ = ("typical", "max_tokens", "samples", "key_level")
+
+    def __init__(self, typical: int, max_tokens: int, samples: float, key_level: str):
+        self.typical = typical
+        self.max_tokens = max_tokens
+        self.samples = samples
+        self.key_level = key_level
+
+
+def prompt_fingerprint(data: Dict[str, Any]) -> str:
+    """Fingerprint of the prompt template, ignoring numbers, whitespace and the user's text
+
+    Chat requests are keyed by their system prompt(s) and message role layout,
+    completions by the opening of the prompt, which is where templates live.
+    """
+    if "messages" in data:
+        parts: List[str] = []
+        for message in data.get("messages") or []:
+            if not isinstance(message, dict):
+                continue
+            role = str(message.get("role", ""))
+            parts.append(role)
+            if role == "system":
+                parts.append(str(message.get("content", "")))
+        response_format = data.get("response_format")
+        if response_format:
+            parts.append(str(response_format.get("type", "") if isinstance(response_format, dict) else response_format))
+        if data.get("tools"):
+            parts.append("tools")
+        text = "|".join(parts)
+    else:
+        prompt = data.get("prompt") or ""
+        # A list is either batched prompts (key by the first) or one prompt as token ids
+        if isinstance(prompt, list) and prompt and not isinstance(prompt[0], int):
+            prompt = prompt[0]
+        text = str(prompt)[:128]
+    text = _SPACES.sub(" ", _DIGITS.sub("0", text)).strip().lower()
+    return hashlib.md5(text.encode()).hexdigest()[:16]
+
+
+class CompletionLengthPredictor:
+    """Online predictor of completion length from observed usage.completion_tokens
+
+    Sketches are kept for progressively coarser keys: (model, tenant, endpoint,
+    fingerprint), (model, endpoint, fingerprint), (model, endpoint) and (model,).
+    A prediction comes from the most specific key with enough samples. Keys are
+    evicted in LRU order once max_keys is reached.
+    """
+
+    LEVELS = ("tenant_template", "template", "endpoint", "model")
+
+    def __init__(self, prediction_config: Optional[Dict[str, Any]] = None):
+        self.settings = {**DEFAULT_PREDICTION_CONFIG, **(prediction_config or {})}
+        self.sketches: "OrderedDict[Tuple, QuantileSketch]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings["enabled"])
+
+    def _keys(self, model: str, tenant: str, endpoint: str, fingerprint: str) -> List[Tuple]:
+        return [
+            (model, tenant, endpoint, fingerprint),
+            (model, endpoint, fingerprint),
+            (model, endpoint),
+            (model,),
+        ]
+
+    def _sketch(self, key: Tuple) -> QuantileSketch:
+        sketch = self.sketches.get(key)
+        if sketch is None:
+            sketch = QuantileSketch(
+                relative_accuracy=self.settings["relative_accuracy"],
+                max_buckets=self.settings["max_buckets"],
+                decay_after=self.settings["decay_after"],
+            )
+            self.sketches[key] = sketch
+            while len(self.sketches) > self.settings["max_keys"]:
+                self.sketches.popitem(last=False)
+        else:
+            self.sketches.move_to_end(key)
+        return sketch
+
+    def observe(self, model: str, tenant: str, endpoint: str, data: Dict[str, Any], completion_tokens: int):
+        if not self.enabled:
+            return
+        for key in self._keys(model, tenant, endpoint, prompt_fingerprint(data)):
+            self._sketch(key).add(completion_tokens)
+
+    def predict(self, model: str, tenant: str, endpoint: str, data: Dict[str, Any],
+                max_tokens: int) -> LengthPrediction:
+        """Predict the typical completion length, never above max_tokens"""
+        if self.enabled:
+            keys = self._keys(model, tenant, endpoint, prompt_fingerprint(data))
+            for level, key in zip(self.LEVELS, keys):
+                sketch = self.sketches.get(key)
+                if sketch is None or sketch.count < self.settings["min_samples"]:
+                    continue
+                typical = sketch.quantile(self.settings["schedule_quantile"]) or 0
+                return LengthPrediction(
+                    typical=max(1, min(max_tokens, math.ceil(typical))),
+                    max_tokens=max_tokens,
+                    samples=sketch.count,
+                    key_level=level,
+                )
+        return LengthPrediction(max_tokens, max_tokens, 0, "max_tokens")
@@ -0,0 +1,190 @@
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+from typing import Dict, Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Default knobs, overridable from the `caching.prefix_reuse` section of model_configs.yaml
+DEFAULT_PREFIX_REUSE_CONFIG = {
+    "enabled": True,
+    "tokenizer": "backend",
+    "tokenize_timeout": 2.0,
+    "default_temperature": 1.0,
+    # Length limit a request without max_tokens gets, by path (OpenAI/vLLM legacy completions: 16)
+    "default_max_tokens": {"/v1/completions": 16},
+}
+
+# Length limits are what the prefix index abstracts over
+LENGTH_FIELDS = ("max_tokens", "max_completion_tokens")
+
+# Output shapes that a truncated completion cannot reproduce
+UNSUPPORTED_FIELDS = ("logprobs", "top_logprobs", "echo", "best_of", "suffix", "tools", "functions")
+
+
+class BackendTokenizer:
+    """Token ids via the model server's /tokenize and /detokenize (vLLM, SGLang)"""
+
+    def __init__(self, client_factory: Callable[[], Any], timeout: float):
+        self.client_factory = client_factory
+        self.timeout = timeout
+
+    async def tokenize(self, model: str, endpoint: str, text: str) -> List[int]:
+        response = await self.client_factory().post(
+            f"{endpoint}/tokenize", json={"model": model, "prompt": text, "add_special_tokens": False},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()["tokens"]
+
+    async def detokenize(self, model: str, endpoint: str, tokens: List[int]) -> str:
+        response = await self.client_factory().post(
+            f"{endpoint}/detokenize", json={"model": model, "tokens": tokens}, timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()["prompt"]
+
+
+class TransformersTokenizer:
+    """Local Hugging Face tokenizers (models.<name>.tokenizer, else models.<name>.name); needs transformers"""
+
+    def __init__(self, model_configs: Dict[str, Any]):
+        from transformers import AutoTokenizer
+        self.auto_tokenizer = AutoTokenizer
+        self.model_configs = model_configs
+        self.tokenizers: Dict[str, Any] = {}
+
+    async def _tokenizer(self, model: str):
+        if model not in self.tokenizers:
+            model_config = self.model_configs.get(model, {})
+            source = model_config.get("tokenizer") or model_config.get("name") or model
+            self.tokenizers[model] = await asyncio.to_thread(self.auto_tokenizer.from_pretrained, source)
+        return self.tokenizers[model]
+
+    async def tokenize(self, model: str, endpoint: str, text: str) -> List[int]:
+        return (await self._tokenizer(model)).encode(text, add_special_tokens=False)
+
+    async def detokenize(self, model: str, endpoint: str, tokens: List[int]) -> str:
+        return (await self._tokenizer(model)).decode(tokens)
+
+
+def completion_text(response: Dict[str, Any]) -> Optional[str]:
+    choices = response.get("choices") or []
+    if len(choices) != 1:
+        return None
+    choice = choices[0]
+    if "message" in choice:
+        return (choice["message"] or {}).get("content")
+    return choice.get("text")
+
+
+def with_completion(response: Dict[str, Any], text: str, completion_tokens: int, finish_reason: str) -> Dict[str, Any]:
+    truncated = copy.deepcopy(response)
+    choice = truncated["choices"][0]
+    if "message" in choice:
+        choice["message"]["content"] = text
+    else:
+        choice["text"] = text
+    choice["finish_reason"] = finish_reason
+    usage = truncated.setdefault("usage", {})
+    usage["completion_tokens"] = completion_tokens
+    usage["total_tokens"] = usage.get("prompt_tokens", 0) + completion_tokens
+    return truncated
+
+
+class PrefixReuse:
+    """Serves deterministic requests from a longer cached completion of the same prompt
+
+    Greedy (temperature 0) and seeded requests produce the same tokens
+    whatever max_tokens is, so the first N tokens of a longer completion are
+    the answer to the same request with max_tokens N. Completions are
+    indexed under a key that leaves out max_tokens, together with their
+    token ids (from the backend's /tokenize, or a local transformers
+    tokenizer). A shorter request is cut at the token boundary and
+    detokenized, with usage and finish_reason ("length") rewritten; a
+    completion that stopped on its own answers every request with at least
+    that many tokens as-is. A request without max_tokens is held to its
+    endpoint's default length. Requests asking for logprobs, echo, several
+    choices or tool calls are not handled.
+    """
+
+    def __init__(self, prefix_config: Optional[Dict[str, Any]], model_configs: Dict[str, Any],
+                 client_factory: Callable[[], Any]):
+        self.settings = {**DEFAULT_PREFIX_REUSE_CONFIG, **(prefix_config or {})}
+        self.tokenizer = None
+        if self.enabled:
+            if self.settings["tokenizer"] == "transformers":
+                self.tokenizer = TransformersTokenizer(model_configs)
+            else:
+                self.tokenizer = BackendTokenizer(client_factory, self.settings["tokenize_timeout"])
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings["enabled"])
+
+    def eligible(self, data: Dict[str, Any]) -> bool:
+        if not self.enabled or not data.get("model") or data.get("stream", False):
+            return False
+        if any(data.get(field) for field in UNSUPPORTED_FIELDS) or int(data.get("n") or 1) != 1:
+            return False
+        temperature = data.get("temperature")
+        if temperature is None:
+            temperature = self.settings["default_temperature"]
+        return float(temperature) == 0 or data.get("seed") is not None
+
+    @staticmethod
+    def key(data: Dict[str, Any]) -> str:
+        rest = {k: v for k, v in data.items() if k not in LENGTH_FIELDS}
+        return hashlib.md5(json.dumps(rest, sort_keys=True).encode()).hexdigest()
+
+    def requested_tokens(self, data: Dict[str, Any], path: str) -> Optional[int]:
+        """The request's length limit, or None if it can run to the end of the context"""
+        for field in LENGTH_FIELDS:
+            if data.get(field) is not None:
+                return int(data[field])
+        default = (self.settings["default_max_tokens"] or {}).get(path)
+        return int(default) if default is not None else None
+
+    async def index_entry(self, data: Dict[str, Any], endpoint: str, response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Indexable form of a live completion, or None if it cannot be reused"""
+        text = completion_text(response)
+        usage = response.get("usage") or {}
+        finish_reason = (response.get("choices") or [{}])[0].get("finish_reason")
+        if text is None or "completion_tokens" not in usage or finish_reason not in ("stop", "length"):
+            return None
+        tokens = await self.tokenizer.tokenize(data["model"], endpoint, text)
+        # Re-tokenizing must reproduce the generated tokens (an end-of-sequence token may be counted)
+        if not 0 <= usage["completion_tokens"] - len(tokens) <= (1 if finish_reason == "stop" else 0):
+            return None
+        return {"response": response, "tokens": tokens, "finish_reason": finish_reason}
+
+    def covers(self, entry: Dict[str, Any], data: Dict[str, Any], path: str) -> bool:
+        """Whether entry can answer the request"""
+        requested = self.requested_tokens(data, path)
+        completion_tokens = entry["response"]["usage"]["completion_tokens"]
+        if entry["finish_reason"] == "stop":
+            return requested is None or requested > 0
+        return requested is not None and 0 < requested <= completion_tokens
+
+    @staticmethod
+    def longer(entry: Dict[str, Any], existing: Optional[Dict[str, Any]]) -> bool:
+        """Whether entry should replace the indexed one"""
+        if existing is None or existing["finish_reason"] == "length" and entry["finish_reason"] == "stop":
+            return True
+        if existing["finish_reason"] == "stop":
+            return False
+        return len(entry["tokens"]) > len(existing["tokens"])
+
+    async def serve(self, entry: Dict[str, Any], data: Dict[str, Any], path: str,
+                    endpoint: str) -> Optional[Dict[str, Any]]:
+        if not self.covers(entry, data, path):
+            return None
+        requested = self.requested_tokens(data, path)
+        response = entry["response"]
+        completion_tokens = response["usage"]["completion_tokens"]
+        if requested is None or requested >= completion_tokens:
+            return copy.deepcopy(response)
+        text = await self.tokenizer.detokenize(data["model"], endpoint, entry["tokens"][:requested])
+        return with_completion(response, text, requested, "length")
@@ -0,0 +1,271 @@
+"""
+Page-cache prewarming of model weight files.
+
+    python -m api_gateway.prewarm --config configs/model_configs.yaml \
+        [--models qwen2p5_3b] [--frequency-url http://localhost:8080/metrics]
+
+Reads the weight files of each model (safetensors etc. from the Hugging Face
+cache, or a local model directory) so that a later server start is served
+from memory instead of disk. Files are read in parallel with readahead hints,
+under a shared bandwidth limit, highest-priority model first.
+"""
+import argparse
+import asyncio
+import fnmatch
+import json
+import logging
+import os
+import re
+import time
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Default knobs, overridable from the `prewarm` section of model_configs.yaml
+DEFAULT_PREWARM_CONFIG = {
+    "enabled": False,
+    "cache_dir": None,
+    "patterns": ["*.safetensors", "*.bin", "*.pt", "*.json", "tokenizer*"],
+    "parallel_files": 4,
+    "max_bandwidth_mb": 0,
+    "chunk_size_mb": 8,
+    "max_bytes": 0,
+    "max_models": 0,
+    "interval": 600,
+    "frequency_url": None,
+}
+
+
+def default_cache_dir() -> str:
+    """Hugging Face hub cache, honouring HF_HUB_CACHE / HF_HOME like the hub client does"""
+    if os.environ.get("HF_HUB_CACHE"):
+        return os.environ["HF_HUB_CACHE"]
+    hf_home = os.environ.get("HF_HOME") or os.path.join(os.path.expanduser("~"), ".cache", "huggingface")
+    return os.path.join(hf_home, "hub")
+
+
+def available_memory() -> int:
+    """MemAvailable in bytes, or 0 if /proc/meminfo is unreadable"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def weight_files(model_path: str, cache_dir: str, patterns: Iterable[str]) -> List[str]:
+    """Resolved paths of a model's files, largest first
+
+    model_path is either a local directory or a hub id ("Org/Name"), looked up
+    as <cache_dir>/models--Org--Name/snapshots/*. Snapshot entries are symlinks
+    into blobs/, so paths are resolved and de-duplicated.
+    """
+    if os.path.isdir(model_path):
+        roots = [model_path]
+    else:
+        snapshots = os.path.join(cache_dir, "models--" + model_path.replace("/", "--"), "snapshots")
+        roots = [os.path.join(snapshots, rev) for rev in sorted(os.listdir(snapshots))] \
+            if os.path.isdir(snapshots) else []
+    files = {}
+    for root in roots:
+        for dirpath, _, names in os.walk(root):
+            for name in names:
+                if any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                    path = os.path.realpath(os.path.join(dirpath, name))
+                    if os.path.isfile(path):
+                        files[path] = os.path.getsize(path)
+    return sorted(files, key=files.get, reverse=True)
+
+
+def request_frequency(metrics_text: str) -> Dict[str, float]:
+    """Per-model request counts from the gateway's model_requests_total metric"""
+    counts = {}
+    for match in re.finditer(r'^model_requests_total\{model="([^"]+)"\} ([0-9.e+]+)$', metrics_text, re.M):
+        counts[match.group(1)] = float(match.group(2))
+    return counts
+
+
+async def fetch_request_frequency(url: str) -> Dict[str, float]:
+    try:
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            response = await client.get(url)
+            response.raise_for_status()
+            return request_frequency(response.text)
+    except httpx.HTTPError as e:
+        logger.warning(f"Could not read request frequency from {url}: {e}")
+        return {}
+
+
+def prioritize(models: Iterable[str], frequency: Dict[str, float]) -> List[str]:
+    """Most requested first; ties keep their given order"""
+    models = list(models)
+    return sorted(models, key=lambda name: (-frequency.get(name, 0.0), models.index(name)))
+
+
+class BandwidthLimiter:
+    """Shared read budget in bytes per second; 0 disables the limit"""
+
+    def __init__(self, bytes_per_second: float):
+        self.rate = bytes_per_second
+        self.next_free = 0.0
+
+    async def consume(self, nbytes: int):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        start = max(now, self.next_free)
+        self.next_free = start + nbytes / self.rate
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class Prewarmer:
+    """Reads model weight files into the page cache"""
+
+    def __init__(self, prewarm_config: Optional[Dict[str, Any]], model_configs: Dict[str, Any]):
+        self.settings = {**DEFAULT_PREWARM_CONFIG, **(prewarm_config or {})}
+        self.model_configs = model_configs
+        self.cache_dir = os.path.expanduser(self.settings["cache_dir"] or default_cache_dir())
+        self.limiter = BandwidthLimiter(float(self.settings["max_bandwidth_mb"]) * 1024 * 1024)
+        self.on_model: Optional[Callable] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings["enabled"])
+
+    def files_for(self, name: str) -> List[str]:
+        model_path = self.model_configs.get(name, {}).get("name", name)
+        return weight_files(model_path, self.cache_dir, self.settings["patterns"])
+
+    def _listings(self, models: List[str]) -> Dict[str, Tuple[List[str], int]]:
+        """Files and total bytes per model (walks the disk; run in a worker thread)"""
+        listings = {}
+        for name in models:
+            files = self.files_for(name)
+            listings[name] = (files, sum(os.path.getsize(path) for path in files))
+        return listings
+
+    @staticmethod
+    def _open(path: str):
+        f = open(path, "rb", buffering=0)
+        if hasattr(os, "posix_fadvise"):
+            # Kernel readahead for the whole file, then read it to make sure it stays resident
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        return f
+
+    async def _read_file(self, path: str, buffer: bytearray) -> int:
+        """Read one file sequentially; returns bytes read"""
+        total = 0
+        view = memoryview(buffer)
+        f = await asyncio.to_thread(self._open, path)
+        try:
+            while True:
+                n = await asyncio.to_thread(f.readinto, view)
+                if not n:
+                    return total
+                total += n
+                await self.limiter.consume(n)
+        finally:
+            f.close()
+
+    async def prewarm(self, models: Iterable[str], frequency: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """Prewarm models in priority order; returns per-model files, bytes and seconds
+
+        Stops queueing files once max_bytes (default: half of MemAvailable)
+        would be exceeded, so the lowest-priority models are skipped rather
+        than evicting the ones just read.
+        """
+        order = prioritize(models, frequency or {})
+        if self.settings["max_models"]:
+            order = order[:int(self.settings["max_models"])]
+        max_bytes = int(self.settings["max_bytes"]) or await asyncio.to_thread(available_memory) // 2
+
+        # Directory walks and stats stay off the event loop, like the reads
+        listings = await asyncio.to_thread(self._listings, order)
+        report: Dict[str, Dict[str, Any]] = {}
+        queue: asyncio.Queue = asyncio.Queue()
+        budget = 0
+        for name in order:
+            files, size = listings[name]
+            entry = {"files": len(files), "bytes": 0, "seconds": 0.0, "status": "queued"}
+            report[name] = entry
+            if not files:
+                entry["status"] = "no_files"
+                continue
+            if max_bytes and budget + size > max_bytes:
+                entry["status"] = "skipped_budget"
+                continue
+            budget += size
+            entry["pending"] = len(files)
+            for path in files:
+                queue.put_nowait((name, path))
+
+        chunk = int(float(self.settings["chunk_size_mb"]) * 1024 * 1024)
+        started: Dict[str, float] = {}
+
+        async def worker():
+            buffer = bytearray(chunk)
+            while True:
+                try:
+                    name, path = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                entry = report[name]
+                started.setdefault(name, time.monotonic())
+                try:
+                    nbytes = await self._read_file(path, buffer)
+                    entry["bytes"] += nbytes
+                except OSError as e:
+                    logger.warning(f"Prewarm of {path} failed: {e}")
+                    entry["status"] = "partial"
+                entry["pending"] -= 1
+                if entry["pending"] == 0:
+                    del entry["pending"]
+                    entry["seconds"] = round(time.monotonic() - started[name], 3)
+                    if entry["status"] == "queued":
+                        entry["status"] = "done"
+                    if self.on_model:
+                        self.on_model(name, entry["bytes"], entry["seconds"])
+                    logger.info(f"Prewarmed {name}: {entry['bytes'] / 2**20:.0f} MiB in {entry['seconds']:.1f}s")
+
+        await asyncio.gather(*(worker() for _ in range(max(1, int(self.settings["parallel_files"])))))
+        return report
+
+
+def main():
+    import yaml
+
+    parser = argparse.ArgumentParser(description="Read model weight files into the page cache")
+    parser.add_argument("--config", default="configs/model_configs.yaml")
+    parser.add_argument("--models", nargs="*", help="Models to prewarm (default: all)")
+    parser.add_argument("--frequency-url", help="Gateway /metrics URL used to order models by request count")
+    parser.add_argument("--cache-dir", help="Override prewarm.cache_dir")
+    parser.add_argument("--max-bandwidth-mb", type=float, help="Override prewarm.max_bandwidth_mb")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    prewarm_config = dict(config.get("prewarm") or {})
+    if args.cache_dir:
+        prewarm_config["cache_dir"] = args.cache_dir
+    if args.max_bandwidth_mb is not None:
+        prewarm_config["max_bandwidth_mb"] = args.max_bandwidth_mb
+    prewarmer = Prewarmer(prewarm_config, config["models"])
+
+    async def run():
+        url = args.frequency_url or prewarmer.settings["frequency_url"]
+        frequency = await fetch_request_frequency(url) if url else {}
+        return await prewarmer.prewarm(args.models or list(config["models"]), frequency)
+
+    print(json.dumps(asyncio.run(run()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Default knobs, overridable from the `prompts` section of model_configs.yaml
+DEFAULT_PROMPT_REGISTRY_CONFIG = {
+    "enabled": True,
+    "storage_path": "/app/data/prompts.json",
+    "registry": {},
+    "max_cached_expansions": 1024,
+}
+
+# Request field that refers to a registered prompt: "id" (latest version) or "id@version"
+REF_FIELD = "prompt_ref"
+
+PROMPT_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,127}$")
+
+
+class PromptError(Exception):
+    """Unknown prompt reference or invalid prompt; mapped to a 4xx by the gateway"""
+
+    def __init__(self, status_code: int, message: str):
+        self.status_code = status_code
+        super().__init__(message)
+
+
+def _write_json_atomic(path: str, payload: Any):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def validate_version(prompt_id: str, version: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalized prompt version: exactly one of content (text) or messages (chat turns)"""
+    if not isinstance(prompt_id, str) or not PROMPT_ID.match(prompt_id):
+        raise PromptError(422, f"Invalid prompt id {prompt_id!r}")
+    if isinstance(version, str):
+        version = {"content": version}
+    content, messages = version.get("content"), version.get("messages")
+    if (content is None) == (messages is None):
+        raise PromptError(422, f"Prompt {prompt_id} needs exactly one of content or messages")
+    if content is not None and not isinstance(content, str):
+        raise PromptError(422, f"Prompt {prompt_id} content must be a string")
+    if messages is not None and not (
+        isinstance(messages, list) and messages
+        and all(isinstance(m, dict) and isinstance(m.get("role"), str) and "content" in m for m in messages)
+    ):
+        raise PromptError(422, f"Prompt {prompt_id} messages must be a list of {{role, content}} objects")
+    return {
+        **({"content": content} if content is not None else {"messages": messages}),
+        "model": version.get("model"),
+        "warmup": bool(version.get("warmup", True)),
+        "created_at": version.get("created_at") or time.time(),
+    }
+
+
+class PromptRegistry:
+    """Versioned prompts stored once and referenced by id from requests
+
+    A chat message {"prompt_ref": "support@3"} (or "support" for the latest
+    version) is replaced by the prompt's messages, or by one message with its
+    content and the reference's role (default system). A completion request
+    with a top-level prompt_ref gets the prompt's content prepended to its
+    prompt. References are pinned to a version on arrival, so cache keys
+    change when a new version is registered, and expanded right before the
+    request goes upstream; expansions are kept in a small LRU. Versions are
+    immutable. Prompts come from the config (registry) and from the API,
+    which persists them to storage_path (read by load() at startup); a
+    prompt's model receives requests
+    that reference it without naming one, and its latest version is used to
+    warm that backend's prefix cache.
+    """
+
+    def __init__(self, registry_config: Optional[Dict[str, Any]] = None):
+        self.settings = {**DEFAULT_PROMPT_REGISTRY_CONFIG, **(registry_config or {})}
+        self.prompts: Dict[str, List[Dict[str, Any]]] = {}
+        # Versions registered through the API, by prompt id (persisted)
+        self.registered: Dict[str, List[int]] = {}
+        self.expansions: "OrderedDict[Tuple[str, int, Optional[str]], Any]" = OrderedDict()
+        self.on_expand: Optional[Callable[[bool], None]] = None
+        if self.enabled:
+            self._load_config()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings["enabled"])
+
+    def _load_config(self):
+        for prompt_id, spec in (self.settings["registry"] or {}).items():
+            versions = spec.get("versions") if isinstance(spec, dict) and "versions" in spec else [spec]
+            defaults = {k: spec[k] for k in ("model", "warmup") if isinstance(spec, dict) and k in spec}
+            for version in versions:
+                version = {"content": version} if isinstance(version, str) else version
+                self.prompts.setdefault(prompt_id, []).append(validate_version(prompt_id, {**defaults, **version}))
+
+    def load(self):
+        """Add the versions registered through the API, from storage_path"""
+        path = self.settings["storage_path"]
+        if not self.enabled or not path or not os.path.exists(path):
+            return
+        try:
+            self._load_stored(path)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError, PromptError) as e:
+            raise RuntimeError(f"Cannot load registered prompts from {path} ({type(e).__name__}: {e}); "
+                               f"fix or move the file to start the gateway") from e
+
+    def _load_stored(self, path: str):
+        with open(path) as f:
+            stored = json.load(f)
+        for prompt_id, versions in stored.items():
+            for version in sorted(versions, key=lambda v: v["version"]):
+                existing = self.prompts.setdefault(prompt_id, [])
+                if version["version"] != len(existing) + 1:
+                    logger.warning(f"Skipping stored prompt {prompt_id}@{version['version']}: "
+                                   f"version {len(existing) + 1} expected (config changed?)")
+                    continue
+                existing.append(validate_version(prompt_id, version))
+                self.registered.setdefault(prompt_id, []).append(version["version"])
+        logger.info(f"Loaded {len(self.prompts)} registered prompt(s)")
+
+    def _persist(self):
+        path = self.settings["storage_path"]
+        if not path:
+            return
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_json_atomic(path, {
+            prompt_id: [{**self.prompts[prompt_id][n - 1], "version": n} for n in numbers]
+            for prompt_id, numbers in self.registered.items()
+        })
+
+    def register(self, prompt_id: str, version: Dict[str, Any]) -> int:
+        """Add a new version of prompt_id; returns its version number"""
+        entry = validate_version(prompt_id, version)
+        previous = self.prompts.get(prompt_id)
+        if previous and "model" not in version:
+            entry["model"] = previous[-1]["model"]
+        versions = self.prompts.setdefault(prompt_id, [])
+        versions.append(entry)
+        self.registered.setdefault(prompt_id, []).append(len(versions))
+        try:
+            self._persist()
+        except OSError:
+            versions.pop()
+            self.registered[prompt_id].pop()
+            raise
+        return len(versions)
+
+    def resolve(self, ref: Any) -> Tuple[str, int, Dict[str, Any]]:
+        """(id, version, prompt) for "id" or "id@version" """
+        if not isinstance(ref, str):
+            raise PromptError(400, f"{REF_FIELD} must be a string")
+        prompt_id, _, number = ref.partition("@")
+        versions = self.prompts.get(prompt_id)
+        if not versions:
+            raise PromptError(400, f"Unknown prompt {prompt_id!r}")
+        if not number:
+            return prompt_id, len(versions), versions[-1]
+        if not number.isdigit() or not 1 <= int(number) <= len(versions):
+            raise PromptError(400, f"Prompt {prompt_id!r} has no version {number!r}")
+        return prompt_id, int(number), versions[int(number) - 1]
+
+    def get(self, prompt_id: str) -> Optional[List[Dict[str, Any]]]:
+        return self.prompts.get(prompt_id)
+
+    @staticmethod
+    def references(data: Dict[str, Any]) -> bool:
+        messages = data.get("messages")
+        if isinstance(messages, list):
+            return any(isinstance(m, dict) and REF_FIELD in m for m in messages)
+        return REF_FIELD in data
+
+    def pin(self, data: Dict[str, Any], known_models) -> Dict[str, Any]:
+        """data with every reference pinned to a version, routed to the prompt's model if none is named"""
+        if not self.enabled or not self.references(data):
+            return data
+        pinned = dict(data)
+        model = None
+        if isinstance(data.get("messages"), list):
+            messages = []
+            for message in data["messages"]:
+                if isinstance(message, dict) and REF_FIELD in message:
+                    prompt_id, number, prompt = self.resolve(message[REF_FIELD])
+                    message = {**message, REF_FIELD: f"{prompt_id}@{number}"}
+                    model = model or prompt["model"]
+                messages.append(message)
+            pinned["messages"] = messages
+        else:
+            prompt_id, number, prompt = self.resolve(data[REF_FIELD])
+            pinned[REF_FIELD] = f"{prompt_id}@{number}"
+            model = prompt["model"]
+        # Affinity: the backend the prompt was written for, and whose prefix cache it warms
+        if model and pinned.get("model") not in known_models and model in known_models:
+            pinned["model"] = model
+        return pinned
+
+    def _expansion(self, ref: str, role: Optional[str]) -> Any:
+        """Messages replacing a chat reference, or the text prepended for a completion (role None)"""
+        prompt_id, number, prompt = self.resolve(ref)
+        key = (prompt_id, number, role)
+        cached = self.expansions.get(key)
+        if self.on_expand:
+            self.on_expand(cached is not None)
+        if cached is not None:
+            self.expansions.move_to_end(key)
+            return cached
+        if role is None:
+            if "content" not in prompt:
+                raise PromptError(400, f"Prompt {prompt_id!r} is a chat prompt; use it from messages")
+            expansion = prompt["content"]
+        elif "messages" in prompt:
+            expansion = [dict(message) for message in prompt["messages"]]
+        else:
+            expansion = [{"role": role, "content": prompt["content"]}]
+        self.expansions[key] = expansion
+        while len(self.expansions) > self.settings["max_cached_expansions"]:
+            self.expansions.popitem(last=False)
+        return expansion
+
+    def expand(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """data as sent upstream: references replaced by the prompts they name"""
+        if not self.enabled or not self.references(data):
+            return data
+        expanded = dict(data)
+        if isinstance(data.get("messages"), list):
+            messages = []
+            for message in data["messages"]:
+                if isinstance(message, dict) and REF_FIELD in message:
+                    messages.extend(self._expansion(message[REF_FIELD], message.get("role") or "system"))
+                else:
+                    messages.append(message)
+            expanded["messages"] = messages
+        else:
+            prompt = data.get("prompt") or ""
+            # Token ids cannot be prefixed with text; each id would become a prompt of its own
+            if not (isinstance(prompt, str) or isinstance(prompt, list) and all(isinstance(p, str) for p in prompt)):
+                raise PromptError(400, f"{REF_FIELD} needs a text prompt; send the prompt as a string, not token ids")
+            text = self._expansion(expanded.pop(REF_FIELD), None)
+            expanded["prompt"] = [text + p for p in prompt] if isinstance(prompt, list) else text + prompt
+        return expanded
+
+    @staticmethod
+    def warmup_text(prompt: Dict[str, Any]) -> Optional[str]:
+        """The system text a backend's prefix cache is warmed with, if the prompt has one"""
+        if not prompt["warmup"]:
+            return None
+        if "content" in prompt:
+            return prompt["content"]
+        first = prompt["messages"][0]
+        return first["content"] if first["role"] == "system" and isinstance(first["content"], str) else None
+
+    def warmup_prompts(self, model: str) -> List[str]:
+        """Warmup texts of the latest versions meant for model (or any model)"""
+        if not self.enabled:
+            return []
+        latest = (versions[-1] for versions in self.prompts.values())
+        texts = (self.warmup_text(p) for p in latest if p["model"] in (None, model))
+        return [text for text in texts if text]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "prompts": len(self.prompts),
+            "versions": sum(len(v) for v in self.prompts.values()),
+            "cached_expansions": len(self.expansions),
+        }
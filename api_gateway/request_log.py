@@ -0,0 +1,96 @@
+import hashlib
+import logging
+import os
+import struct
+import time
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Default knobs, overridable from the `caching.request_log` section of model_configs.yaml
+DEFAULT_REQUEST_LOG_CONFIG = {
+    "enabled": False,
+    "path": "/app/data/cache_requests.log",
+    "buffer_events": 4096,
+    "flush_interval": 10.0,
+}
+
+# File layout: MAGIC, then fixed-size little-endian records. RECORD and
+# RECORD_FIELDS (the numpy dtype scripts/cache_simulator.py reads) must match.
+MAGIC = b"GWRLOG1\n"
+RECORD = struct.Struct("<dQBBIff")
+RECORD_FIELDS = [
+    ("timestamp", "<f8"),
+    ("key", "<u8"),
+    ("path", "u1"),
+    ("outcome", "u1"),
+    ("size", "<u4"),
+    ("cost", "<f4"),
+    ("similarity", "<f4"),
+]
+
+PATHS = ("/v1/completions", "/v1/chat/completions")
+OUTCOMES = ("miss", "hit", "prefix", "semantic")
+
+
+def key_hash(cache_key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(cache_key.encode(), digest_size=8).digest(), "little")
+
+
+class RequestLog:
+    """Append-only log of cacheable requests for replaying cache policies offline
+
+    One 30-byte record per non-streaming generation request: time, a 64-bit
+    hash of its exact cache key, endpoint, how the live cache answered,
+    response size in JSON bytes (0 when served from cache), generation
+    seconds (from the cache entry on hits), and the nearest semantic
+    similarity when the semantic tier was consulted (NaN otherwise).
+    Records are buffered and appended in batches; a torn last record from a
+    crash is ignored on read. scripts/cache_simulator.py replays the file.
+    """
+
+    def __init__(self, log_config: Optional[Dict[str, Any]] = None):
+        self.settings = {**DEFAULT_REQUEST_LOG_CONFIG, **(log_config or {})}
+        self.buffer = bytearray()
+        self.buffered = 0
+        self.events = 0
+        self.last_flush = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings["enabled"])
+
+    def record(self, path: str, cache_key: str, outcome: str, size: int = 0, cost: float = 0.0,
+               similarity: Optional[float] = None):
+        if not self.enabled:
+            return
+        self.buffer += RECORD.pack(
+            time.time(), key_hash(cache_key), PATHS.index(path) if path in PATHS else 255,
+            OUTCOMES.index(outcome), min(size, 0xFFFFFFFF), cost,
+            similarity if similarity is not None else float("nan"),
+        )
+        self.buffered += 1
+        self.events += 1
+        if (self.buffered >= self.settings["buffer_events"]
+                or time.monotonic() - self.last_flush >= self.settings["flush_interval"]):
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        path = self.settings["path"]
+        try:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "ab") as f:
+                if f.tell() == 0:
+                    f.write(MAGIC)
+                f.write(self.buffer)
+        except OSError as e:
+            logger.warning(f"Writing request log {path} failed, dropping {self.buffered} events: {e}")
+        self.buffer = bytearray()
+        self.buffered = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "path": self.settings["path"], "events": self.events}
@@ -0,0 +1,144 @@
+import logging
+import math
+import random
+import time
+from typing import Dict, Any, List, Optional
+
+from .codec import CacheCodec, CodecError
+
+logger = logging.getLogger(__name__)
+
+# Bookkeeping keys, next to the cached responses
+DICTIONARY_KEY = "cache:dict:{}"
+CURRENT_DICTIONARY_KEY = "cache:dict:current"
+REFRESH_LOCK_KEY = "cache:refresh:{}"
+
+# Freshness knobs, set under `caching` and overridable per path under `caching.endpoints`
+DEFAULT_FRESHNESS_CONFIG = {
+    "ttl": 3600,
+    "stale_while_revalidate": 0,
+    "xfetch_beta": 1.0,
+    "refresh_lock_seconds": 120,
+}
+
+
+def freshness_policy(caching_config: Dict[str, Any], path: str) -> Dict[str, Any]:
+    """Freshness settings for one endpoint: defaults, then `caching`, then `caching.endpoints.<path>`"""
+    shared = {key: caching_config[key] for key in DEFAULT_FRESHNESS_CONFIG if key in caching_config}
+    endpoint = (caching_config.get("endpoints") or {}).get(path) or {}
+    return {**DEFAULT_FRESHNESS_CONFIG, **shared, **endpoint}
+
+
+class CachedResponse:
+    """A cached value (or pool of sampled values) with when it was stored, for how long it is fresh
+    and what it cost to generate"""
+
+    def __init__(self, value: Any, stored_at: float, ttl: float, delta: float, samples: Optional[List[Any]] = None):
+        self.value = value
+        self.stored_at = stored_at
+        self.ttl = ttl
+        self.delta = delta
+        self.samples = samples
+
+    def age(self, now: Optional[float] = None) -> float:
+        return (now if now is not None else time.time()) - self.stored_at
+
+    def freshness(self, beta: float, now: Optional[float] = None) -> str:
+        """fresh, early (XFetch picked this read to refresh ahead of expiry) or stale (past ttl)
+
+        XFetch: refresh when now - delta * beta * ln(U) >= expiry, U ~ (0, 1].
+        The chance rises as expiry nears and with the cost of regenerating,
+        so a hot key is usually refreshed by one reader shortly before it
+        expires instead of by every reader right after.
+        """
+        now = now if now is not None else time.time()
+        expiry = self.stored_at + self.ttl
+        if now >= expiry:
+            return "stale"
+        if beta > 0 and self.delta > 0 and now - self.delta * beta * math.log(1.0 - random.random()) >= expiry:
+            return "early"
+        return "fresh"
+
+
+class ResponseCache:
+    """Completion cache: codec-encoded responses in a byte store (Redis, disk, or both as tiers)
+
+    Values go through CacheCodec, so they are compact and compressed; the
+    store (see cache_store.py and disk_cache.py) handles expiry and byte-budget
+    eviction.
+
+    Entries are stored with their write time, fresh ttl and generation time
+    and are kept stale_while_revalidate seconds past the ttl, so the caller
+    can serve a stale or XFetch-early entry while it refreshes it;
+    claim_refresh keeps that to one refresh per key across instances.
+    """
+
+    def __init__(self, store, codec: CacheCodec):
+        self.store = store
+        self.codec = codec
+
+        # Share the dictionary with other instances (and later runs) through the store
+        codec.load_dictionary = lambda ident: store.get_meta(DICTIONARY_KEY.format(ident))
+        codec.on_dictionary = self._publish_dictionary
+        if codec.training:
+            current = store.get_meta(CURRENT_DICTIONARY_KEY)
+            if current:
+                data = store.get_meta(DICTIONARY_KEY.format(int(current)))
+                if data:
+                    codec.use_dictionary(data)
+                    logger.info(f"Using shared cache dictionary {codec.dictionary_id:08x}")
+
+    def _publish_dictionary(self, ident: int, data: bytes):
+        self.store.set_meta(DICTIONARY_KEY.format(ident), data)
+        self.store.set_meta(CURRENT_DICTIONARY_KEY, str(ident).encode())
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        found = self.store.get(key)
+        return self._decode(key, found[0]) if found is not None else None
+
+    def get_many(self, keys: List[str]) -> Dict[str, CachedResponse]:
+        """Several entries in one store call (one pipeline per Redis node)"""
+        cached = {}
+        for key, (stored, _) in self.store.get_many(keys).items():
+            entry = self._decode(key, stored)
+            if entry is not None:
+                cached[key] = entry
+        return cached
+
+    def _decode(self, key: str, stored: bytes) -> Optional[CachedResponse]:
+        try:
+            entry = self.codec.decode(stored)
+        except (CodecError, ValueError) as e:
+            logger.warning(f"Dropping undecodable cache entry {key}: {e}")
+            self.store.delete(key)
+            return None
+        if not (isinstance(entry, dict) and "stored_at" in entry and ("response" in entry or "samples" in entry)):
+            # Written without freshness metadata: fresh until the store expires it
+            return CachedResponse(entry, time.time(), math.inf, 0.0)
+        return CachedResponse(
+            entry.get("response"), entry["stored_at"], entry["ttl"], entry["delta"], entry.get("samples")
+        )
+
+    def set(self, key: str, value: Any, policy: Dict[str, Any], delta: float = 0.0):
+        """Store value, fresh for policy ttl and kept stale_while_revalidate seconds beyond"""
+        self._store(key, {"response": value}, policy, delta)
+
+    def set_samples(self, key: str, samples: List[Any], policy: Dict[str, Any], delta: float = 0.0):
+        """Store a pool of sampled responses for one key, like set"""
+        self._store(key, {"samples": samples}, policy, delta)
+
+    def _store(self, key: str, entry: Dict[str, Any], policy: Dict[str, Any], delta: float):
+        fresh_ttl = int(policy["ttl"])
+        ttl = fresh_ttl + int(policy["stale_while_revalidate"])
+        stored = self.codec.encode({**entry, "stored_at": time.time(), "ttl": fresh_ttl, "delta": delta})
+        self.store.put(key, stored, ttl)
+
+    def claim_refresh(self, key: str, seconds: float) -> bool:
+        """Whether this instance should refresh key; False while another refresh holds the lock"""
+        return self.store.add(REFRESH_LOCK_KEY.format(key), b"1", max(int(seconds), 1))
+
+    def release_refresh(self, key: str):
+        self.store.delete(REFRESH_LOCK_KEY.format(key))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"tiers": self.store.stats(), "codec": self.codec.stats()}
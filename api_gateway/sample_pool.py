@@ -0,0 +1,69 @@
+import random
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+# Default knobs, overridable from the `caching.sample_pool` section of model_configs.yaml
+DEFAULT_SAMPLE_POOL_CONFIG = {
+    "enabled": True,
+    "pool_size": 4,
+    "selection": "rotate",
+    "default_temperature": 1.0,
+    "max_rotation_keys": 10000,
+}
+
+
+class SamplePools:
+    """Serves cached sampled (temperature > 0) responses from a pool of K samples
+
+    A request that samples without a seed gets a pool instead of one frozen
+    answer: live responses are appended until pool_size samples are cached,
+    after which requests are served from the pool in rotation or at random.
+    Samples are independent draws, so repeats are kept and the pool follows
+    the model's output distribution. Greedy (temperature 0) and seeded
+    requests are deterministic and keep a single cached response; requests
+    without a temperature are taken to sample at default_temperature, the
+    backend default.
+    """
+
+    def __init__(self, pool_config: Optional[Dict[str, Any]] = None):
+        self.settings = {**DEFAULT_SAMPLE_POOL_CONFIG, **(pool_config or {})}
+        self.rotation: "OrderedDict[str, int]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings["enabled"]) and self.pool_size > 1
+
+    @property
+    def pool_size(self) -> int:
+        return int(self.settings["pool_size"])
+
+    def pooled(self, data: Dict[str, Any]) -> bool:
+        """Whether the request samples nondeterministically"""
+        if not self.enabled or data.get("seed") is not None:
+            return False
+        temperature = data.get("temperature")
+        if temperature is None:
+            temperature = self.settings["default_temperature"]
+        return float(temperature) > 0
+
+    def serve(self, key: str, data: Dict[str, Any], value: Any, samples: Optional[List[Any]]) -> Optional[Any]:
+        """Response to answer with, or None while the request's pool is still filling"""
+        if samples is None:
+            # A single response (deterministic request, or cached before pools were enabled)
+            return value
+        if self.pooled(data) and len(samples) < self.pool_size:
+            return None
+        return self.pick(key, samples)
+
+    def pick(self, key: str, samples: List[Any]) -> Any:
+        if self.settings["selection"] == "random":
+            return random.choice(samples)
+        turn = self.rotation.pop(key, random.randrange(len(samples)))
+        self.rotation[key] = turn + 1
+        while len(self.rotation) > self.settings["max_rotation_keys"]:
+            self.rotation.popitem(last=False)
+        return samples[turn % len(samples)]
+
+    def add(self, samples: Optional[List[Any]], response: Any) -> List[Any]:
+        """Pool with response appended, dropping the oldest sample once full"""
+        return (list(samples or []) + [response])[-self.pool_size:]
@@ -0,0 +1,374 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Any, List, Optional, Tuple
+
+
+class LoadShedError(Exception):
+    """Raised when a request is rejected instead of queued for a backend"""
+
+    def __init__(self, model: str, reason: str, status_code: int, estimated_wait: float):
+        self.model = model
+        self.reason = reason
+        self.status_code = status_code
+        self.estimated_wait = estimated_wait
+        super().__init__(
+            f"{model} overloaded ({reason}), estimated queue wait {estimated_wait:.1f}s"
+        )
+
+    @property
+    def retry_after(self) -> int:
+        """Whole seconds for the Retry-After header"""
+        return max(1, math.ceil(self.estimated_wait))
+
+
+class Waiter:
+    """A request waiting for a backend slot"""
+
+    __slots__ = ("expected_seconds", "deadline", "tenant", "cost_tokens", "weight", "enqueued_at", "future")
+
+    def __init__(self, expected_seconds: float, deadline: float, tenant: str = "default",
+                 cost_tokens: int = 1, weight: float = 1.0):
+        self.expected_seconds = expected_seconds
+        self.deadline = deadline
+        self.tenant = tenant
+        self.cost_tokens = cost_tokens
+        self.weight = weight
+        self.enqueued_at = time.monotonic()
+        self.future = asyncio.get_running_loop().create_future()
+
+    @property
+    def latest_start(self) -> float:
+        """Last moment the request can start and still finish before its deadline"""
+        return self.deadline - self.expected_seconds
+
+
+class FifoQueue:
+    """First-come first-served waiting line"""
+
+    def __init__(self):
+        self.items: Deque[Waiter] = deque()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def push(self, waiter: Waiter):
+        self.items.append(waiter)
+
+    def peek(self) -> Optional[Waiter]:
+        return self.items[0] if self.items else None
+
+    def pop(self) -> Optional[Waiter]:
+        return self.items.popleft() if self.items else None
+
+    def remove(self, waiter: Waiter):
+        try:
+            self.items.remove(waiter)
+        except ValueError:
+            pass
+
+    def ahead_of(self, expected_seconds: float, now: float, tenant: Optional[str] = None) -> int:
+        """Number of waiters that would be served before a request arriving now"""
+        return len(self.items)
+
+
+class ShortestJobFirstQueue:
+    """Shortest-expected-job-first with linear aging to prevent starvation
+
+    A waiter's priority is expected_seconds - aging_factor * time_waited. Every
+    waiter ages at the same rate, so ordering by
+    expected_seconds + aging_factor * enqueued_at is stable over time and a
+    plain heap is enough.
+    """
+
+    def __init__(self, aging_factor: float = 1.0):
+        self.aging_factor = aging_factor
+        self.heap: List[Tuple[float, int, Waiter]] = []
+        self.counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def priority(self, expected_seconds: float, enqueued_at: float) -> float:
+        return expected_seconds + self.aging_factor * enqueued_at
+
+    def push(self, waiter: Waiter):
+        key = self.priority(waiter.expected_seconds, waiter.enqueued_at)
+        heapq.heappush(self.heap, (key, next(self.counter), waiter))
+
+    def peek(self) -> Optional[Waiter]:
+        return self.heap[0][2] if self.heap else None
+
+    def pop(self) -> Optional[Waiter]:
+        return heapq.heappop(self.heap)[2] if self.heap else None
+
+    def remove(self, waiter: Waiter):
+        for i, entry in enumerate(self.heap):
+            if entry[2] is waiter:
+                self.heap[i] = self.heap[-1]
+                self.heap.pop()
+                heapq.heapify(self.heap)
+                return
+
+    def ahead_of(self, expected_seconds: float, now: float, tenant: Optional[str] = None) -> int:
+        key = self.priority(expected_seconds, now)
+        return sum(1 for entry in self.heap if entry[0] <= key)
+
+
+class DeficitRoundRobinQueue:
+    """Weighted deficit round robin across tenants, measured in tokens
+
+    Each tenant has its own waiting line ordered by the model's policy. When a
+    tenant's turn comes round it earns quantum_tokens * weight of credit and may
+    dispatch requests while their estimated token cost (prompt + max_tokens)
+    fits in that credit, so a heavy tenant cannot crowd out light ones.
+    """
+
+    def __init__(self, inner_factory, quantum_tokens: int = 1024):
+        self.inner_factory = inner_factory
+        self.quantum_tokens = max(1, quantum_tokens)
+        self.queues: Dict[str, Any] = {}
+        self.weights: Dict[str, float] = {}
+        self.deficits: Dict[str, float] = {}
+        self.active: Deque[str] = deque()
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def depth(self, tenant: str) -> int:
+        queue = self.queues.get(tenant)
+        return len(queue) if queue is not None else 0
+
+    def set_weight(self, tenant: str, weight: float):
+        self.weights[tenant] = max(float(weight), 0.01)
+
+    def push(self, waiter: Waiter):
+        queue = self.queues.get(waiter.tenant)
+        if queue is None:
+            queue = self.queues[waiter.tenant] = self.inner_factory()
+        if not queue:
+            # Weights are only held for tenants with queued requests
+            self.set_weight(waiter.tenant, waiter.weight)
+            self.active.append(waiter.tenant)
+            self.deficits[waiter.tenant] = self._quantum(waiter.tenant) if len(self.active) == 1 else 0.0
+        queue.push(waiter)
+
+    def _quantum(self, tenant: str) -> float:
+        return self.quantum_tokens * self.weights.get(tenant, 1.0)
+
+    def _deactivate(self, tenant: str):
+        self.active.remove(tenant)
+        self.deficits.pop(tenant, None)
+        self.weights.pop(tenant, None)
+        del self.queues[tenant]
+
+    def peek(self) -> Optional[Waiter]:
+        for tenant in self.active:
+            return self.queues[tenant].peek()
+        return None
+
+    def pop(self) -> Optional[Waiter]:
+        while self.active:
+            tenant = self.active[0]
+            queue = self.queues[tenant]
+            head = queue.peek()
+            if self.deficits[tenant] >= head.cost_tokens:
+                queue.pop()
+                self.deficits[tenant] -= head.cost_tokens
+                if not queue:
+                    # An idle tenant does not bank credit
+                    self._deactivate(tenant)
+                    if self.active:
+                        self.deficits[self.active[0]] += self._quantum(self.active[0])
+                return head
+
+            # Skip whole rounds in which nobody can afford their head request
+            rounds = min(
+                math.ceil((self.queues[t].peek().cost_tokens - self.deficits[t]) / self._quantum(t))
+                for t in self.active
+            )
+            if rounds > 1:
+                for t in self.active:
+                    self.deficits[t] += (rounds - 1) * self._quantum(t)
+
+            self.active.rotate(-1)
+            self.deficits[self.active[0]] += self._quantum(self.active[0])
+        return None
+
+    def remove(self, waiter: Waiter):
+        queue = self.queues.get(waiter.tenant)
+        if queue is None:
+            return
+        queue.remove(waiter)
+        if not queue:
+            was_head = self.active[0] == waiter.tenant
+            self._deactivate(waiter.tenant)
+            if was_head and self.active:
+                self.deficits[self.active[0]] += self._quantum(self.active[0])
+
+    def ahead_of(self, expected_seconds: float, now: float, tenant: Optional[str] = None) -> int:
+        """Approximation: our tenant's own backlog, interleaved with every other active tenant"""
+        own = self.queues.get(tenant)
+        own_ahead = own.ahead_of(expected_seconds, now) if own is not None else 0
+        others = len(self.active) - (1 if own is not None else 0)
+        return min(len(self), (own_ahead + 1) * (others + 1) - 1)
+
+
+SCHEDULING_POLICIES = {
+    "fifo": FifoQueue,
+    "sejf": ShortestJobFirstQueue,
+}
+
+
+def make_waiting_queue(policy: str, scheduling_config: Optional[Dict[str, Any]] = None,
+                       fairness_config: Optional[Dict[str, Any]] = None):
+    """Build the waiting line for a scheduling policy name from model_configs.yaml
+
+    With tenant fairness enabled the policy orders requests within each tenant
+    and deficit round robin decides which tenant goes next.
+    """
+    scheduling_config = scheduling_config or {}
+    if policy not in SCHEDULING_POLICIES:
+        raise ValueError(f"Unknown scheduling policy: {policy}")
+
+    def factory():
+        if policy == "sejf":
+            return ShortestJobFirstQueue(aging_factor=float(scheduling_config.get("aging_factor", 1.0)))
+        return SCHEDULING_POLICIES[policy]()
+
+    if fairness_config and fairness_config.get("enabled", False):
+        return DeficitRoundRobinQueue(factory, quantum_tokens=int(fairness_config.get("quantum_tokens", 1024)))
+    return factory()
+
+
+class Slot:
+    """A held backend slot; release() is idempotent"""
+
+    def __init__(self, queue: "BackendQueue", queued_seconds: float):
+        self.queue = queue
+        self.queued_seconds = queued_seconds
+        self.started_at = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        self.queue._release(time.monotonic() - self.started_at)
+
+
+class BackendQueue:
+    """Per-backend concurrency gate with deadline-aware admission and queue dropping"""
+
+    def __init__(self, model: str, max_concurrency: int, max_queue_length: int = 256,
+                 ewma_alpha: float = 0.2, waiting=None):
+        self.model = model
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue_length = int(max_queue_length)
+        self.ewma_alpha = ewma_alpha
+        self.inflight = 0
+        self.waiting = waiting if waiting is not None else FifoQueue()
+        self.avg_service_seconds: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self.waiting)
+
+    def estimate_wait(self, expected_seconds: float, tenant: Optional[str] = None) -> float:
+        """Estimated queueing delay for a request arriving now"""
+        free_slots = self.max_concurrency - self.inflight
+        if free_slots > len(self.waiting):
+            return 0.0
+        # Requests that have to finish before ours can start
+        ahead = self.waiting.ahead_of(expected_seconds, time.monotonic(), tenant) - free_slots + 1
+        if ahead <= 0:
+            return 0.0
+        per_request = self.avg_service_seconds or expected_seconds
+        return ahead * per_request / self.max_concurrency
+
+    def current_wait(self) -> float:
+        """Estimated wait for a typical request, for metrics and Retry-After"""
+        return self.estimate_wait(self.avg_service_seconds or 0.0)
+
+    async def acquire(self, expected_seconds: float, deadline: float, tenant: str = "default",
+                      cost_tokens: int = 1, weight: float = 1.0) -> Slot:
+        """Wait for a slot, or raise LoadShedError if the deadline cannot be met"""
+        now = time.monotonic()
+        if self.inflight < self.max_concurrency and not self.waiting:
+            self.inflight += 1
+            return Slot(self, 0.0)
+
+        wait = self.estimate_wait(expected_seconds, tenant)
+        if len(self.waiting) >= self.max_queue_length:
+            raise LoadShedError(self.model, "queue_full", 429, wait)
+        if now + wait + expected_seconds > deadline:
+            raise LoadShedError(self.model, "deadline", 503, wait)
+
+        waiter = Waiter(expected_seconds, deadline, tenant, cost_tokens, weight)
+        self.waiting.push(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), max(waiter.latest_start - now, 0))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                # Granted a slot at the same moment we gave up on it
+                if isinstance(e, asyncio.CancelledError):
+                    self._release(0.0)
+                    raise
+                return Slot(self, time.monotonic() - waiter.enqueued_at)
+            self._remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise LoadShedError(self.model, "expired", 503, self.estimate_wait(expected_seconds, tenant))
+        return Slot(self, time.monotonic() - waiter.enqueued_at)
+
+    def _remove(self, waiter: Waiter):
+        self.waiting.remove(waiter)
+        if not waiter.future.done():
+            waiter.future.cancel()
+
+    def _release(self, service_seconds: float):
+        self.inflight -= 1
+        if service_seconds > 0:
+            if self.avg_service_seconds is None:
+                self.avg_service_seconds = service_seconds
+            else:
+                self.avg_service_seconds = (
+                    self.ewma_alpha * service_seconds + (1 - self.ewma_alpha) * self.avg_service_seconds
+                )
+        self._dispatch()
+
+    def _dispatch(self):
+        """Hand free slots to waiters, dropping those that can no longer make it"""
+        now = time.monotonic()
+        while self.inflight < self.max_concurrency:
+            waiter = self.waiting.pop()
+            if waiter is None:
+                return
+            if waiter.future.done():
+                continue
+            if now > waiter.latest_start:
+                waiter.future.set_exception(
+                    LoadShedError(self.model, "expired", 503, self.current_wait())
+                )
+                continue
+            self.inflight += 1
+            waiter.future.set_result(None)
+
+
+def build_backend_queues(scheduling_config: Optional[Dict[str, Any]],
+                         model_configs: Dict[str, Any],
+                         fairness_config: Optional[Dict[str, Any]] = None) -> Dict[str, BackendQueue]:
+    """Create one BackendQueue per model from model_configs.yaml"""
+    scheduling_config = scheduling_config or {}
+    queues = {}
+    for model, model_config in model_configs.items():
+        policy = model_config.get("scheduling_policy", scheduling_config.get("default_policy", "fifo"))
+        queues[model] = BackendQueue(
+            model,
+            max_concurrency=model_config.get("max_concurrency", model_config.get("max_batch_size", 32)),
+            max_queue_length=scheduling_config.get("max_queue_length", 256),
+            waiting=make_waiting_queue(policy, scheduling_config, fairness_config),
+        )
+    return queues
@@ -0,0 +1,326 @@
+import asyncio
+import hashlib
+import importlib
+import json
+import logging
+import re
+import time
+import unicodedata
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Default knobs, overridable from the `caching.semantic` section of model_configs.yaml
+DEFAULT_SEMANTIC_CONFIG = {
+    "enabled": False,
+    "embedder": "hashing",
+    "dimensions": 256,
+    "ngram_sizes": [2, 3],
+    "embedding_url": None,
+    "embedding_model": None,
+    "embedding_timeout": 2.0,
+    "threshold": 0.92,
+    "ttl": 3600,
+    "max_entries": 100000,
+    "max_text_chars": 4000,
+}
+
+# Request fields that only carry the text being matched; every other field must match exactly
+TEXT_FIELDS = ("prompt", "messages")
+
+# Above this many rows the search (a few ms of BLAS, GIL released) runs off the event loop
+OFFLOAD_ROWS = 10000
+
+
+def normalize_text(text: str) -> str:
+    """Case-fold, NFKC-normalize and drop punctuation so wording noise does not move the vector"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(" " if unicodedata.category(ch).startswith(("P", "S")) else ch for ch in text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def split_request(data: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """(exact-match context, text to embed), or None for requests the tier does not handle
+
+    Chat requests are matched on their last user message; the rest of the
+    conversation and all sampling parameters go into the exact-match context.
+    """
+    params = {k: v for k, v in data.items() if k not in TEXT_FIELDS and k != "stream"}
+    messages = data.get("messages")
+    if isinstance(messages, list) and messages:
+        last = messages[-1]
+        if not isinstance(last, dict) or last.get("role") != "user" or not isinstance(last.get("content"), str):
+            return None
+        context = {"params": params, "history": messages[:-1]}
+        text = last["content"]
+    elif isinstance(data.get("prompt"), str):
+        context = {"params": params}
+        text = data["prompt"]
+    else:
+        return None
+    digest = hashlib.sha256(json.dumps(context, sort_keys=True).encode()).hexdigest()[:24]
+    return digest, text
+
+
+class HashingEmbedder:
+    """Dependency-free embedder: signed feature hashing of character n-grams and words
+
+    Character n-grams work for scripts without spaces (Chinese, Korean)
+    as well as for English; good enough for near-duplicate detection and
+    for tests, not for paraphrases.
+    """
+
+    def __init__(self, settings: Dict[str, Any]):
+        import numpy as np
+        self.np = np
+        self.dimensions = int(settings["dimensions"])
+        self.ngram_sizes = [int(n) for n in settings["ngram_sizes"]]
+
+    def _features(self, text: str) -> List[str]:
+        features = text.split()
+        for n in self.ngram_sizes:
+            features += [text[i:i + n] for i in range(max(len(text) - n + 1, 0))]
+        return features
+
+    async def embed(self, text: str):
+        vector = self.np.zeros(self.dimensions, dtype=self.np.float32)
+        for feature in self._features(text):
+            h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+            vector[h % self.dimensions] += 1.0 if h >> 63 else -1.0
+        return vector
+
+
+class HttpEmbedder:
+    """Embeddings from an OpenAI-compatible /v1/embeddings endpoint (e.g. a small embedding model server)"""
+
+    def __init__(self, settings: Dict[str, Any], client_factory: Callable[[], Any]):
+        import numpy as np
+        if not settings["embedding_url"]:
+            raise ValueError("caching.semantic.embedding_url is required for the http embedder")
+        self.np = np
+        self.settings = settings
+        self.client_factory = client_factory
+
+    async def embed(self, text: str):
+        response = await self.client_factory().post(
+            self.settings["embedding_url"],
+            json={"model": self.settings["embedding_model"], "input": text},
+            timeout=self.settings["embedding_timeout"],
+        )
+        response.raise_for_status()
+        return self.np.asarray(response.json()["data"][0]["embedding"], dtype=self.np.float32)
+
+
+def build_embedder(settings: Dict[str, Any], client_factory: Callable[[], Any]):
+    """hashing, http, or `package.module:factory` called with the semantic settings"""
+    name = settings["embedder"]
+    if name == "hashing":
+        return HashingEmbedder(settings)
+    if name == "http":
+        return HttpEmbedder(settings, client_factory)
+    module_name, _, attribute = name.partition(":")
+    if not attribute:
+        raise ValueError(f"Unknown embedder {name!r}; use hashing, http or package.module:factory")
+    return getattr(importlib.import_module(module_name), attribute)(settings)
+
+
+class VectorIndex:
+    """Unit vectors in a preallocated float32 matrix; search is one BLAS matrix-vector product
+
+    Each row carries a namespace id and only rows of the query's namespace
+    can match. Capacity grows by doubling up to max_entries, after which new
+    entries overwrite the oldest row (FIFO). Rows are counted per namespace,
+    and on_namespace_empty is called with an id once its last row is gone.
+    """
+
+    def __init__(self, dimensions: int, max_entries: int):
+        import numpy as np
+        self.np = np
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        size = min(1024, max_entries)
+        self.vectors = np.zeros((size, dimensions), dtype=np.float32)
+        self.namespaces = np.full(size, -1, dtype=np.int32)
+        self.values: List[Any] = [None] * size
+        self.count = 0
+        self.next = 0
+        self.rows: Dict[int, int] = {}
+        self.on_namespace_empty: Optional[Callable[[int], None]] = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _grow(self):
+        size = min(len(self.vectors) * 2, self.max_entries)
+        vectors = self.np.zeros((size, self.dimensions), dtype=self.np.float32)
+        vectors[:len(self.vectors)] = self.vectors
+        namespaces = self.np.full(size, -1, dtype=self.np.int32)
+        namespaces[:len(self.namespaces)] = self.namespaces
+        self.values += [None] * (size - len(self.values))
+        self.vectors, self.namespaces = vectors, namespaces
+
+    def add(self, vector, namespace: int, value: Any):
+        if self.next == len(self.vectors) and len(self.vectors) < self.max_entries:
+            self._grow()
+        slot = self.next % len(self.vectors)
+        previous = int(self.namespaces[slot])
+        self.vectors[slot] = vector
+        self.namespaces[slot] = namespace
+        self.values[slot] = value
+        self.rows[namespace] = self.rows.get(namespace, 0) + 1
+        self._release(previous)
+        self.next = slot + 1
+        self.count = min(self.count + 1, len(self.vectors))
+
+    def _release(self, namespace: int):
+        if namespace < 0:
+            return
+        self.rows[namespace] -= 1
+        if self.rows[namespace] == 0:
+            del self.rows[namespace]
+            if self.on_namespace_empty:
+                self.on_namespace_empty(namespace)
+
+    def search(self, vector, namespace: int) -> Tuple[float, Optional[Any], int]:
+        """(similarity, value, slot) of the nearest entry in namespace"""
+        if self.count == 0:
+            return 0.0, None, -1
+        scores = self.vectors[:self.count] @ vector
+        scores[self.namespaces[:self.count] != namespace] = -2.0
+        slot = int(scores.argmax())
+        if scores[slot] < -1.0:
+            return 0.0, None, -1
+        return float(scores[slot]), self.values[slot], slot
+
+    def remove(self, slot: int):
+        previous = int(self.namespaces[slot])
+        self.namespaces[slot] = -1
+        self.values[slot] = None
+        self._release(previous)
+
+
+class SemanticQuery:
+    """A looked-up request, kept so a miss can be stored without embedding again"""
+
+    def __init__(self, namespace: str, vector):
+        self.namespace = namespace
+        self.vector = vector
+        # Nearest cached entry's similarity, if any (recorded in the request log)
+        self.similarity: Optional[float] = None
+
+
+class SemanticHit:
+    def __init__(self, value: Any, similarity: float):
+        self.value = value
+        self.similarity = similarity
+
+
+class SemanticCache:
+    """In-process cache tier that answers near-duplicate prompts
+
+    Behind the exact-match cache: a request whose text embeds within
+    `threshold` cosine similarity of a cached one gets that response. Entries
+    are namespaced by endpoint and model, and by a hash of everything except
+    the matched text (sampling parameters, and for chat the conversation
+    before the last user message), so only the wording of the final prompt
+    is fuzzy. Text is normalized (NFKC, case-folded, punctuation dropped)
+    before embedding. Thresholds can be set per path under
+    caching.endpoints.<path>.semantic_threshold. Needs numpy.
+    """
+
+    def __init__(self, semantic_config: Optional[Dict[str, Any]], endpoints_config: Optional[Dict[str, Any]],
+                 client_factory: Callable[[], Any]):
+        self.settings = {**DEFAULT_SEMANTIC_CONFIG, **(semantic_config or {})}
+        self.endpoints = endpoints_config or {}
+        self.index: Optional[VectorIndex] = None
+        # Namespace ids are int32 row tags; an id is recycled once its last row is gone
+        self.namespace_ids: Dict[str, int] = {}
+        self.namespace_names: Dict[int, str] = {}
+        self.free_ids: List[int] = []
+        self.embedder = build_embedder(self.settings, client_factory) if self.enabled else None
+        self.on_lookup: Optional[Callable[[str, Optional[float]], None]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings["enabled"])
+
+    def threshold(self, path: str) -> float:
+        return float((self.endpoints.get(path) or {}).get("semantic_threshold", self.settings["threshold"]))
+
+    def __len__(self) -> int:
+        return len(self.index) if self.index is not None else 0
+
+    async def _embed(self, text: str):
+        np = self.embedder.np
+        vector = np.asarray(await self.embedder.embed(normalize_text(text)[:self.settings["max_text_chars"]]),
+                            dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else None
+
+    def _event(self, outcome: str, similarity: Optional[float] = None):
+        if self.on_lookup:
+            self.on_lookup(outcome, similarity)
+
+    async def lookup(self, path: str, namespace: str, data: Dict[str, Any]) -> Tuple[Optional[SemanticHit], Optional[SemanticQuery]]:
+        """Nearest cached response above the endpoint's threshold, and the query for storing a miss"""
+        split = split_request(data)
+        if split is None:
+            return None, None
+        context, text = split
+        try:
+            vector = await self._embed(text)
+        except Exception as e:
+            logger.warning(f"Semantic cache embedding failed: {e}")
+            self._event("error")
+            return None, None
+        if vector is None:
+            return None, None
+        query = SemanticQuery(f"{namespace}:{data.get('model') or 'default'}:{context}", vector)
+        namespace_id = self.namespace_ids.get(query.namespace)
+        if self.index is None or namespace_id is None:
+            self._event("miss")
+            return None, query
+        if len(self.index) > OFFLOAD_ROWS:
+            similarity, entry, slot = await asyncio.to_thread(self.index.search, vector, namespace_id)
+            # A store may have overwritten the row, or recycled the namespace id, meanwhile
+            if entry is not None and (self.index.values[slot] is not entry
+                                      or self.namespace_ids.get(query.namespace) != namespace_id):
+                entry = None
+        else:
+            similarity, entry, slot = self.index.search(vector, namespace_id)
+        if entry is not None:
+            query.similarity = similarity
+        if entry is None or similarity < self.threshold(path):
+            self._event("miss", similarity if entry is not None else None)
+            return None, query
+        value, stored_at = entry
+        if time.time() - stored_at > self.settings["ttl"]:
+            self.index.remove(slot)
+            self._event("miss", similarity)
+            return None, query
+        self._event("hit", similarity)
+        return SemanticHit(value, similarity), query
+
+    def store(self, query: SemanticQuery, value: Any):
+        if self.index is None:
+            self.index = VectorIndex(len(query.vector), int(self.settings["max_entries"]))
+            self.index.on_namespace_empty = self._forget_namespace
+        namespace_id = self.namespace_ids.get(query.namespace)
+        if namespace_id is None:
+            namespace_id = self.free_ids.pop() if self.free_ids else len(self.namespace_ids)
+            self.namespace_ids[query.namespace] = namespace_id
+            self.namespace_names[namespace_id] = query.namespace
+        self.index.add(query.vector, namespace_id, (value, time.time()))
+
+    def _forget_namespace(self, namespace_id: int):
+        del self.namespace_ids[self.namespace_names.pop(namespace_id)]
+        self.free_ids.append(namespace_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "embedder": self.settings["embedder"],
+            "threshold": self.settings["threshold"],
+            "namespaces": len(self.namespace_ids),
+            "entries": len(self),
+        }
@@ -0,0 +1,406 @@
+"""
+Process supervisor for the model servers, replacing the nohup/PID-file scripts.
+
+    python -m api_gateway.supervisor --config configs/model_configs.yaml
+
+Backends that fit the GPU memory budget are launched in parallel and marked
+ready by their health endpoint rather than a fixed sleep. Crashed or
+unresponsive backends are restarted with exponential backoff. Output is
+streamed to per-model log files (and the console) and a status API is served
+on status_port.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+import yaml
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+
+from .lifecycle import DEFAULT_LIFECYCLE_CONFIG, BackendProcess, build_backend_process
+from .prewarm import Prewarmer, fetch_request_frequency
+
+logger = logging.getLogger(__name__)
+
+# Default knobs, overridable from the `supervisor` section of model_configs.yaml
+DEFAULT_SUPERVISOR_CONFIG = {
+    "max_parallel_starts": 0,
+    "restart_backoff_initial": 1.0,
+    "restart_backoff_max": 60.0,
+    "stable_seconds": 60,
+    "max_consecutive_failures": 0,
+    "liveness_interval": 10.0,
+    "liveness_failures": 3,
+    "log_tail_lines": 200,
+    "stream_logs": True,
+    "status_host": "127.0.0.1",
+    "status_port": 9100,
+}
+
+
+class SupervisedBackend:
+    """Runtime state of one supervised model server"""
+
+    def __init__(self, name: str, gpu_memory: float, process: BackendProcess, tail_lines: int):
+        self.name = name
+        self.gpu_memory = gpu_memory
+        self.process = process
+        self.state = "pending"
+        self.restarts = 0
+        self.consecutive_failures = 0
+        self.last_exit_code: Optional[int] = None
+        self.ready_at: Optional[float] = None
+        self.next_start_at: Optional[float] = None
+        self.startup_seconds: Optional[float] = None
+        self.tail: deque = deque(maxlen=tail_lines)
+        self.task: Optional[asyncio.Task] = None
+        self.restart_requested = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "state": self.state,
+            "pid": self.process.pid if self.process.running else None,
+            "endpoint": self.process.endpoint,
+            "gpu_memory": self.gpu_memory,
+            "restarts": self.restarts,
+            "consecutive_failures": self.consecutive_failures,
+            "last_exit_code": self.last_exit_code,
+            "startup_seconds": round(self.startup_seconds, 1) if self.startup_seconds is not None else None,
+            "uptime_seconds": round(now - self.ready_at, 1) if self.state == "ready" and self.ready_at else None,
+            "restart_in_seconds": round(max(0.0, self.next_start_at - now), 1)
+            if self.state == "backoff" and self.next_start_at else None,
+        }
+
+
+class Supervisor:
+    """Keeps a set of model servers running
+
+    Models are admitted in config order while their gpu_memory fits the
+    lifecycle gpu_memory_budget; the rest are reported as "unscheduled".
+    Admitted models start concurrently (at most max_parallel_starts at a time
+    when set). A backend that exits, fails to become ready within
+    startup_timeout, or fails liveness_failures consecutive health checks is
+    restarted after restart_backoff_initial * 2^(failures-1) seconds, capped at
+    restart_backoff_max; the failure count resets once it has been ready for
+    stable_seconds.
+
+    With prewarming enabled, weight files are read into the page cache while
+    the servers initialise (admitted models first, then the unscheduled ones
+    as failover candidates), and again for a crashed model during its backoff.
+    When a backend is given up on (max_consecutive_failures), the unscheduled
+    models that fit the memory it held are started in its place.
+    """
+
+    def __init__(self, supervisor_config: Optional[Dict[str, Any]], lifecycle_config: Optional[Dict[str, Any]],
+                 model_configs: Dict[str, Any], prewarm_config: Optional[Dict[str, Any]] = None):
+        self.settings = {**DEFAULT_SUPERVISOR_CONFIG, **(supervisor_config or {})}
+        self.model_configs = model_configs
+        self.prewarmer = Prewarmer(prewarm_config, model_configs)
+        self.prewarm_task: Optional[asyncio.Task] = None
+        self.lifecycle = {**DEFAULT_LIFECYCLE_CONFIG, **(lifecycle_config or {})}
+        self.backends: Dict[str, SupervisedBackend] = {}
+        self.unscheduled: List[str] = []
+        self.stopping = False
+        self.started_at: Optional[float] = None
+        self.all_ready_seconds: Optional[float] = None
+        parallel = int(self.settings["max_parallel_starts"])
+        self.start_slots = asyncio.Semaphore(parallel) if parallel > 0 else None
+
+        budget = float(self.lifecycle["gpu_memory_budget"])
+        reserved = 0.0
+        for name, model_config in model_configs.items():
+            gpu_memory = float(model_config.get("gpu_memory", 0.3))
+            if reserved + gpu_memory > budget + 1e-9:
+                logger.warning(f"Not starting {name}: needs {gpu_memory} of GPU memory, "
+                               f"{budget - reserved:.2f} of {budget} left")
+                self.unscheduled.append(name)
+                continue
+            reserved += gpu_memory
+            self._add_backend(name)
+
+    def _add_backend(self, name: str) -> SupervisedBackend:
+        model_config = self.model_configs[name]
+        process = build_backend_process(name, model_config, self.lifecycle)
+        backend = SupervisedBackend(name, float(model_config.get("gpu_memory", 0.3)), process,
+                                    self.settings["log_tail_lines"])
+        self.backends[name] = backend
+        return backend
+
+    @property
+    def all_ready(self) -> bool:
+        return bool(self.backends) and all(b.state == "ready" for b in self.backends.values())
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "all_ready": self.all_ready,
+            "all_ready_seconds": round(self.all_ready_seconds, 1) if self.all_ready_seconds is not None else None,
+            "gpu_memory_budget": self.lifecycle["gpu_memory_budget"],
+            "gpu_memory_reserved": round(sum(b.gpu_memory for b in self.backends.values() if b.state != "failed"), 3),
+            "backends": {name: b.to_dict() for name, b in self.backends.items()},
+            "unscheduled": self.unscheduled,
+        }
+
+    def backoff(self, backend: SupervisedBackend) -> float:
+        exponent = max(0, backend.consecutive_failures - 1)
+        return min(self.settings["restart_backoff_max"], self.settings["restart_backoff_initial"] * 2 ** exponent)
+
+    def start(self):
+        self.started_at = time.monotonic()
+        if self.prewarmer.enabled:
+            self.prewarm_task = asyncio.create_task(self._prewarm_all())
+        for backend in self.backends.values():
+            backend.task = asyncio.create_task(self._supervise(backend))
+
+    async def _prewarm_all(self):
+        url = self.prewarmer.settings["frequency_url"]
+        frequency = await fetch_request_frequency(url) if url else {}
+        try:
+            await self.prewarmer.prewarm(self.backends, frequency)
+            if self.unscheduled:
+                await self.prewarmer.prewarm(self.unscheduled, frequency)
+        except Exception as e:
+            logger.error(f"Prewarm failed: {e}")
+
+    async def _supervise(self, backend: SupervisedBackend):
+        max_failures = int(self.settings["max_consecutive_failures"])
+        while not self.stopping:
+            await self._run_once(backend)
+            if self.stopping:
+                break
+            if backend.restart_requested:
+                backend.restart_requested = False
+                continue
+            backend.consecutive_failures += 1
+            if max_failures and backend.consecutive_failures >= max_failures:
+                backend.state = "failed"
+                logger.error(f"{backend.name} failed {backend.consecutive_failures} times in a row; giving up")
+                self._start_unscheduled()
+                return
+            delay = self.backoff(backend)
+            backend.state = "backoff"
+            backend.next_start_at = time.monotonic() + delay
+            logger.warning(f"Restarting {backend.name} in {delay:.1f}s")
+            if self.prewarmer.enabled:
+                # Bounded by the backoff so a slow disk never delays the restart
+                try:
+                    await asyncio.wait_for(self.prewarmer.prewarm([backend.name]), delay)
+                except asyncio.TimeoutError:
+                    pass
+                except Exception as e:
+                    logger.error(f"Prewarm of {backend.name} failed: {e}")
+                delay = max(0.0, backend.next_start_at - time.monotonic())
+            await asyncio.sleep(delay)
+            backend.restarts += 1
+
+    def _start_unscheduled(self):
+        """Start unscheduled models, in config order, in the GPU memory that failed backends gave up"""
+        free = float(self.lifecycle["gpu_memory_budget"]) - sum(
+            b.gpu_memory for b in self.backends.values() if b.state != "failed"
+        )
+        for name in list(self.unscheduled):
+            gpu_memory = float(self.model_configs[name].get("gpu_memory", 0.3))
+            if gpu_memory > free + 1e-9:
+                continue
+            free -= gpu_memory
+            self.unscheduled.remove(name)
+            backend = self._add_backend(name)
+            logger.info(f"Starting {name} in the GPU memory of failed backends")
+            backend.task = asyncio.create_task(self._supervise(backend))
+
+    async def _run_once(self, backend: SupervisedBackend):
+        """Start the backend and return once its process has exited"""
+        process = backend.process
+        if self.start_slots is not None:
+            await self.start_slots.acquire()
+        try:
+            backend.state = "starting"
+            logger.info(f"Starting {backend.name}: {' '.join(process.command)}")
+            try:
+                await process.start(stdout=asyncio.subprocess.PIPE)
+            except OSError as e:
+                logger.error(f"Could not start {backend.name}: {e}")
+                backend.state = "exited"
+                return
+            pump = asyncio.create_task(self._pump_logs(backend))
+            ready = await process.wait_ready(self.lifecycle["startup_timeout"], self.lifecycle["health_poll_interval"])
+        finally:
+            if self.start_slots is not None:
+                self.start_slots.release()
+
+        if ready:
+            backend.state = "ready"
+            backend.ready_at = time.monotonic()
+            backend.startup_seconds = backend.ready_at - process.started_at
+            logger.info(f"{backend.name} ready after {backend.startup_seconds:.1f}s")
+            self._check_all_ready()
+            await self._watch(backend)
+        elif process.running:
+            logger.error(f"{backend.name} not ready within {self.lifecycle['startup_timeout']}s")
+
+        if process.running:
+            await process.stop(self.lifecycle["stop_timeout"])
+        await pump
+        backend.last_exit_code = process.process.returncode
+        if backend.state == "ready" and time.monotonic() - backend.ready_at >= self.settings["stable_seconds"]:
+            backend.consecutive_failures = 0
+        if not self.stopping and not backend.restart_requested:
+            logger.error(f"{backend.name} exited with code {backend.last_exit_code}")
+        backend.state = "stopped" if self.stopping else "exited"
+
+    async def _watch(self, backend: SupervisedBackend):
+        """Wait for exit; return early after liveness_failures failed health checks"""
+        process = backend.process
+        failures = 0
+        exited = asyncio.ensure_future(process.process.wait())
+        try:
+            while True:
+                done, _ = await asyncio.wait({exited}, timeout=self.settings["liveness_interval"])
+                if done or self.stopping or backend.restart_requested:
+                    return
+                if await process.probe():
+                    failures = 0
+                    continue
+                failures += 1
+                if failures >= self.settings["liveness_failures"]:
+                    logger.error(f"{backend.name} failed {failures} health checks; killing it")
+                    return
+        finally:
+            exited.cancel()
+
+    async def _pump_logs(self, backend: SupervisedBackend):
+        """Copy process output to its log file, the status tail and (optionally) our stdout"""
+        process = backend.process
+        log_file = None
+        if process.log_path:
+            os.makedirs(os.path.dirname(process.log_path) or ".", exist_ok=True)
+            log_file = open(process.log_path, "ab")
+        try:
+            async for raw in process.process.stdout:
+                if log_file is not None:
+                    log_file.write(raw)
+                    log_file.flush()
+                line = raw.decode(errors="replace").rstrip()
+                backend.tail.append(line)
+                if self.settings["stream_logs"]:
+                    sys.stdout.write(f"[{backend.name}] {line}\n")
+                    sys.stdout.flush()
+        finally:
+            if log_file is not None:
+                log_file.close()
+
+    def _check_all_ready(self):
+        if self.all_ready_seconds is None and self.all_ready:
+            self.all_ready_seconds = time.monotonic() - self.started_at
+            logger.info(f"All {len(self.backends)} backends ready in {self.all_ready_seconds:.1f}s")
+
+    async def restart(self, name: str):
+        """Stop a backend and start it again immediately, without counting a failure"""
+        backend = self.backends[name]
+        backend.restart_requested = True
+        if backend.process.running:
+            await backend.process.stop(self.lifecycle["stop_timeout"])
+
+    async def shutdown(self):
+        self.stopping = True
+        if self.prewarm_task is not None:
+            self.prewarm_task.cancel()
+            await asyncio.gather(self.prewarm_task, return_exceptions=True)
+        await asyncio.gather(
+            *(b.process.stop(self.lifecycle["stop_timeout"]) for b in self.backends.values()),
+            return_exceptions=True,
+        )
+        tasks = [b.task for b in self.backends.values() if b.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for backend in self.backends.values():
+            backend.state = "stopped"
+
+
+def create_status_app(supervisor: Supervisor) -> FastAPI:
+    app = FastAPI(title="Model Supervisor")
+
+    def backend_or_404(name: str) -> SupervisedBackend:
+        if name not in supervisor.backends:
+            raise HTTPException(status_code=404, detail=f"Backend {name} not supervised")
+        return supervisor.backends[name]
+
+    @app.get("/status")
+    async def status():
+        return supervisor.status()
+
+    @app.get("/health")
+    async def health():
+        return JSONResponse(supervisor.status(), status_code=200 if supervisor.all_ready else 503)
+
+    @app.get("/logs/{name}")
+    async def logs(name: str, lines: int = 100):
+        backend = backend_or_404(name)
+        return {"name": name, "lines": list(backend.tail)[-lines:] if lines > 0 else []}
+
+    @app.post("/backends/{name}/restart")
+    async def restart(name: str):
+        backend_or_404(name)
+        await supervisor.restart(name)
+        return {"name": name, "restarting": True}
+
+    return app
+
+
+async def run(config: Dict[str, Any], models: Optional[List[str]] = None, status_port: Optional[int] = None):
+    import uvicorn
+
+    model_configs = config["models"]
+    if models:
+        unknown = [m for m in models if m not in model_configs]
+        if unknown:
+            raise SystemExit(f"Unknown models: {', '.join(unknown)}")
+        model_configs = {name: model_configs[name] for name in models}
+
+    supervisor = Supervisor(config.get("supervisor"), config.get("lifecycle"), model_configs, config.get("prewarm"))
+    settings = supervisor.settings
+    server = uvicorn.Server(uvicorn.Config(
+        create_status_app(supervisor),
+        host=settings["status_host"],
+        port=status_port if status_port is not None else settings["status_port"],
+        log_level="warning",
+    ))
+    server.install_signal_handlers = lambda: None
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    supervisor.start()
+    api = asyncio.create_task(server.serve())
+    await stop.wait()
+    logger.info("Stopping backends")
+    await supervisor.shutdown()
+    server.should_exit = True
+    await api
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Launch and supervise the model servers")
+    parser.add_argument("--config", default="configs/model_configs.yaml")
+    parser.add_argument("--models", nargs="*", help="Subset of models to run (default: all)")
+    parser.add_argument("--status-port", type=int, help="Override supervisor.status_port")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    asyncio.run(run(config, args.models, args.status_port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import hashlib
+from typing import Dict, Any, Optional, Mapping
+
+# Default knobs, overridable from the `tenants` section of model_configs.yaml
+DEFAULT_TENANT_CONFIG = {
+    "enabled": False,
+    "header": "X-Tenant-ID",
+    "default_tier": "standard",
+    "quantum_tokens": 1024,
+    "tiers": {"free": 1, "standard": 2, "premium": 4},
+    "api_keys": {},
+    "tenant_tiers": {},
+    "unknown_tenant_buckets": 16,
+}
+
+
+class Tenant:
+    """Who a request is accounted to, and how much of the backends they may claim
+
+    name is bounded (configured tenants plus a few buckets for everyone else)
+    and is what metrics and fair queuing see; owner tells apart the callers
+    sharing a bucket, for scoping idempotency keys and background generations.
+    """
+
+    __slots__ = ("name", "tier", "weight", "owner")
+
+    def __init__(self, name: str, tier: str, weight: float, owner: Optional[str] = None):
+        self.name = name
+        self.tier = tier
+        self.weight = weight
+        self.owner = owner or name
+
+    def __repr__(self) -> str:
+        return f"Tenant({self.name!r}, tier={self.tier!r})"
+
+
+class TenantResolver:
+    """Maps request headers to a tenant via API key or tenant header
+
+    Only tenants named in the config (api_keys, tenant_tiers) keep their own
+    name; unknown keys and header values are hashed into
+    unknown_tenant_buckets shared tenants, so clients cannot mint metric
+    labels or queue state at will.
+    """
+
+    def __init__(self, tenant_config: Optional[Dict[str, Any]] = None):
+        self.settings = {**DEFAULT_TENANT_CONFIG, **(tenant_config or {})}
+        self.tiers = self.settings["tiers"]
+        self.api_keys = self.settings["api_keys"] or {}
+        self.tenant_tiers = self.settings["tenant_tiers"] or {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings["enabled"])
+
+    def weight(self, tier: str) -> float:
+        return float(self.tiers.get(tier, self.tiers.get(self.settings["default_tier"], 1)))
+
+    def resolve(self, headers: Mapping[str, str]) -> Tenant:
+        """Identify the tenant for a request"""
+        api_key = headers.get("X-API-Key")
+        authorization = headers.get("Authorization", "")
+        if not api_key and authorization.lower().startswith("bearer "):
+            api_key = authorization[7:].strip()
+
+        if api_key:
+            known = self.api_keys.get(api_key)
+            owner = self._anonymize(api_key)
+            if known:
+                tier = known.get("tier", self.settings["default_tier"])
+                return Tenant(known.get("tenant", owner), tier, self.weight(tier), owner)
+            # Unknown keys are still isolated from each other, but never exposed in metrics
+            return self._unknown(owner)
+
+        name = headers.get(self.settings["header"])
+        if not name:
+            return Tenant("anonymous", self.settings["default_tier"], self.weight(self.settings["default_tier"]))
+        if name in self.tenant_tiers:
+            tier = self.tenant_tiers[name]
+            return Tenant(name, tier, self.weight(tier))
+        return self._unknown(f"header-{name}")
+
+    def _unknown(self, owner: str) -> Tenant:
+        buckets = max(1, int(self.settings["unknown_tenant_buckets"]))
+        bucket = int.from_bytes(hashlib.sha256(owner.encode()).digest()[:4], "big") % buckets
+        tier = self.settings["default_tier"]
+        return Tenant(f"unknown-{bucket}", tier, self.weight(tier), owner)
+
+    @staticmethod
+    def _anonymize(api_key: str) -> str:
+        return "key-" + hashlib.sha256(api_key.encode()).hexdigest()[:12]
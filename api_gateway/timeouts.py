@@ -0,0 +1,139 @@
+from typing import Dict, Any, Optional, Mapping
+
+# Default knobs, overridable from the `timeouts` section of model_configs.yaml
+DEFAULT_TIMEOUT_CONFIG = {
+    "safety_factor": 2.0,
+    "min_timeout": 5.0,
+    "connect_timeout": 5.0,
+    "overhead_seconds": 1.0,
+    "prefill_tokens_per_second": 4000.0,
+    "default_decode_tokens_per_second": 30.0,
+    "min_observed_tokens": 8,
+    "ewma_alpha": 0.2,
+    "client_header": "X-Request-Timeout",
+}
+
+
+def estimate_prompt_tokens(data: Dict[str, Any]) -> int:
+    """Rough prompt token estimate (~4 characters per token; token-id prompts are counted exactly)"""
+    chars = 0
+    tokens = 0
+    if "messages" in data:
+        for message in data.get("messages") or []:
+            content = message.get("content") or ""
+            if isinstance(content, list):
+                # OpenAI content parts: [{"type": "text", "text": ...}, ...]
+                chars += sum(len(part.get("text", "")) for part in content if isinstance(part, dict))
+            else:
+                chars += len(str(content))
+    else:
+        prompt = data.get("prompt") or ""
+        if isinstance(prompt, list):
+            for p in prompt:
+                # [1, 2, 3] is one token-id prompt, [[1, 2], [3]] a batch of them
+                if isinstance(p, int):
+                    tokens += 1
+                elif isinstance(p, list):
+                    tokens += len(p)
+                else:
+                    chars += len(str(p))
+        else:
+            chars += len(str(prompt))
+    return max(1, tokens + chars // 4)
+
+
+class DecodeSpeedTracker:
+    """Tracks recently observed per-request decode speed (tokens/sec) per model"""
+
+    def __init__(self, alpha: float = 0.2, default_tokens_per_second: float = 30.0,
+                 min_observed_tokens: int = 8):
+        self.alpha = alpha
+        self.default_tokens_per_second = default_tokens_per_second
+        self.min_observed_tokens = min_observed_tokens
+        self.speeds: Dict[str, float] = {}
+
+    def observe(self, model: str, completion_tokens: int, decode_seconds: float):
+        """Fold one finished generation into the model's EWMA"""
+        # Very short generations are dominated by overhead and skew the estimate
+        if completion_tokens < self.min_observed_tokens or decode_seconds <= 0:
+            return
+        speed = completion_tokens / decode_seconds
+        previous = self.speeds.get(model)
+        if previous is None:
+            self.speeds[model] = speed
+        else:
+            self.speeds[model] = self.alpha * speed + (1 - self.alpha) * previous
+
+    def tokens_per_second(self, model: str) -> float:
+        return self.speeds.get(model, self.default_tokens_per_second)
+
+
+class TimeoutPolicy:
+    """Computes a per-request upstream deadline from request size and observed speed"""
+
+    def __init__(self, timeout_config: Optional[Dict[str, Any]], model_configs: Dict[str, Any],
+                 tracker: Optional[DecodeSpeedTracker] = None):
+        self.settings = {**DEFAULT_TIMEOUT_CONFIG, **(timeout_config or {})}
+        self.model_configs = model_configs
+        self.tracker = tracker or DecodeSpeedTracker(
+            alpha=self.settings["ewma_alpha"],
+            default_tokens_per_second=self.settings["default_decode_tokens_per_second"],
+            min_observed_tokens=self.settings["min_observed_tokens"],
+        )
+
+    @property
+    def connect_timeout(self) -> float:
+        return float(self.settings["connect_timeout"])
+
+    def max_timeout(self, model: str) -> float:
+        """Per-model ceiling from model_configs.yaml (`timeout`)"""
+        return float(self.model_configs.get(model, {}).get("timeout", 300))
+
+    def requested_max_tokens(self, model: str, data: Dict[str, Any]) -> int:
+        max_tokens = data.get("max_tokens")
+        if max_tokens is None:
+            max_tokens = self.model_configs.get(model, {}).get("max_tokens", 2048)
+        return int(max_tokens)
+
+    def prefill_seconds(self, data: Dict[str, Any]) -> float:
+        return estimate_prompt_tokens(data) / float(self.settings["prefill_tokens_per_second"])
+
+    def expected_seconds(self, model: str, data: Dict[str, Any], expected_tokens: Optional[int] = None) -> float:
+        """Expected service time without the safety factor
+
+        expected_tokens defaults to max_tokens; callers with a completion length
+        prediction pass it in instead.
+        """
+        if expected_tokens is None:
+            expected_tokens = self.requested_max_tokens(model, data)
+        decode_seconds = expected_tokens / self.tracker.tokens_per_second(model)
+        return float(self.settings["overhead_seconds"]) + self.prefill_seconds(data) + decode_seconds
+
+    def client_timeout(self, headers: Mapping[str, str]) -> Optional[float]:
+        """Client-supplied deadline in seconds, if present and valid"""
+        value = headers.get(self.settings["client_header"])
+        if value is None:
+            return None
+        try:
+            timeout = float(value)
+        except ValueError:
+            return None
+        return timeout if timeout > 0 else None
+
+    def compute(self, model: str, data: Dict[str, Any], headers: Optional[Mapping[str, str]] = None,
+                expected_tokens: Optional[int] = None) -> float:
+        """Return the upstream timeout in seconds for this request"""
+        ceiling = self.max_timeout(model)
+        client_timeout = self.client_timeout(headers or {})
+        if client_timeout is not None:
+            return min(client_timeout, ceiling)
+
+        timeout = self.expected_seconds(model, data, expected_tokens) * float(self.settings["safety_factor"])
+        timeout = max(timeout, float(self.settings["min_timeout"]))
+        return min(timeout, ceiling)
+
+    def observe(self, model: str, data: Dict[str, Any], completion_tokens: int, elapsed: float):
+        """Record a finished generation to refine the model's decode speed"""
+        decode_seconds = elapsed - self.prefill_seconds(data) - float(self.settings["overhead_seconds"]) / 2
+        self.tracker.observe(model, completion_tokens, max(decode_seconds, elapsed / 2))
+
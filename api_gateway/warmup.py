@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Any, Callable, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Default knobs, overridable from the `warmup` section of model_configs.yaml
+DEFAULT_WARMUP_CONFIG = {
+    "enabled": True,
+    "block_startup": False,
+    "startup_timeout": 120,
+    "probe_interval": 1.0,
+    "probe_timeout": 5.0,
+    "recheck_interval": 15.0,
+    "min_ready_models": 1,
+    "connections_per_backend": 4,
+    "warmup_requests": True,
+    "warmup_max_tokens": 1,
+    "system_prompts": [],
+    "max_connections": 200,
+    "max_keepalive_connections": 50,
+    "keepalive_expiry": 30,
+}
+
+
+def build_http_client(warmup_config: Optional[Dict[str, Any]] = None) -> httpx.AsyncClient:
+    """Pooled client shared by all upstream calls; per-request timeouts are passed on each call"""
+    settings = {**DEFAULT_WARMUP_CONFIG, **(warmup_config or {})}
+    limits = httpx.Limits(
+        max_connections=settings["max_connections"],
+        max_keepalive_connections=settings["max_keepalive_connections"],
+        keepalive_expiry=settings["keepalive_expiry"],
+    )
+    return httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(300.0))
+
+
+class BackendWarmup:
+    """Outcome of gating one backend"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.healthy = False
+        self.served_name: Optional[str] = None
+        self.probe_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.warmed_prompts = 0
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "served_name": self.served_name,
+            "probe_seconds": round(self.probe_seconds, 3) if self.probe_seconds is not None else None,
+            "warmup_seconds": round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            "warmed_prompts": self.warmed_prompts,
+            "error": self.error,
+        }
+
+
+class ReadinessGate:
+    """Holds the gateway "not ready" until its backends have been probed and warmed
+
+    Every backend is probed concurrently until /health answers 200 (or
+    startup_timeout passes). A healthy backend then gets
+    connections_per_backend concurrent requests so the shared pool holds warm
+    keep-alive connections to it. With warmup_requests enabled, it also gets
+    one max_tokens=1 chat request per hot system prompt (warmup.system_prompts
+    plus models.<name>.warmup_system_prompts), which seeds the backend's
+    prefix cache. The gateway is ready once the gate has finished and at least
+    min_ready_models backends are healthy. Backends that missed the gate are
+    probed again every recheck_interval seconds and gated when they answer,
+    so the gateway becomes ready once enough of them recover.
+    """
+
+    def __init__(self, warmup_config: Optional[Dict[str, Any]], model_configs: Dict[str, Any]):
+        self.settings = {**DEFAULT_WARMUP_CONFIG, **(warmup_config or {})}
+        self.model_configs = model_configs
+        self.backends: Dict[str, BackendWarmup] = {}
+        self.finished = False
+        self.started_at: Optional[float] = None
+        self.seconds: Optional[float] = None
+        self.recheck_task: Optional[asyncio.Task] = None
+        self.extra_prompts: Optional[Callable[[str], List[str]]] = None
+        self.on_backend: Optional[Callable[[BackendWarmup], None]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings["enabled"])
+
+    @property
+    def ready(self) -> bool:
+        if not self.enabled:
+            return True
+        healthy = sum(1 for b in self.backends.values() if b.healthy)
+        return self.finished and healthy >= min(self.settings["min_ready_models"], len(self.backends))
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "finished": self.finished,
+            "seconds": round(self.seconds, 3) if self.seconds is not None else None,
+            "backends": {name: b.to_dict() for name, b in self.backends.items()},
+        }
+
+    def system_prompts(self, model: str) -> List[str]:
+        prompts = list(self.settings["system_prompts"] or [])
+        prompts += self.model_configs.get(model, {}).get("warmup_system_prompts", []) or []
+        if self.extra_prompts is not None:
+            prompts += self.extra_prompts(model)
+        return list(dict.fromkeys(prompts))
+
+    async def run(self, client: httpx.AsyncClient, endpoints: Dict[str, str]):
+        """Gate every backend concurrently; never raises"""
+        self.started_at = time.monotonic()
+        self.backends = {model: BackendWarmup(model) for model in endpoints}
+        await asyncio.gather(*(
+            self._gate(client, self.backends[model], endpoint) for model, endpoint in endpoints.items()
+        ))
+        self.seconds = time.monotonic() - self.started_at
+        self.finished = True
+        healthy = [b.model for b in self.backends.values() if b.healthy]
+        logger.info(f"Readiness gate finished in {self.seconds:.1f}s: {len(healthy)}/{len(endpoints)} backends healthy")
+        if len(healthy) < len(endpoints) and self.settings["recheck_interval"] > 0:
+            self.recheck_task = asyncio.create_task(self._recheck(client, endpoints))
+
+    async def _recheck(self, client: httpx.AsyncClient, endpoints: Dict[str, str]):
+        """Gate backends that missed startup once they answer; ends when all are healthy"""
+        while True:
+            failed = [b for b in self.backends.values() if not b.healthy]
+            if not failed:
+                return
+            await asyncio.sleep(self.settings["recheck_interval"])
+            await asyncio.gather(*(self._gate(client, b, endpoints[b.model], recheck=True) for b in failed))
+
+    async def shutdown(self):
+        if self.recheck_task is not None and not self.recheck_task.done():
+            self.recheck_task.cancel()
+            await asyncio.gather(self.recheck_task, return_exceptions=True)
+
+    async def _gate(self, client: httpx.AsyncClient, backend: BackendWarmup, endpoint: str, recheck: bool = False):
+        try:
+            # A recheck is a single probe; the startup gate keeps trying for startup_timeout
+            if not await self._probe(client, backend, endpoint, 0 if recheck else self.settings["startup_timeout"]):
+                if recheck:
+                    logger.debug(f"{backend.model} at {endpoint} still unavailable: {backend.error}")
+                    return
+                backend.error = backend.error or f"not healthy within {self.settings['startup_timeout']}s"
+                logger.warning(f"{backend.model} at {endpoint}: {backend.error}")
+                return
+            if recheck:
+                logger.info(f"{backend.model} at {endpoint} is now healthy")
+            backend.healthy = True
+            started = time.monotonic()
+            await self._open_connections(client, endpoint)
+            if self.settings["warmup_requests"]:
+                await self._warm_prefixes(client, backend, endpoint)
+            backend.warmup_seconds = time.monotonic() - started
+        except Exception as e:
+            backend.error = str(e)
+            logger.warning(f"Warmup of {backend.model} failed: {e}")
+        finally:
+            if self.on_backend:
+                self.on_backend(backend)
+
+    async def _probe(self, client: httpx.AsyncClient, backend: BackendWarmup, endpoint: str,
+                     timeout: float) -> bool:
+        health_path = self.model_configs.get(backend.model, {}).get("healthcheck_endpoint", "/health")
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                response = await client.get(f"{endpoint}{health_path}", timeout=self.settings["probe_timeout"])
+                if response.status_code == 200:
+                    backend.error = None
+                    backend.probe_seconds = time.monotonic() - self.started_at
+                    return True
+                backend.error = f"health returned {response.status_code}"
+            except httpx.HTTPError as e:
+                backend.error = f"{type(e).__name__}: {e}"
+            if time.monotonic() + self.settings["probe_interval"] >= deadline:
+                return False
+            await asyncio.sleep(self.settings["probe_interval"])
+
+    async def _open_connections(self, client: httpx.AsyncClient, endpoint: str):
+        """Concurrent requests make the pool open (and keep alive) that many connections"""
+        count = int(self.settings["connections_per_backend"])
+        await asyncio.gather(
+            *(client.get(f"{endpoint}/v1/models", timeout=self.settings["probe_timeout"]) for _ in range(count)),
+            return_exceptions=True,
+        )
+
+    async def _served_name(self, client: httpx.AsyncClient, backend: BackendWarmup, endpoint: str) -> str:
+        if backend.served_name is None:
+            response = await client.get(f"{endpoint}/v1/models", timeout=self.settings["probe_timeout"])
+            response.raise_for_status()
+            served = response.json().get("data") or []
+            backend.served_name = served[0]["id"] if served else backend.model
+        return backend.served_name
+
+    async def _warm_prefixes(self, client: httpx.AsyncClient, backend: BackendWarmup, endpoint: str):
+        await self._served_name(client, backend, endpoint)
+        await self._send_prompts(client, backend, endpoint, self.system_prompts(backend.model) or [""])
+
+    async def warm_prompts(self, client: httpx.AsyncClient, model: str, endpoint: str, prompts: List[str]):
+        """Seed a running backend's prefix cache with prompts that appeared after startup; never raises"""
+        backend = self.backends.get(model) or BackendWarmup(model)
+        try:
+            await self._served_name(client, backend, endpoint)
+            await self._send_prompts(client, backend, endpoint, prompts)
+        except httpx.HTTPError as e:
+            logger.warning(f"Warming {model} with new prompts failed: {e}")
+
+    async def _send_prompts(self, client: httpx.AsyncClient, backend: BackendWarmup, endpoint: str,
+                            prompts: List[str]):
+        for prompt in prompts:
+            messages = [{"role": "user", "content": "Hi"}]
+            if prompt:
+                messages.insert(0, {"role": "system", "content": prompt})
+            response = await client.post(f"{endpoint}/v1/chat/completions", json={
+                "model": backend.served_name,
+                "messages": messages,
+                "max_tokens": self.settings["warmup_max_tokens"],
+                "temperature": 0,
+            }, timeout=self.settings["startup_timeout"])
+            response.raise_for_status()
+            if prompt:
+                backend.warmed_prompts += 1
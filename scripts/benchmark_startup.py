@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Gateway startup-time benchmark.
+
+Measures, in fresh interpreters:
+  import  - `import api_gateway.main`
+  create  - create_app() (config load and component construction)
+  listen  - process spawn until uvicorn answers HTTP
+  ready   - process spawn until GET /ready returns 200
+
+Usage:
+    python scripts/benchmark_startup.py [--config configs/model_configs.yaml] [--runs 5] [--port 18080]
+
+Point the models at running backends (or scripts/standin_backend.py) for a
+meaningful `ready` figure; otherwise it includes warmup.startup_timeout.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import api_gateway.main as gateway
+imported = time.perf_counter()
+gateway.create_app(config_path=sys.argv[1])
+created = time.perf_counter()
+print(json.dumps({"import": imported - started, "create": created - imported}))
+"""
+
+
+def measure_import(config_path: str) -> dict:
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_PROBE, config_path], cwd=REPO)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def get_status(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return 0
+
+
+def measure_serve(config_path: str, port: int, timeout: float) -> dict:
+    env = {**os.environ, "GATEWAY_CONFIG": config_path}
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api_gateway.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    result = {"listen": None, "ready": None}
+    try:
+        deadline = started + timeout
+        while time.perf_counter() < deadline:
+            status = get_status(f"http://127.0.0.1:{port}/ready")
+            if status and result["listen"] is None:
+                result["listen"] = time.perf_counter() - started
+            if status == 200:
+                result["ready"] = time.perf_counter() - started
+                break
+            time.sleep(0.02)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return result
+
+
+def summarize(samples: list) -> str:
+    values = [v for v in samples if v is not None]
+    if not values:
+        return "n/a"
+    return f"min {min(values) * 1000:7.1f} ms  median {statistics.median(values) * 1000:7.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure gateway import, app creation and time to ready")
+    parser.add_argument("--config", default=os.path.join(REPO, "configs", "model_configs.yaml"))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--timeout", type=float, default=180.0, help="Give up waiting for /ready after this long")
+    args = parser.parse_args()
+    config_path = os.path.abspath(args.config)
+
+    results = {"import": [], "create": [], "listen": [], "ready": []}
+    for run in range(args.runs):
+        for key, value in {**measure_import(config_path), **measure_serve(config_path, args.port, args.timeout)}.items():
+            results[key].append(value)
+        print(f"run {run + 1}: " + "  ".join(
+            f"{key}={value[-1] * 1000:.0f}ms" if value[-1] is not None else f"{key}=timeout"
+            for key, value in results.items()
+        ), file=sys.stderr)
+
+    for key, samples in results.items():
+        print(f"{key:<7} {summarize(samples)}")
+
+
+if __name__ == "__main__":
+    main()
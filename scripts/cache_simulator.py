@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Cache policy what-if simulator.
+
+Replays request logs recorded by the gateway (caching.request_log) through
+candidate cache configurations and reports, per configuration, the hit
+ratio, byte hit ratio and the generation time the hits would have saved.
+
+Usage:
+    python scripts/cache_simulator.py /app/data/cache_requests.log [more logs] \\
+        [--policy lru lfu tinylfu arc ttl] [--max-bytes 256M 1G 4G | --max-entries 10000 100000] \\
+        [--ttl 1800 3600] [--semantic-threshold 0.93 0.97] [--compression-ratio 4] \\
+        [--warmup 0.1] [--json]
+
+Policies:
+    lru      least recently used
+    lfu      least frequently used (in-cache counts)
+    tinylfu  the gateway's TinyLFU admission filter (caching.admission) in front of LRU
+    arc      adaptive replacement cache (recency/frequency split tuned by ghost hits)
+    ttl      unbounded, entries only expire; the upper bound for a ttl
+
+Every entry expires ttl seconds after it is written (0: never); pass the
+ttl plus stale_while_revalidate to match what the gateway serves. Sizes are
+response JSON bytes; capacities in bytes are compared against size /
+compression-ratio, the stored size (see the cache_compression_ratio
+metric). A hit saves the generation seconds recorded for that key; with
+continuous batching a request does not own the GPU, so this is an upper
+bound on GPU-seconds. With a semantic threshold, an exact miss whose
+nearest semantic neighbour (as seen live) scored at or above it counts as
+a semantic hit; only requests the live semantic tier looked up carry a
+similarity. Sample pools are not modelled: a sampled request counts as a
+hit as soon as its key is cached. The first --warmup fraction of events
+fills the cache without being counted.
+"""
+import argparse
+import heapq
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from api_gateway.admission import TinyLfuAdmission  # noqa: E402
+from api_gateway.request_log import MAGIC, OUTCOMES, RECORD_FIELDS  # noqa: E402
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper().rstrip("B").rstrip("I")
+    unit = text[-1] if text and text[-1] in SIZE_UNITS else ""
+    return int(float(text[:len(text) - len(unit)]) * SIZE_UNITS[unit])
+
+
+def load_events(paths: List[str]) -> np.ndarray:
+    dtype = np.dtype(RECORD_FIELDS)
+    parts = []
+    for path in paths:
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise SystemExit(f"{path}: not a gateway request log")
+        raw = np.fromfile(path, dtype=np.uint8, offset=len(MAGIC))
+        # A crash can leave a torn last record
+        parts.append(raw[:len(raw) // dtype.itemsize * dtype.itemsize].view(dtype))
+    events = np.concatenate(parts) if parts else np.zeros(0, dtype)
+    return events[np.argsort(events["timestamp"], kind="stable")]
+
+
+def fill_per_key(keys: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Replace unknown (0) values with the key's previous known one, else its next, else the overall median"""
+    n = len(values)
+    order = np.argsort(keys, kind="stable")
+    grouped = values[order].astype(np.float64)
+    known = grouped > 0
+    index = np.arange(n)
+    group_start = np.r_[True, keys[order][1:] != keys[order][:-1]] if n else np.zeros(0, bool)
+    start = np.maximum.accumulate(np.where(group_start, index, 0))
+    previous = np.maximum.accumulate(np.where(known, index, -1))
+    filled = np.where(previous >= start, grouped[np.maximum(previous, 0)], 0.0)
+    # Backward pass for leading unknowns (keys first seen as cache hits)
+    group_end = np.r_[group_start[1:], True] if n else np.zeros(0, bool)
+    end = np.minimum.accumulate(np.where(group_end, index, n)[::-1])[::-1]
+    following = np.minimum.accumulate(np.where(known, index, n)[::-1])[::-1]
+    filled = np.where((filled == 0) & (following <= end), grouped[np.minimum(following, n - 1)], filled)
+    filled[filled == 0] = np.median(grouped[known]) if known.any() else 0.0
+    result = np.empty(n)
+    result[order] = filled
+    return result
+
+
+class Trace:
+    """Events as dense key ids and per-event size, cost and similarity"""
+
+    def __init__(self, events: np.ndarray):
+        _, keys = np.unique(events["key"], return_inverse=True)
+        self.times = events["timestamp"]
+        self.keys = keys
+        self.sizes = fill_per_key(keys, events["size"])
+        self.costs = fill_per_key(keys, events["cost"])
+        self.similarity = events["similarity"]
+        self.outcomes = events["outcome"]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class Lru:
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self.used = 0.0
+
+    def lookup(self, key: int, now: float) -> bool:
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        if entry[1] <= now:
+            del self.entries[key]
+            self.used -= entry[0]
+            return False
+        self.entries.move_to_end(key)
+        return True
+
+    def insert(self, key: int, size: float, expires: float):
+        if size > self.capacity:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.used -= old[0]
+        self.entries[key] = (size, expires)
+        self.used += size
+        while self.used > self.capacity:
+            _, (victim_size, _) = self.entries.popitem(last=False)
+            self.used -= victim_size
+
+
+class TinyLfu(Lru):
+    def __init__(self, capacity: float, admission_config: Optional[Dict[str, Any]] = None):
+        super().__init__(capacity)
+        self.admission = TinyLfuAdmission(admission_config)
+
+    def lookup(self, key: int, now: float) -> bool:
+        self.admission.record(str(key))
+        return super().lookup(key, now)
+
+    def insert(self, key: int, size: float, expires: float):
+        if self.admission.admit(str(key)):
+            super().insert(key, size, expires)
+
+
+class Lfu:
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.entries: Dict[int, list] = {}
+        self.heap: List[tuple] = []
+        self.sequence = itertools.count()
+        self.used = 0.0
+
+    def _remove(self, key: int):
+        self.used -= self.entries.pop(key)[1]
+
+    def lookup(self, key: int, now: float) -> bool:
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        if entry[2] <= now:
+            self._remove(key)
+            return False
+        entry[0] += 1
+        heapq.heappush(self.heap, (entry[0], next(self.sequence), key))
+        return True
+
+    def insert(self, key: int, size: float, expires: float):
+        if size > self.capacity:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = [1, size, expires]
+        heapq.heappush(self.heap, (1, next(self.sequence), key))
+        self.used += size
+        own = []
+        while self.used > self.capacity and self.heap:
+            item = heapq.heappop(self.heap)
+            count, _, victim = item
+            # The entry being inserted is never its own victim: its heap entries go back.
+            # Heap entries left behind by later accesses are skipped.
+            if victim == key:
+                own.append(item)
+            elif victim in self.entries and self.entries[victim][0] == count:
+                self._remove(victim)
+        for item in own:
+            heapq.heappush(self.heap, item)
+        if len(self.heap) > 4 * len(self.entries) + 1024:
+            self.heap = [(entry[0], next(self.sequence), k) for k, entry in self.entries.items()]
+            heapq.heapify(self.heap)
+
+
+class Arc:
+    """ARC with sizes: T1/T2 hold entries seen once/more, B1/B2 remember what each evicted"""
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.t1: "OrderedDict[int, tuple]" = OrderedDict()
+        self.t2: "OrderedDict[int, tuple]" = OrderedDict()
+        self.b1: "OrderedDict[int, float]" = OrderedDict()
+        self.b2: "OrderedDict[int, float]" = OrderedDict()
+        self.t1_used = self.t2_used = self.b1_used = self.b2_used = 0.0
+        self.target = 0.0
+
+    def lookup(self, key: int, now: float) -> bool:
+        for recent in (True, False):
+            entries = self.t1 if recent else self.t2
+            entry = entries.get(key)
+            if entry is None:
+                continue
+            del entries[key]
+            if recent:
+                self.t1_used -= entry[0]
+            else:
+                self.t2_used -= entry[0]
+            if entry[1] <= now:
+                return False
+            self.t2[key] = entry
+            self.t2_used += entry[0]
+            return True
+        return False
+
+    def _replace(self, in_b2: bool):
+        if self.t1 and (self.t1_used > self.target or (in_b2 and self.t1_used >= self.target) or not self.t2):
+            victim, (size, _) = self.t1.popitem(last=False)
+            self.t1_used -= size
+            self.b1[victim] = size
+            self.b1_used += size
+        else:
+            victim, (size, _) = self.t2.popitem(last=False)
+            self.t2_used -= size
+            self.b2[victim] = size
+            self.b2_used += size
+
+    def insert(self, key: int, size: float, expires: float):
+        if size > self.capacity:
+            return
+        in_b2 = False
+        if key in self.b1:
+            self.target = min(self.capacity, self.target + size * max(1.0, self.b2_used / max(self.b1_used, 1)))
+            self.b1_used -= self.b1.pop(key)
+            frequent = True
+        elif key in self.b2:
+            self.target = max(0.0, self.target - size * max(1.0, self.b1_used / max(self.b2_used, 1)))
+            self.b2_used -= self.b2.pop(key)
+            frequent = in_b2 = True
+        else:
+            frequent = False
+        while self.t1_used + self.t2_used + size > self.capacity and (self.t1 or self.t2):
+            self._replace(in_b2)
+        if frequent:
+            self.t2[key] = (size, expires)
+            self.t2_used += size
+        else:
+            self.t1[key] = (size, expires)
+            self.t1_used += size
+        while self.b1 and self.t1_used + self.b1_used > self.capacity:
+            self.b1_used -= self.b1.popitem(last=False)[1]
+        while self.b2 and self.t1_used + self.t2_used + self.b1_used + self.b2_used > 2 * self.capacity:
+            self.b2_used -= self.b2.popitem(last=False)[1]
+
+
+class TtlOnly:
+    def __init__(self, capacity: float):
+        self.expiry: Dict[int, float] = {}
+
+    def lookup(self, key: int, now: float) -> bool:
+        return self.expiry.get(key, 0.0) > now
+
+    def insert(self, key: int, size: float, expires: float):
+        self.expiry[key] = expires
+
+
+POLICIES = {"lru": Lru, "lfu": Lfu, "tinylfu": TinyLfu, "arc": Arc, "ttl": TtlOnly}
+
+
+def simulate(trace: Trace, policy, ttl: float, threshold: Optional[float], charges: List[float],
+             warmup: int) -> Dict[str, Any]:
+    times, keys = trace.times.tolist(), trace.keys.tolist()
+    sizes, costs = trace.sizes.tolist(), trace.costs.tolist()
+    similarity = trace.similarity.tolist()
+    lifetime = ttl if ttl > 0 else math.inf
+    semantic = threshold if threshold is not None else math.inf
+    hits = semantic_hits = 0
+    hit_bytes = total_bytes = saved = 0.0
+    for i in range(len(keys)):
+        counted = i >= warmup
+        if counted:
+            total_bytes += sizes[i]
+        key, now = keys[i], times[i]
+        if policy.lookup(key, now):
+            if counted:
+                hits += 1
+                hit_bytes += sizes[i]
+                saved += costs[i]
+            continue
+        # NaN (not looked up live) never reaches the threshold
+        if similarity[i] >= semantic:
+            if counted:
+                semantic_hits += 1
+                hit_bytes += sizes[i]
+                saved += costs[i]
+            continue
+        policy.insert(key, charges[i], now + lifetime)
+    requests = len(keys) - warmup
+    return {
+        "requests": requests,
+        "hit_ratio": (hits + semantic_hits) / max(requests, 1),
+        "semantic_hit_ratio": semantic_hits / max(requests, 1),
+        "byte_hit_ratio": hit_bytes / max(total_bytes, 1),
+        "gpu_seconds_saved": saved,
+    }
+
+
+def live_summary(trace: Trace, warmup: int) -> Dict[str, Any]:
+    outcomes = trace.outcomes[warmup:]
+    sizes = trace.sizes[warmup:]
+    served = outcomes != OUTCOMES.index("miss")
+    return {
+        "requests": len(outcomes),
+        "hit_ratio": float(served.mean()) if len(outcomes) else 0.0,
+        "semantic_hit_ratio": float((outcomes == OUTCOMES.index("semantic")).mean()) if len(outcomes) else 0.0,
+        "byte_hit_ratio": float(sizes[served].sum() / max(sizes.sum(), 1)),
+        "gpu_seconds_saved": float(trace.costs[warmup:][served].sum()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay gateway request logs through candidate cache policies")
+    parser.add_argument("logs", nargs="+", help="Request logs written by caching.request_log")
+    parser.add_argument("--policy", nargs="+", default=["lru", "tinylfu", "arc"], choices=sorted(POLICIES))
+    capacity = parser.add_mutually_exclusive_group()
+    capacity.add_argument("--max-bytes", nargs="+", default=["1G"], help="Stored-size budgets, e.g. 256M 1G")
+    capacity.add_argument("--max-entries", nargs="+", type=int, help="Entry-count budgets instead of bytes")
+    parser.add_argument("--ttl", nargs="+", type=float, default=[3600], help="Entry lifetimes in seconds (0: none)")
+    parser.add_argument("--semantic-threshold", nargs="+", type=float, default=[None])
+    parser.add_argument("--compression-ratio", type=float, default=1.0,
+                        help="JSON bytes per stored byte, to compare sizes with --max-bytes")
+    parser.add_argument("--admission-min-frequency", type=int, default=2, help="TinyLFU min_frequency")
+    parser.add_argument("--admission-width", type=int, default=65536, help="TinyLFU sketch width")
+    parser.add_argument("--warmup", type=float, default=0.0, help="Leading fraction of events not counted")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    trace = Trace(load_events(args.logs))
+    warmup = int(len(trace) * args.warmup)
+    print(f"Loaded {len(trace)} events, {int(trace.keys.max()) + 1 if len(trace) else 0} distinct keys "
+          f"in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    if args.max_entries:
+        capacities = [(str(n), float(n)) for n in args.max_entries]
+        charges = [1.0] * len(trace)
+    else:
+        capacities = [(text, float(parse_size(text))) for text in args.max_bytes]
+        charges = (trace.sizes / args.compression_ratio).tolist()
+    admission = {"min_frequency": args.admission_min_frequency, "width": args.admission_width}
+
+    results = [{"policy": "live", "capacity": None, "ttl": None, "semantic_threshold": None,
+                **live_summary(trace, warmup)}]
+    for name, (label, size), ttl, threshold in itertools.product(
+            args.policy, capacities, args.ttl, args.semantic_threshold):
+        if name == "ttl" and label != capacities[0][0]:
+            continue
+        policy = POLICIES[name](size, admission) if name == "tinylfu" else POLICIES[name](size)
+        started = time.perf_counter()
+        result = simulate(trace, policy, ttl, threshold, charges, warmup)
+        elapsed = time.perf_counter() - started
+        print(f"  {name} {label} ttl={ttl:g}: {len(trace) / max(elapsed, 1e-9) * 60 / 1e6:.1f}M events/min",
+              file=sys.stderr)
+        results.append({"policy": name, "capacity": None if name == "ttl" else label, "ttl": ttl,
+                        "semantic_threshold": threshold, **result})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'policy':<8} {'capacity':>9} {'ttl':>7} {'semantic':>8} {'hit':>7} {'byte hit':>8} {'gpu s saved':>12}")
+    for r in results:
+        ttl = "-" if r["ttl"] is None else f"{r['ttl']:g}"
+        threshold = "-" if r["semantic_threshold"] is None else f"{r['semantic_threshold']:g}"
+        print(f"{r['policy']:<8} {r['capacity'] or '-':>9} {ttl:>7} {threshold:>8} "
+              f"{r['hit_ratio']:>7.2%} {r['byte_hit_ratio']:>8.2%} {r['gpu_seconds_saved']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Offline model placement planner.
+
+Decides which models (and how many replicas) run on which GPU, and how much
+GPU memory each replica gets for KV cache, so that the sustained request rate
+for the expected traffic mix is as high as possible. Emits the matching
+model_configs.yaml overrides and per-replica vLLM launch settings.
+
+Usage:
+    python scripts/plan_placement.py --profile configs/placement_profile.yaml \
+        [--benchmark qwen2p5_3b=vllm_benchmark_20250918_155524.csv ...] \
+        [--output placement.yaml]
+
+Model of a replica:
+    weights + overhead + kv_cache <= gpu memory * max_utilization
+    concurrency = kv_cache / (kv_bytes_per_token * (prompt + completion tokens)),
+                  capped at max_num_seqs
+    tokens/s    = measured throughput curve at that concurrency
+    requests/s  = tokens/s / (completion + prefill_weight * prompt tokens)
+
+Replicas on one GPU time-share its compute, and each model's load is spread
+over its replicas in proportion to their capacity. The sustained rate R is the
+largest total rate at which every GPU stays under 100% busy:
+    R = min over GPUs of 1 / sum(share_m / capacity_m for replicas on the GPU)
+The search is greedy: place one replica of each model, hand out spare memory
+as KV cache in steps that raise R the most, then keep adding the replica that
+raises R the most until nothing fits or helps.
+"""
+import argparse
+import csv
+import json
+import statistics
+import sys
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Tuple
+
+import yaml
+
+GB = 1024 ** 3
+KV_STEP_GB = 0.25
+MIN_IMPROVEMENT = 0.01
+
+
+def kv_bytes_per_token(model: Dict[str, Any]) -> int:
+    if "kv_bytes_per_token" in model:
+        return int(model["kv_bytes_per_token"])
+    return 2 * model["num_layers"] * model["num_kv_heads"] * model["head_dim"] * model.get("dtype_bytes", 2)
+
+
+def weights_gb(model: Dict[str, Any]) -> float:
+    if "weights_gb" in model:
+        return float(model["weights_gb"])
+    return model["params_b"] * 1e9 * model.get("dtype_bytes", 2) / GB
+
+
+def interpolate(curve: Dict[int, float], concurrency: float) -> float:
+    """Piecewise-linear tokens/s at a concurrency, flat past the last measured point"""
+    points = sorted((int(k), float(v)) for k, v in curve.items())
+    if concurrency <= points[0][0]:
+        return points[0][1] * concurrency / points[0][0]
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        if concurrency <= x1:
+            return y0 + (y1 - y0) * (concurrency - x0) / (x1 - x0)
+    return points[-1][1]
+
+
+def load_benchmark(path: str) -> Dict[int, float]:
+    """Median tokens/s per concurrency from a benchmark CSV or JSON list of rows
+
+    Rows need tokens_per_second; `concurrency` defaults to 1 and rows with
+    success == False are ignored (the repo's *_benchmark_*.csv files qualify).
+    """
+    if path.endswith(".json"):
+        with open(path) as f:
+            rows = json.load(f)
+    else:
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+    samples = defaultdict(list)
+    for row in rows:
+        if str(row.get("success", "True")).lower() == "false" or not row.get("tokens_per_second"):
+            continue
+        tps = float(row["tokens_per_second"])
+        if tps > 0:
+            samples[int(float(row.get("concurrency") or 1))].append(tps)
+    if not samples:
+        raise SystemExit(f"No usable throughput rows in {path}")
+    # Aggregate throughput at a concurrency is the per-request speed times the concurrency
+    return {c: statistics.median(v) * c for c, v in samples.items()}
+
+
+class Replica:
+    def __init__(self, model: str, gpu: int, kv_gb: float):
+        self.model = model
+        self.gpu = gpu
+        self.kv_gb = kv_gb
+
+
+class Planner:
+    def __init__(self, profile: Dict[str, Any]):
+        self.gpus: List[Dict[str, Any]] = profile["gpus"]
+        self.models: Dict[str, Dict[str, Any]] = profile["models"]
+        traffic = profile["traffic"]
+        total = sum(t["share"] for t in traffic.values())
+        self.share = {name: t["share"] / total for name, t in traffic.items()}
+        self.traffic = traffic
+        self.max_utilization = float(profile.get("max_utilization", 0.92))
+        self.overhead_gb = float(profile.get("overhead_gb", 1.5))
+
+    def usable_gb(self, gpu: int) -> float:
+        return self.gpus[gpu]["memory_gb"] * self.max_utilization
+
+    def seq_tokens(self, name: str) -> int:
+        t = self.traffic[name]
+        return t["prompt_tokens"] + t["completion_tokens"]
+
+    def min_kv_gb(self, name: str) -> float:
+        """KV cache for one max_model_len sequence or min_concurrency average ones, whichever is larger"""
+        model = self.models[name]
+        tokens = max(model.get("max_model_len", 2048), model.get("min_concurrency", 1) * self.seq_tokens(name))
+        return tokens * kv_bytes_per_token(model) / GB
+
+    def footprint_gb(self, name: str, kv_gb: float) -> float:
+        return weights_gb(self.models[name]) + self.overhead_gb + kv_gb
+
+    def concurrency(self, replica: Replica) -> float:
+        model = self.models[replica.model]
+        seqs = replica.kv_gb * GB / (kv_bytes_per_token(model) * self.seq_tokens(replica.model))
+        return min(seqs, model.get("max_num_seqs", 256))
+
+    def capacity(self, replica: Replica) -> float:
+        """Requests/s the replica sustains with the GPU to itself"""
+        model = self.models[replica.model]
+        t = self.traffic[replica.model]
+        cost = t["completion_tokens"] + model.get("prefill_weight", 0.1) * t["prompt_tokens"]
+        return interpolate(model["throughput"], self.concurrency(replica)) / cost
+
+    def free_gb(self, replicas: List[Replica], gpu: int) -> float:
+        used = sum(self.footprint_gb(r.model, r.kv_gb) for r in replicas if r.gpu == gpu)
+        return self.usable_gb(gpu) - used
+
+    def sustained_rate(self, replicas: List[Replica]) -> float:
+        totals = defaultdict(float)
+        for r in replicas:
+            totals[r.model] += self.capacity(r)
+        if any(totals[name] <= 0 for name in self.share if self.share[name] > 0):
+            return 0.0
+        rate = float("inf")
+        for gpu in range(len(self.gpus)):
+            busy = sum(self.share[r.model] / totals[r.model] for r in replicas if r.gpu == gpu)
+            if busy > 0:
+                rate = min(rate, 1 / busy)
+        return rate
+
+    def fill_kv(self, replicas: List[Replica]) -> float:
+        """Hand spare memory to KV caches in KV_STEP_GB steps, best marginal gain first"""
+        for r in replicas:
+            r.kv_gb = self.min_kv_gb(r.model)
+        rate = self.sustained_rate(replicas)
+        while True:
+            best: Optional[Tuple[float, Replica]] = None
+            for r in replicas:
+                if self.free_gb(replicas, r.gpu) < KV_STEP_GB:
+                    continue
+                r.kv_gb += KV_STEP_GB
+                candidate = self.sustained_rate(replicas)
+                r.kv_gb -= KV_STEP_GB
+                if candidate > rate + 1e-9 and (best is None or candidate > best[0]):
+                    best = (candidate, r)
+            if best is None:
+                break
+            rate = best[0]
+            best[1].kv_gb += KV_STEP_GB
+        # Whatever is left goes to the replicas anyway; more KV never hurts
+        for gpu in range(len(self.gpus)):
+            on_gpu = [r for r in replicas if r.gpu == gpu]
+            spare = self.free_gb(replicas, gpu)
+            for r in on_gpu:
+                r.kv_gb += spare / len(on_gpu)
+        return self.sustained_rate(replicas)
+
+    def fits(self, replicas: List[Replica], name: str, gpu: int) -> bool:
+        return self.free_gb(replicas, gpu) >= self.footprint_gb(name, self.min_kv_gb(name))
+
+    def initial(self) -> Tuple[List[Replica], List[str]]:
+        """One replica per model, largest first, on the GPU with the most free memory"""
+        replicas: List[Replica] = []
+        unplaced = []
+        order = sorted(self.share, key=lambda n: self.footprint_gb(n, self.min_kv_gb(n)), reverse=True)
+        for name in order:
+            for r in replicas:
+                r.kv_gb = self.min_kv_gb(r.model)
+            candidates = [g for g in range(len(self.gpus)) if self.fits(replicas, name, g)]
+            if not candidates:
+                unplaced.append(name)
+                continue
+            gpu = max(candidates, key=lambda g: self.free_gb(replicas, g))
+            replicas.append(Replica(name, gpu, self.min_kv_gb(name)))
+        return replicas, unplaced
+
+    def plan(self) -> Dict[str, Any]:
+        replicas, unplaced = self.initial()
+        rate = self.fill_kv(replicas) if not unplaced else 0.0
+        while not unplaced:
+            best = None
+            for name in self.share:
+                for gpu in range(len(self.gpus)):
+                    trial = [Replica(r.model, r.gpu, self.min_kv_gb(r.model)) for r in replicas]
+                    if any(r.model == name and r.gpu == gpu for r in trial) or not self.fits(trial, name, gpu):
+                        continue
+                    trial.append(Replica(name, gpu, self.min_kv_gb(name)))
+                    candidate = self.fill_kv(trial)
+                    if candidate > rate * (1 + MIN_IMPROVEMENT) and (best is None or candidate > best[0]):
+                        best = (candidate, trial)
+            if best is None:
+                break
+            rate, replicas = best
+        return self.result(replicas, unplaced, rate)
+
+    def result(self, replicas: List[Replica], unplaced: List[str], rate: float) -> Dict[str, Any]:
+        totals = defaultdict(float)
+        for r in replicas:
+            totals[r.model] += self.capacity(r)
+        placed = []
+        for r in sorted(replicas, key=lambda r: (r.gpu, r.model)):
+            gpu = self.gpus[r.gpu]
+            memory = self.footprint_gb(r.model, r.kv_gb)
+            placed.append({
+                "model": r.model,
+                "node": gpu.get("node", "localhost"),
+                "gpu": gpu.get("index", r.gpu),
+                "gpu_memory": round(memory / gpu["memory_gb"], 3),
+                "memory_gb": round(memory, 2),
+                "kv_cache_gb": round(r.kv_gb, 2),
+                "max_num_seqs": int(self.concurrency(r)),
+                "capacity_rps": round(self.capacity(r), 2),
+                "load_rps": round(rate * self.share[r.model] * self.capacity(r) / totals[r.model], 2)
+                if rate and totals[r.model] else 0.0,
+            })
+        gpu_busy = []
+        for index, gpu in enumerate(self.gpus):
+            busy = sum(self.share[r.model] / totals[r.model] for r in replicas if r.gpu == index) * rate
+            gpu_busy.append({"node": gpu.get("node", "localhost"), "gpu": gpu.get("index", index),
+                             "compute_busy": round(busy, 3),
+                             "memory_free_gb": round(self.free_gb(replicas, index), 2)})
+        return {"sustained_rps": round(rate, 2), "replicas": placed, "gpus": gpu_busy, "unplaced": unplaced}
+
+
+def emit_config(plan: Dict[str, Any], profile: Dict[str, Any], base_port: int) -> Dict[str, Any]:
+    """model_configs.yaml overrides plus per-replica launch settings"""
+    models: Dict[str, Any] = {}
+    placement = []
+    # First replicas get ports in profile order so existing model ports stay put
+    order = list(profile["models"])
+    replicas = sorted(plan["replicas"], key=lambda r: (order.index(r["model"]), r["node"], r["gpu"]))
+    firsts = [r for i, r in enumerate(replicas) if i == 0 or replicas[i - 1]["model"] != r["model"]]
+    replicas = firsts + [r for r in replicas if r not in firsts]
+    for port, replica in enumerate(replicas, start=base_port):
+        name = replica["model"]
+        model = profile["models"][name]
+        placement.append({
+            "model": name,
+            "node": replica["node"],
+            "port": port,
+            "env": {"CUDA_VISIBLE_DEVICES": str(replica["gpu"])},
+            "args": ["--max-model-len", str(model.get("max_model_len", 2048)),
+                     "--gpu-memory-utilization", str(replica["gpu_memory"]),
+                     "--max-num-seqs", str(replica["max_num_seqs"])],
+        })
+        # The gateway addresses one endpoint per model; further replicas sit behind a balancer
+        if name not in models:
+            models[name] = {
+                "port": port,
+                "gpu_memory": replica["gpu_memory"],
+                "max_batch_size": replica["max_num_seqs"],
+                "launch_env": {"CUDA_VISIBLE_DEVICES": str(replica["gpu"])},
+            }
+    return {"models": models, "placement": placement}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan model placement across GPUs for maximum sustained request rate")
+    parser.add_argument("--profile", default="configs/placement_profile.yaml")
+    parser.add_argument("--benchmark", action="append", default=[], metavar="MODEL=FILE",
+                        help="Replace a model's throughput curve with measurements from a benchmark file")
+    parser.add_argument("--base-port", type=int, default=8001)
+    parser.add_argument("--output", help="Write the emitted config here (default: stdout)")
+    args = parser.parse_args()
+
+    with open(args.profile) as f:
+        profile = yaml.safe_load(f)
+    for spec in args.benchmark:
+        name, _, path = spec.partition("=")
+        if name not in profile["models"]:
+            raise SystemExit(f"Unknown model in --benchmark: {name}")
+        profile["models"][name]["throughput"] = load_benchmark(path)
+
+    plan = Planner(profile).plan()
+    print(f"Sustained rate: {plan['sustained_rps']} req/s", file=sys.stderr)
+    for r in plan["replicas"]:
+        print(f"  {r['node']}:gpu{r['gpu']}  {r['model']:<12} gpu_memory={r['gpu_memory']:<6} "
+              f"kv={r['kv_cache_gb']}GB seqs={r['max_num_seqs']} capacity={r['capacity_rps']} req/s "
+              f"load={r['load_rps']} req/s", file=sys.stderr)
+    for g in plan["gpus"]:
+        print(f"  {g['node']}:gpu{g['gpu']}  compute busy {g['compute_busy']:.0%}, "
+              f"{g['memory_free_gb']}GB free", file=sys.stderr)
+    if plan["unplaced"]:
+        print(f"  Does not fit anywhere: {', '.join(plan['unplaced'])}", file=sys.stderr)
+
+    emitted = emit_config(plan, profile, args.base_port)
+    emitted["plan"] = plan
+    text = yaml.safe_dump(emitted, sort_keys=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
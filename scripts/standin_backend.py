@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Stand-in model backend for exercising the gateway, lifecycle manager and
+supervisor without a GPU. Speaks just enough of the vLLM OpenAI API:
+/health, /v1/models, /v1/completions and /v1/chat/completions (incl. stream),
+plus /tokenize and /detokenize (one token per word, "tokN" <-> N).
+
+Usage: python scripts/standin_backend.py --port 8001 --startup-delay 3 --tokens-per-second 200
+"""
+import argparse
+import json
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def make_handler(args, started_at):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *fmt_args):
+            if args.verbose:
+                sys.stdout.write("%s - %s\n" % (self.address_string(), fmt % fmt_args))
+                sys.stdout.flush()
+
+        def _json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                if time.time() - started_at < args.startup_delay:
+                    return self._json(503, {"status": "loading"})
+                return self._json(200, {"status": "ok"})
+            if self.path == "/v1/models":
+                return self._json(200, {"object": "list", "data": [{"id": args.model, "object": "model"}]})
+            self._json(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            data = json.loads(self.rfile.read(length) or b"{}")
+            if self.path == "/tokenize":
+                words = (data.get("prompt") or "").split()
+                tokens = [int(w[3:]) if w.startswith("tok") and w[3:].isdigit() else abs(hash(w)) % 100000 for w in words]
+                return self._json(200, {"tokens": tokens, "count": len(tokens), "max_model_len": args.max_model_len})
+            if self.path == "/detokenize":
+                return self._json(200, {"prompt": " ".join(f"tok{t}" for t in data.get("tokens") or [])})
+            chat = self.path == "/v1/chat/completions"
+            if self.path not in ("/v1/completions", "/v1/chat/completions"):
+                return self._json(404, {"error": "not found"})
+            max_tokens = int(data.get("max_tokens") or 16)
+            if max_tokens > args.max_model_len:
+                return self._json(400, {"object": "error", "message": "max_tokens exceeds context length"})
+            n_tokens = min(max_tokens, args.completion_tokens or max_tokens)
+            delay = 1.0 / args.tokens_per_second
+
+            if data.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i in range(n_tokens):
+                    time.sleep(delay)
+                    last = i == n_tokens - 1
+                    finish = ("length" if n_tokens == max_tokens else "stop") if last else None
+                    if chat:
+                        choice = {"index": 0, "delta": {"content": f"tok{i} "}, "finish_reason": finish}
+                    else:
+                        choice = {"index": 0, "text": f"tok{i} ", "finish_reason": finish}
+                    self._chunk(f"data: {json.dumps({'model': args.model, 'choices': [choice]})}\n\n")
+                self._chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+                return
+
+            time.sleep(delay * n_tokens)
+            text = " ".join(f"tok{i}" for i in range(n_tokens))
+            finish = "length" if n_tokens == max_tokens else "stop"
+            if chat:
+                choice = {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": finish}
+            else:
+                choice = {"index": 0, "text": text, "finish_reason": finish}
+            self._json(200, {
+                "id": f"cmpl-standin-{int(time.time() * 1000)}",
+                "object": "chat.completion" if chat else "text_completion",
+                "created": int(time.time()),
+                "model": args.model,
+                "choices": [choice],
+                "usage": {"prompt_tokens": 8, "completion_tokens": n_tokens, "total_tokens": 8 + n_tokens},
+            })
+
+        def _chunk(self, text):
+            payload = text.encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+            self.wfile.flush()
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in OpenAI-compatible model backend")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--model", default="standin")
+    parser.add_argument("--startup-delay", type=float, default=0.0, help="Seconds before /health reports ready")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--completion-tokens", type=int, default=0, help="Fixed completion length (0 = max_tokens)")
+    parser.add_argument("--max-model-len", type=int, default=2048)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    started_at = time.time()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args, started_at))
+    print(f"Stand-in backend '{args.model}' listening on {args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,12 @@
 
 echo "🛑 Stopping vLLM servers..."
 
+# The supervisor stops its backends on SIGTERM
+if pkill -TERM -f "api_gateway.supervisor" 2>/dev/null; then
+    echo "✅ Signalled supervisor"
+    sleep 2
+fi
+
 # Read PIDs from files
 if [ -d "logs" ]; then
     for pidfile in logs/*.pid; do
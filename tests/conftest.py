@@ -0,0 +1,30 @@
+import os
+import sys
+
+# api_gateway is a namespace package run from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def gateway_config(tmp_path):
+    """The shipped config with local state under tmp_path, no Redis and no warmup"""
+    from api_gateway import main
+
+    config = main.load_config(os.path.join(os.path.dirname(__file__), "..", "configs", "model_configs.yaml"))
+    config["caching"]["redis_host"] = None
+    config["batch"]["storage_dir"] = str(tmp_path / "batches")
+    config["prompts"]["storage_path"] = str(tmp_path / "prompts.json")
+    config["warmup"] = {"enabled": False}
+    return config
+
+
+@pytest.fixture
+def gateway(gateway_config):
+    """api_gateway.main initialised from gateway_config"""
+    from api_gateway import main
+
+    main.init_gateway(gateway_config)
+    yield main
+    main.http_client = None
@@ -0,0 +1,71 @@
+from api_gateway.admission import MAX_COUNT, CountMinSketch, Doorkeeper, TinyLfuAdmission
+
+
+def test_sketch_counts_caps_and_halves():
+    sketch = CountMinSketch(width=1000, depth=4)
+    assert sketch.width == 1024
+    for _ in range(3):
+        sketch.increment("a")
+    assert sketch.estimate("a") == 3 and sketch.estimate("b") == 0
+    for _ in range(40):
+        sketch.increment("hot")
+    assert sketch.estimate("hot") == MAX_COUNT
+    sketch.halve()
+    assert sketch.estimate("a") == 1 and sketch.estimate("hot") == MAX_COUNT // 2
+
+
+def test_sketch_never_undercounts():
+    sketch = CountMinSketch(width=16, depth=2)
+    counts = {f"key-{i}": i % 5 for i in range(100)}
+    for key, count in counts.items():
+        for _ in range(count):
+            sketch.increment(key)
+    assert all(sketch.estimate(key) >= count for key, count in counts.items())
+
+
+def test_doorkeeper_reports_repeat_sightings_until_cleared():
+    doorkeeper = Doorkeeper(bits=4096, hashes=3)
+    assert doorkeeper.add("a") is False
+    assert doorkeeper.add("a") is True
+    assert "a" in doorkeeper and "b" not in doorkeeper
+    doorkeeper.clear()
+    assert "a" not in doorkeeper
+
+
+def test_keys_are_admitted_on_their_second_sighting():
+    admission = TinyLfuAdmission({"width": 1024, "min_frequency": 2})
+    events = []
+    admission.on_event = events.append
+    admission.record("once")
+    assert not admission.admit("once")
+    admission.record("twice")
+    admission.record("twice")
+    assert admission.admit("twice")
+    assert events == ["rejected", "admitted"]
+    assert admission.frequency("twice") == 2 and admission.frequency("never") == 0
+
+
+def test_window_reset_ages_counts_and_clears_the_doorkeeper():
+    admission = TinyLfuAdmission({"width": 16, "sample_factor": 2, "min_frequency": 2})
+    assert admission.sample_size == 32
+    for _ in range(5):
+        admission.record("hot")
+    assert admission.frequency("hot") == 5
+    for i in range(27):
+        admission.record(f"cold-{i}")
+    assert admission.resets == 1 and admission.additions == 16
+    assert "hot" not in admission.doorkeeper
+    assert admission.frequency("hot") == 2
+    assert admission.admit("hot")
+
+
+def test_without_a_doorkeeper_the_sketch_counts_first_sightings():
+    admission = TinyLfuAdmission({"doorkeeper": False, "min_frequency": 1})
+    admission.record("a")
+    assert admission.sketch.estimate("a") == 1 and admission.admit("a")
+
+
+def test_disabled_admits_everything():
+    admission = TinyLfuAdmission({"enabled": False})
+    admission.record("a")
+    assert admission.admit("a") and admission.additions == 0
@@ -0,0 +1,56 @@
+import pytest
+
+from api_gateway import backend_health
+from api_gateway.backend_health import BackendHealth
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(backend_health.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_circuit_opens_after_consecutive_failures(clock):
+    health = BackendHealth({"failure_threshold": 3, "open_seconds": 10})
+    health.failure("m")
+    health.failure("m")
+    assert health.check("m") is None
+    health.failure("m")
+    assert health.is_open("m")
+    assert health.check("m") == pytest.approx(10)
+
+
+def test_one_probe_after_the_open_period(clock):
+    health = BackendHealth({"failure_threshold": 1, "open_seconds": 10})
+    health.failure("m")
+    clock[0] += 10
+    assert health.check("m") is None
+    # Everyone else waits for the probe's outcome
+    assert health.check("m") is not None
+    health.success("m")
+    assert not health.is_open("m") and health.check("m") is None
+
+
+def test_failed_probe_doubles_the_open_period_up_to_the_cap(clock):
+    health = BackendHealth({"failure_threshold": 1, "open_seconds": 10, "max_open_seconds": 25})
+    health.failure("m")
+    for expected in (20, 25, 25):
+        clock[0] += 100
+        assert health.check("m") is None
+        health.failure("m")
+        assert health.check("m") == pytest.approx(expected)
+
+
+def test_success_resets_the_failure_count(clock):
+    health = BackendHealth({"failure_threshold": 2})
+    health.failure("m")
+    health.success("m")
+    health.failure("m")
+    assert not health.is_open("m")
+
+
+def test_disabled_never_opens(clock):
+    health = BackendHealth({"enabled": False, "failure_threshold": 1})
+    health.failure("m")
+    assert health.check("m") is None
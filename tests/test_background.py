@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import httpx
+
+from api_gateway.background import GenerationStore, sse_error
+
+
+def chunk(payload) -> bytes:
+    return b"data: " + json.dumps(payload).encode() + b"\n\n"
+
+
+async def consume(store, chunks):
+    generation = store.create("m", "t", "/v1/chat/completions")
+
+    async def stream():
+        for c in chunks:
+            yield c
+
+    store.start(generation, stream())
+    await generation.task
+    return generation
+
+
+def test_stream_ending_normally_completes():
+    async def scenario():
+        generation = await consume(GenerationStore(), [
+            chunk({"choices": [{"delta": {"content": "hi"}}]}), b"data: [DONE]\n\n",
+        ])
+        assert generation.status == "completed"
+
+    asyncio.run(scenario())
+
+
+def test_stream_ending_with_an_error_event_fails():
+    async def scenario():
+        generation = await consume(GenerationStore(), [
+            chunk({"choices": [{"delta": {"content": "partial"}}]}), sse_error("deadline exceeded"),
+        ])
+        assert generation.status == "failed"
+        assert generation.error == "deadline exceeded"
+
+    asyncio.run(scenario())
+
+
+def test_forward_stream_reports_a_timeout(gateway):
+    async def slow_body():
+        yield chunk({"choices": [{"delta": {"content": "a"}}]})
+        await asyncio.sleep(5)
+        yield b"data: [DONE]\n\n"
+
+    async def scenario():
+        gateway.http_client = httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, content=slow_body()))
+        )
+        chunks = [c async for c in gateway.forward_stream("m", "http://backend", "/v1/chat/completions", {}, 0.2)]
+        assert b"event: error" in chunks[-1]
+
+        store = GenerationStore()
+        generation = store.create("m", "t", "/v1/chat/completions")
+        store.start(generation, gateway.forward_stream("m", "http://backend", "/v1/chat/completions", {}, 0.2))
+        await generation.task
+        assert generation.status == "failed"
+        await gateway.http_client.aclose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api_gateway import main
+from api_gateway.batch import BatchError, BatchRunner
+
+
+def jsonl(*items):
+    return "".join(json.dumps(item) + "\n" for item in items).encode()
+
+
+def line(custom_id, **body):
+    return {"custom_id": custom_id, "url": "/v1/completions", "body": {"prompt": custom_id, **body}}
+
+
+def build_runner(tmp_path, dispatch, **settings):
+    runner = BatchRunner({"storage_dir": str(tmp_path), "checkpoint_every": 2, **settings}, dispatch, lambda: 0)
+    runner.store.open()
+    return runner
+
+
+def read_lines(runner, file_id):
+    with open(runner.store.file_path(file_id)) as f:
+        return [json.loads(text) for text in f]
+
+
+async def echo(path, body):
+    if body.get("bad"):
+        return 400, {"error": {"message": "bad request"}}
+    return 200, {"text": body["prompt"]}
+
+
+def test_batch_writes_results_and_errors(tmp_path):
+    async def scenario():
+        runner = build_runner(tmp_path, echo)
+        upload = runner.store.create_file(jsonl(line("a"), line("b", bad=True), line("c")), "in.jsonl", "batch")
+        batch = await runner.create_batch(upload["id"], "/v1/completions")
+        await runner.tasks[batch["id"]]
+        return runner, runner.store.get_batch(batch["id"])
+
+    runner, batch = asyncio.run(scenario())
+    assert batch["status"] == "completed" and batch["completed_at"]
+    assert batch["request_counts"] == {"total": 3, "completed": 2, "failed": 1}
+    assert {r["custom_id"] for r in read_lines(runner, batch["output_file_id"])} == {"a", "c"}
+    assert [r["custom_id"] for r in read_lines(runner, batch["error_file_id"])] == ["b"]
+
+
+@pytest.mark.parametrize("content, message", [
+    (b"not json\n", "not valid JSON"),
+    (jsonl(line("a"), line("a")), "duplicate custom_id"),
+    (jsonl({"custom_id": "a", "url": "/v1/embeddings", "body": {}}), "targets"),
+    (b"", "empty"),
+])
+def test_invalid_input_is_rejected_up_front(tmp_path, content, message):
+    async def scenario():
+        runner = build_runner(tmp_path, echo)
+        upload = runner.store.create_file(content, "in.jsonl", "batch")
+        with pytest.raises(BatchError, match=message):
+            await runner.create_batch(upload["id"], "/v1/completions")
+        assert runner.store.list_batches() == []
+
+    asyncio.run(scenario())
+
+
+def test_restarted_batch_skips_lines_already_written(tmp_path):
+    seen = []
+
+    async def dispatch(path, body):
+        seen.append(body["prompt"])
+        return 200, {}
+
+    async def scenario():
+        runner = build_runner(tmp_path, dispatch)
+        upload = runner.store.create_file(jsonl(line("a"), line("b"), line("c")), "in.jsonl", "batch")
+        batch = runner._new_batch(upload["id"], "/v1/completions", "24h", None)
+        # A previous run got through "a" and was killed halfway through writing "b"
+        with open(runner.store.file_path(batch["output_file_id"]), "w") as f:
+            f.write(json.dumps({"custom_id": "a"}) + "\n" + '{"custom_id": "b", "resp')
+        restarted = build_runner(tmp_path, dispatch)
+        assert await restarted.resume() == 1
+        await asyncio.gather(*restarted.tasks.values())
+        return restarted.store.get_batch(batch["id"])
+
+    batch = asyncio.run(scenario())
+    assert seen == ["b", "c"]
+    assert batch["status"] == "completed" and batch["request_counts"]["completed"] == 3
+
+
+def test_cancelled_batch_stops_dispatching(tmp_path):
+    async def dispatch(path, body):
+        await asyncio.sleep(0.01)
+        return 200, {}
+
+    async def scenario():
+        runner = build_runner(tmp_path, dispatch, concurrency=1)
+        upload = runner.store.create_file(jsonl(*(line(str(i)) for i in range(50))), "in.jsonl", "batch")
+        batch = await runner.create_batch(upload["id"], "/v1/completions")
+        await asyncio.sleep(0.05)
+        assert (await runner.cancel_batch(batch["id"]))["status"] == "cancelling"
+        await runner.tasks[batch["id"]]
+        return runner.store.get_batch(batch["id"])
+
+    batch = asyncio.run(scenario())
+    assert batch["status"] == "cancelled" and batch["request_counts"]["completed"] < 50
+
+
+def test_batch_that_cannot_run_ends_failed(tmp_path):
+    async def scenario():
+        runner = build_runner(tmp_path, echo)
+        upload = runner.store.create_file(jsonl(line("a")), "in.jsonl", "batch")
+        batch = runner._new_batch(upload["id"], "/v1/completions", "24h", None)
+        # The input file vanished between validation and the run
+        (tmp_path / "files" / f"{upload['id']}.jsonl").unlink()
+        runner.start(batch)
+        await runner.tasks[batch["id"]]
+        return runner.store.get_batch(batch["id"])
+
+    batch = asyncio.run(scenario())
+    assert batch["status"] == "failed" and batch["failed_at"]
+    assert batch["errors"]["data"][0]["code"] == "batch_failed"
+
+
+def test_oversized_upload_is_refused(gateway_config):
+    gateway_config["batch"]["max_file_bytes"] = 100
+    with TestClient(main.create_app(gateway_config)) as client:
+        accepted = client.post("/v1/files", content=jsonl(line("a")), headers={"X-Filename": "in.jsonl"})
+        assert accepted.status_code == 200 and accepted.json()["bytes"] > 0
+        refused = client.post("/v1/files", content=b"x" * 200_000)
+        assert refused.status_code == 413
+
+        def chunks():
+            for _ in range(4):
+                yield b"x" * 60
+
+        assert client.post("/v1/files", content=chunks()).status_code == 413
+        created = client.post("/v1/batches", json={"input_file_id": accepted.json()["id"],
+                                                   "endpoint": "/v1/completions"})
+        assert created.status_code == 200
+        assert client.get(f"/v1/batches/{created.json()['id']}").json()["input_file_id"] == accepted.json()["id"]
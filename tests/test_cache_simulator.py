@@ -0,0 +1,115 @@
+import importlib.util
+import math
+import os
+
+import numpy as np
+import pytest
+
+from api_gateway.request_log import RequestLog
+
+spec = importlib.util.spec_from_file_location(
+    "cache_simulator", os.path.join(os.path.dirname(__file__), "..", "scripts", "cache_simulator.py")
+)
+cache_simulator = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(cache_simulator)
+
+FOREVER = math.inf
+
+
+def run(policy, keys, size=1.0):
+    """Hits for a sequence of keys, inserting every miss"""
+    hits = []
+    for now, key in enumerate(keys):
+        hit = policy.lookup(key, float(now))
+        if not hit:
+            policy.insert(key, size, FOREVER)
+        hits.append(hit)
+    return hits
+
+
+def test_parse_size():
+    assert cache_simulator.parse_size("100K") == 102400
+    assert cache_simulator.parse_size("1.5GiB") == int(1.5 * 1024 ** 3)
+    assert cache_simulator.parse_size("512") == 512
+
+
+def test_lru_evicts_the_least_recently_used():
+    lru = cache_simulator.Lru(2)
+    assert run(lru, [1, 2, 1, 3, 1, 2]) == [False, False, True, False, True, False]
+    assert lru.used == 2
+
+
+def test_lfu_evicts_the_least_frequently_used():
+    lfu = cache_simulator.Lfu(2)
+    assert run(lfu, [1, 1, 2, 3, 1, 3]) == [False, True, False, False, True, True]
+    assert set(lfu.entries) == {1, 3}
+
+
+def test_lfu_does_not_lose_the_entry_it_inserts():
+    lfu = cache_simulator.Lfu(1.0)
+    lfu.insert(1, 0.6, FOREVER)
+    lfu.lookup(1, 0.0)
+    lfu.insert(2, 0.6, FOREVER)
+    lfu.insert(3, 0.6, FOREVER)
+    assert list(lfu.entries) == [3] and lfu.used == pytest.approx(0.6)
+
+
+def test_lfu_survives_a_uniform_trace():
+    lfu = cache_simulator.Lfu(100)
+    keys = np.random.default_rng(0).integers(0, 1000, 20000).tolist()
+    run(lfu, keys, size=7.0)
+    assert lfu.used <= 100 and len(lfu.entries) == 14
+
+
+def test_tinylfu_admits_on_the_second_request():
+    tinylfu = cache_simulator.TinyLfu(2, {"min_frequency": 2})
+    assert run(tinylfu, [1, 1, 1]) == [False, False, True]
+
+
+def test_arc_keeps_frequent_entries_through_a_scan():
+    arc = cache_simulator.Arc(3)
+    run(arc, [1, 1, 2, 2])
+    run(arc, [10, 11, 12, 13])
+    assert arc.lookup(1, 100.0) or arc.lookup(2, 100.0)
+    assert arc.t1_used + arc.t2_used <= 3
+
+
+def test_ttl_only_expires_entries():
+    ttl = cache_simulator.TtlOnly(0)
+    ttl.insert(1, 1e12, 10.0)
+    assert ttl.lookup(1, 9.0) and not ttl.lookup(1, 10.0)
+
+
+@pytest.mark.parametrize("name", sorted(cache_simulator.POLICIES))
+def test_every_policy_replays_a_trace_within_capacity(name):
+    policy = cache_simulator.POLICIES[name](50.0)
+    keys = np.random.default_rng(1).zipf(1.3, 5000) % 200
+    trace = cache_simulator.Trace(np.array(
+        [(float(i), int(key), 0, 0, 10, 0.5, np.nan) for i, key in enumerate(keys)],
+        dtype=np.dtype(cache_simulator.RECORD_FIELDS),
+    ))
+    result = cache_simulator.simulate(trace, policy, ttl=0, threshold=None, charges=[10.0] * len(trace), warmup=500)
+    assert result["requests"] == 4500
+    assert 0 < result["hit_ratio"] < 1
+    assert result["gpu_seconds_saved"] == pytest.approx(result["hit_ratio"] * 4500 * 0.5)
+    used = policy.t1_used + policy.t2_used if name == "arc" else getattr(policy, "used", 0)
+    assert used <= 50
+
+
+def test_logged_requests_replay_through_the_simulator(tmp_path):
+    path = tmp_path / "requests.log"
+    log = RequestLog({"enabled": True, "path": str(path)})
+    for key in ["a", "b", "a", "a", "b"]:
+        log.record("/v1/completions", key, "miss", size=100, cost=1.0)
+    log.flush()
+    # A torn last record is ignored
+    with open(path, "ab") as f:
+        f.write(b"\x00" * 7)
+
+    trace = cache_simulator.Trace(cache_simulator.load_events([str(path)]))
+    assert len(trace) == 5 and len(set(trace.keys[[0, 2, 3]])) == 1 and trace.keys[1] == trace.keys[4]
+    result = cache_simulator.simulate(
+        trace, cache_simulator.Lru(1000), ttl=0, threshold=None, charges=trace.sizes.tolist(), warmup=0
+    )
+    assert result["hit_ratio"] == pytest.approx(3 / 5) and result["gpu_seconds_saved"] == pytest.approx(3.0)
+    assert cache_simulator.live_summary(trace, 0)["hit_ratio"] == 0.0
@@ -0,0 +1,134 @@
+import pytest
+
+from api_gateway import cache_store
+from api_gateway.cache_store import (
+    BYTES_KEY, EXPIRY_KEY, INDEX_KEY, SIZES_KEY, HashRing, RedisStore, ShardedRedisStore, TieredStore,
+)
+
+
+@pytest.fixture
+def client():
+    return pytest.importorskip("fakeredis").FakeRedis()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """The time the store passes to its scripts"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(cache_store.time, "time", lambda: now[0])
+    return now
+
+
+def bookkeeping(client):
+    return {
+        "bytes": int(client.get(BYTES_KEY) or 0),
+        "sizes": {k.decode(): int(v) for k, v in client.hgetall(SIZES_KEY).items()},
+        "index": {k.decode() for k in client.zrange(INDEX_KEY, 0, -1)},
+        "expiry": {k.decode() for k in client.zrange(EXPIRY_KEY, 0, -1)},
+    }
+
+
+def test_entries_expire_by_their_own_ttl(client, clock):
+    store = RedisStore(client, max_bytes=10_000)
+    store.put("long", b"x" * 100, 3600)
+    clock[0] += 10
+    # A short-lived write must not take longer-lived entries with it
+    store.put("short", b"y" * 100, 1)
+    assert store.get("long") is not None
+    clock[0] += 5
+    store.put("other", b"z" * 100, 60)
+    state = bookkeeping(client)
+    assert "short" not in state["sizes"] and "long" in state["sizes"]
+    assert state["bytes"] == 200 == store.stored_bytes
+
+
+def test_entries_redis_dropped_on_its_own_release_their_bytes(client, clock):
+    store = RedisStore(client, max_bytes=10_000)
+    store.put("a", b"x" * 100, 60)
+    store.put("b", b"y" * 50, 60)
+    client.delete("a")  # expired or evicted by Redis itself
+    assert store.get_many(["a", "b"]) == {"b": (b"y" * 50, pytest.approx(60, abs=1))}
+    state = bookkeeping(client)
+    assert state == {"bytes": 50, "sizes": {"b": 50}, "index": {"b"}, "expiry": {"b"}}
+    assert store.stored_bytes == 50
+
+
+def test_delete_releases_bytes(client, clock):
+    store = RedisStore(client, max_bytes=10_000)
+    store.put("a", b"x" * 100, 60)
+    store.delete("a")
+    assert bookkeeping(client) == {"bytes": 0, "sizes": {}, "index": set(), "expiry": set()}
+
+
+def test_overwrite_counts_the_new_size_only(client, clock):
+    store = RedisStore(client, max_bytes=10_000)
+    store.put("a", b"x" * 100, 60)
+    store.put("a", b"x" * 30, 60)
+    assert bookkeeping(client)["bytes"] == 30
+
+
+def test_budget_evicts_least_recently_used(client, clock):
+    store = RedisStore(client, max_bytes=250)
+    for key in ("a", "b"):
+        store.put(key, b"x" * 100, 60)
+        clock[0] += 1
+    store.get("a")  # b is now the least recently used
+    clock[0] += 1
+    assert store.put("c", b"x" * 100, 60) == 1
+    assert set(store.get_many(["a", "b", "c"])) == {"a", "c"}
+    assert store.stored_bytes == 200
+
+
+def test_ring_spreads_keys_by_weight_and_moves_few_on_a_new_node():
+    keys = [f"key-{i}" for i in range(4000)]
+    ring = HashRing({"a": 1.0, "b": 1.0, "c": 2.0}, 160)
+    owners = {key: next(ring.nodes(key)) for key in keys}
+    share = {name: list(owners.values()).count(name) / len(keys) for name in "abc"}
+    assert share["c"] == pytest.approx(0.5, abs=0.08)
+    assert share["a"] == pytest.approx(0.25, abs=0.08)
+
+    grown = HashRing({"a": 1.0, "b": 1.0, "c": 2.0, "d": 1.0}, 160)
+    moved = [key for key in keys if next(grown.nodes(key)) != owners[key]]
+    # Only keys taken over by the new node move
+    assert all(next(grown.nodes(key)) == "d" for key in moved)
+    assert len(moved) / len(keys) == pytest.approx(0.2, abs=0.08)
+
+
+def test_ring_lists_every_node_once_for_failover():
+    ring = HashRing({"a": 1.0, "b": 1.0, "c": 1.0}, 16)
+    assert sorted(ring.nodes("anything")) == ["a", "b", "c"]
+
+
+class BrokenClient:
+    """A Redis client whose node is unreachable"""
+
+    def register_script(self, script):
+        return self.fail
+
+    def fail(self, *args, **kwargs):
+        raise ConnectionError("node down")
+
+    def __getattr__(self, name):
+        return self.fail
+
+
+def test_sharded_store_moves_a_failed_nodes_keys_along_the_ring(client):
+    fakeredis = pytest.importorskip("fakeredis")
+    store = ShardedRedisStore({"a": BrokenClient(), "b": fakeredis.FakeRedis(), "c": fakeredis.FakeRedis()})
+    keys = [f"key-{i}" for i in range(50)]
+    for key in keys:
+        store.put(key, key.encode(), 60)
+    assert not store.up("a") and store.up("b")
+    found = store.get_many(keys)
+    assert {key: value for key, (value, _) in found.items()} == {key: key.encode() for key in keys}
+
+
+def test_tiered_store_falls_through_a_failed_tier_and_promotes_hits(client):
+    errors = []
+    top = ShardedRedisStore({"a": BrokenClient()})
+    bottom = RedisStore(client)
+    store = TieredStore([top, bottom])
+    store.on_error = lambda tier, e: errors.append(tier)
+    bottom.put("k", b"v", 60)
+    assert store.get("k")[0] == b"v"
+    assert errors == ["redis", "redis"]
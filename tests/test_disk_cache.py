@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+from api_gateway.disk_cache import DiskStore
+
+
+def test_put_get_and_byte_accounting(tmp_path):
+    store = DiskStore({"path": str(tmp_path / "cache.db"), "max_bytes": 100, "touch_interval": 0})
+    store.put("a", b"x" * 40, 60)
+    store.put("b", b"y" * 40, 60)
+    assert store.get("a")[0] == b"x" * 40
+    store.put("c", b"z" * 40, 60)
+    assert store.stored_bytes <= 100
+    assert store.get("b") is None
+    store.delete("a")
+    assert store.get("a") is None and store.stored_bytes == 40
+    store.close()
+
+
+def test_cache_calls_run_off_the_event_loop_without_a_disk_tier(gateway):
+    # Redis-only setups block on network round trips just the same
+    assert gateway.disk_store is None
+
+    async def scenario():
+        return await gateway.cache_io(threading.get_ident)
+
+    assert asyncio.run(scenario()) != threading.get_ident()
+
+
+def test_disk_tier_calls_run_off_the_event_loop(gateway, gateway_config, tmp_path):
+    gateway.config["caching"]["disk"] = {"enabled": True, "path": str(tmp_path / "cache.db")}
+    policy = {"ttl": 60, "stale_while_revalidate": 0}
+
+    async def scenario():
+        await gateway.connect_cache()
+        assert gateway.disk_store is not None
+        assert await gateway.cache_io(threading.get_ident) != threading.get_ident()
+        await gateway.cache_io(gateway.response_cache.set, "k", {"text": "hi"}, policy)
+        assert (await gateway.cache_io(gateway.response_cache.get, "k")).value == {"text": "hi"}
+        assert await gateway.cache_io(gateway.response_cache.get, "missing") is None
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        gateway.disk_store.close()
+        gateway.disk_store = None
+        gateway.response_cache = None
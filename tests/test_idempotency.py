@@ -0,0 +1,154 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from api_gateway.cache import CacheBackendError, FallbackCache, LocalCache
+from api_gateway.idempotency import IdempotencyStore
+
+
+class DownCache:
+    """A backend whose every call fails, like an unreachable Redis"""
+
+    def __init__(self, fail=("get", "set", "add", "delete")):
+        self.fail = fail
+        self.local = LocalCache()
+
+    def __getattr__(self, name):
+        async def call(*args):
+            if name in self.fail:
+                raise CacheBackendError("down")
+            return await getattr(self.local, name)(*args)
+        return call
+
+
+def counting_handler(result=None, delay=0.0):
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return result or {"id": len(calls)}
+    return handler, calls
+
+
+def test_retry_is_replayed():
+    async def scenario():
+        store = IdempotencyStore({}, LocalCache())
+        handler, calls = counting_handler()
+        first = await store.run("k", {"a": 1}, handler)
+        replay = await store.run("k", {"a": 1}, handler)
+        assert first == {"id": 1}
+        assert json.loads(replay.body) == {"id": 1}
+        assert replay.headers["Idempotent-Replayed"] == "true"
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_retries_attach_to_the_running_request():
+    async def scenario():
+        store = IdempotencyStore({}, LocalCache())
+        handler, calls = counting_handler(delay=0.05)
+        results = await asyncio.gather(*(store.run("k", {"a": 1}, handler) for _ in range(3)))
+        assert len(calls) == 1
+        assert results[0] == {"id": 1}
+        assert all(json.loads(r.body) == {"id": 1} for r in results[1:])
+
+    asyncio.run(scenario())
+
+
+def test_reused_key_with_another_body_is_rejected():
+    async def scenario():
+        store = IdempotencyStore({}, LocalCache())
+        handler, _ = counting_handler()
+        await store.run("k", {"a": 1}, handler)
+        with pytest.raises(HTTPException) as e:
+            await store.run("k", {"a": 2}, handler)
+        assert e.value.status_code == 422
+
+    asyncio.run(scenario())
+
+
+def test_other_instance_still_running_is_a_conflict():
+    async def scenario():
+        shared = LocalCache()
+        config = {"remote_wait_seconds": 0.05, "remote_poll_interval": 0.01}
+        a, b = IdempotencyStore(config, shared), IdempotencyStore(config, shared)
+        slow, _ = counting_handler(delay=0.3)
+        running = asyncio.create_task(a.run("k", {"a": 1}, slow))
+        await asyncio.sleep(0.01)
+        handler, calls = counting_handler()
+        with pytest.raises(HTTPException) as e:
+            await b.run("k", {"a": 1}, handler)
+        assert e.value.status_code == 409 and not calls
+        await running
+        replay = await b.run("k", {"a": 1}, handler)
+        assert json.loads(replay.body) == {"id": 1} and not calls
+
+    asyncio.run(scenario())
+
+
+def test_failed_request_releases_the_key():
+    async def scenario():
+        store = IdempotencyStore({}, LocalCache())
+
+        async def failing():
+            raise HTTPException(status_code=502)
+        with pytest.raises(HTTPException):
+            await store.run("k", {"a": 1}, failing)
+        handler, calls = counting_handler()
+        assert await store.run("k", {"a": 1}, handler) == {"id": 1}
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("fail", [("get", "set", "add", "delete"), ("add",), ("set",)])
+def test_unreachable_backend_lets_requests_through(fail):
+    async def scenario():
+        events = []
+        store = IdempotencyStore({}, DownCache(fail))
+        store.on_event = events.append
+        handler, calls = counting_handler()
+        assert await store.run("k", {"a": 1}, handler) == {"id": 1}
+        assert len(calls) == 1
+        assert "unavailable" in events
+
+    asyncio.run(scenario())
+
+
+
+def test_fallback_keeps_deduplicating_locally_while_redis_is_down():
+    async def scenario():
+        primary = DownCache()
+        store = IdempotencyStore({}, FallbackCache(primary, LocalCache(), retry_interval=60))
+        handler, calls = counting_handler()
+        await store.run("k", {"a": 1}, handler)
+        replay = await store.run("k", {"a": 1}, handler)
+        assert replay.headers["Idempotent-Replayed"] == "true"
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
+
+
+def test_fallback_retries_the_primary_after_the_interval():
+    async def scenario():
+        primary = DownCache(fail=("get",))
+        cache = FallbackCache(primary, LocalCache(), retry_interval=0)
+        assert await cache.get("k") is None
+        await cache.set("k", "v", 60)
+        assert await primary.local.get("k") == "v"
+
+    asyncio.run(scenario())
+
+
+def test_unreachable_redis_raises_cache_backend_error():
+    from api_gateway.cache import RedisCache
+
+    async def scenario():
+        cache = RedisCache("127.0.0.1", 1, socket_timeout=0.2, socket_connect_timeout=0.2)
+        with pytest.raises(CacheBackendError):
+            await cache.get("k")
+
+    asyncio.run(scenario())
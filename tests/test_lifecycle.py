@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from api_gateway.lifecycle import LifecycleError, ModelLifecycleManager
+
+MODELS = {"a": {"port": 9001, "gpu_memory": 0.5}, "b": {"port": 9002, "gpu_memory": 0.5}}
+
+
+class FakeProcess:
+    """Stands in for BackendProcess: becomes healthy when `healthy` is set"""
+
+    def __init__(self):
+        self.running = False
+        self.starts = 0
+        self.stops = 0
+        self.healthy = asyncio.Event()
+        self.fail = False
+        self.pid = None
+
+    async def start(self):
+        self.starts += 1
+        self.running = True
+
+    async def wait_ready(self, timeout, poll_interval=1.0):
+        if self.fail:
+            raise RuntimeError("health probe crashed")
+        try:
+            await asyncio.wait_for(self.healthy.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def stop(self, timeout=30.0):
+        self.stops += 1
+        await asyncio.sleep(0)
+        self.running = False
+
+
+def manager(**settings):
+    lifecycle = ModelLifecycleManager({"enabled": True, "startup_timeout": 5, **settings}, MODELS)
+    for model in lifecycle.models.values():
+        model.process = FakeProcess()
+    return lifecycle
+
+
+def test_concurrent_requests_share_one_cold_start():
+    async def scenario():
+        lifecycle = manager()
+        process = lifecycle.models["a"].process
+        leases = [asyncio.create_task(lifecycle.lease("a")) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        process.healthy.set()
+        for lease in await asyncio.gather(*leases):
+            lease.release()
+        assert process.starts == 1
+        assert lifecycle.models["a"].state == "ready" and lifecycle.models["a"].inflight == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_requester_does_not_abort_a_shared_start():
+    async def scenario():
+        lifecycle = manager()
+        process = lifecycle.models["a"].process
+        first = asyncio.create_task(lifecycle.lease("a"))
+        second = asyncio.create_task(lifecycle.lease("a"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        assert lifecycle.models["a"].state == "starting" and process.running
+        process.healthy.set()
+        (await second).release()
+        assert lifecycle.models["a"].state == "ready" and process.stops == 0
+
+    asyncio.run(scenario())
+
+
+def test_failed_start_stops_the_process():
+    async def scenario():
+        lifecycle = manager(startup_timeout=0.05)
+        process = lifecycle.models["a"].process
+        with pytest.raises(LifecycleError):
+            await lifecycle.lease("a")
+        assert not process.running and process.stops == 1
+        assert lifecycle.models["a"].state == "stopped" and lifecycle.reserved_memory() == 0
+
+    asyncio.run(scenario())
+
+
+def test_start_that_raises_stops_the_process():
+    async def scenario():
+        lifecycle = manager()
+        process = lifecycle.models["a"].process
+        process.fail = True
+        with pytest.raises(RuntimeError):
+            await lifecycle.lease("a")
+        assert not process.running and lifecycle.models["a"].state == "stopped"
+
+    asyncio.run(scenario())
+
+
+def test_shutdown_during_a_start_stops_the_process():
+    async def scenario():
+        lifecycle = manager()
+        process = lifecycle.models["a"].process
+        waiting = asyncio.create_task(lifecycle.lease("a"))
+        await asyncio.sleep(0.01)
+        await lifecycle.shutdown()
+        with pytest.raises(LifecycleError):
+            await waiting
+        assert not process.running and lifecycle.models["a"].state == "stopped"
+
+    asyncio.run(scenario())
+
+
+def test_idle_model_is_evicted_to_fit_the_budget():
+    async def scenario():
+        lifecycle = manager(gpu_memory_budget=0.6)
+        for model in lifecycle.models.values():
+            model.process.healthy.set()
+        (await lifecycle.lease("a")).release()
+        (await lifecycle.lease("b")).release()
+        assert lifecycle.models["a"].state == "stopped" and lifecycle.models["b"].state == "ready"
+
+    asyncio.run(scenario())
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from api_gateway.cache import CacheBackendError, FallbackCache, LocalCache
+from api_gateway.negative_cache import NegativeCache
+
+
+class DownCache:
+    """A backend whose every call fails, counting the attempts"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __getattr__(self, name):
+        async def call(*args):
+            self.calls += 1
+            raise CacheBackendError("down")
+        return call
+
+
+def test_rejection_is_remembered_for_the_same_request():
+    async def scenario():
+        cache = NegativeCache({}, LocalCache())
+        key = cache.key("/v1/completions", {"model": "m", "prompt": "x" * 10})
+        await cache.remember(key, HTTPException(status_code=413, detail="too long"))
+        rejection = await cache.lookup(key)
+        assert rejection.status_code == 413 and rejection.headers["X-Cache"] == "negative"
+        other = cache.key("/v1/completions", {"model": "m", "prompt": "y"})
+        assert await cache.lookup(other) is None
+
+    asyncio.run(scenario())
+
+
+def test_transient_errors_are_not_remembered():
+    async def scenario():
+        cache = NegativeCache({}, LocalCache())
+        await cache.remember("k", HTTPException(status_code=503, detail="busy"))
+        assert await cache.lookup("k") is None
+
+    asyncio.run(scenario())
+
+
+def test_unreachable_backend_is_a_miss_and_a_no_op():
+    async def scenario():
+        cache = NegativeCache({}, DownCache())
+        await cache.remember("k", HTTPException(status_code=400, detail="bad"))
+        assert await cache.lookup("k") is None
+
+    asyncio.run(scenario())
+
+
+def test_fallback_serves_locally_and_skips_the_primary_while_down():
+    async def scenario():
+        primary = DownCache()
+        cache = NegativeCache({}, FallbackCache(primary, LocalCache(), retry_interval=60))
+        await cache.remember("k", HTTPException(status_code=400, detail="bad"))
+        rejection = await cache.lookup("k")
+        assert rejection is not None and rejection.status_code == 400
+        assert primary.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_fallback_retries_the_primary_after_the_interval():
+    async def scenario():
+        primary = DownCache()
+        cache = FallbackCache(primary, LocalCache(), retry_interval=0)
+        await cache.set("k", "v", 60)
+        assert await cache.get("k") == "v"
+        assert primary.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_unreachable_redis_falls_back_to_local_entries():
+    pytest.importorskip("redis")
+    from api_gateway.cache import RedisCache
+
+    async def scenario():
+        redis = RedisCache("127.0.0.1", 1, socket_timeout=0.5, socket_connect_timeout=0.5)
+        cache = NegativeCache({}, FallbackCache(redis, LocalCache()))
+        await cache.remember("k", HTTPException(status_code=404, detail="no model"))
+        assert (await cache.lookup("k")).status_code == 404
+
+    asyncio.run(asyncio.wait_for(scenario(), 15))
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from api_gateway.predictor import CompletionLengthPredictor, prompt_fingerprint
+
+
+def test_fingerprint_accepts_every_prompt_shape():
+    shapes = [
+        {"prompt": "Translate: hello"},
+        {"prompt": ["Translate: hello", "Translate: bye"]},
+        {"prompt": [1, 2, 3]},
+        {"prompt": [[1, 2, 3], [4, 5]]},
+        {"messages": [{"role": "system", "content": "Be brief"}], "response_format": {"type": "json_object"}},
+        {"messages": [{"role": "user", "content": "hi"}], "response_format": "json_object"},
+    ]
+    for data in shapes:
+        assert len(prompt_fingerprint(data)) == 16
+
+
+def test_fingerprint_ignores_numbers_and_user_text():
+    a = {"messages": [{"role": "system", "content": "Order 12"}, {"role": "user", "content": "a"}]}
+    b = {"messages": [{"role": "system", "content": "Order 99"}, {"role": "user", "content": "b"}]}
+    assert prompt_fingerprint(a) == prompt_fingerprint(b)
+
+
+def test_token_id_prompts_can_be_predicted_and_observed():
+    predictor = CompletionLengthPredictor({"min_samples": 1})
+    data = {"prompt": [101, 2023, 2003], "max_tokens": 64}
+    predictor.observe("m", "t", "/v1/completions", data, 20)
+    prediction = predictor.predict("m", "t", "/v1/completions", data, 64)
+    assert prediction.samples >= 1
+
+
+def test_prediction_never_exceeds_max_tokens():
+    predictor = CompletionLengthPredictor({"min_samples": 1})
+    data = {"prompt": "Summarize: 12", "max_tokens": 64}
+    for _ in range(5):
+        predictor.observe("m", "t", "/v1/completions", data, 500)
+    assert predictor.predict("m", "t", "/v1/completions", data, 64).typical == 64
+    unseen = predictor.predict("other", "t", "/v1/completions", data, 256)
+    assert unseen.typical == 256 and unseen.key_level == "max_tokens"
+
+
+def test_upstream_deadline_allows_for_max_tokens_not_the_predicted_tail(gateway):
+    model = next(iter(gateway.MODEL_ENDPOINTS))
+    data = {"model": model, "prompt": "Summarize: 12", "max_tokens": 2000}
+    for _ in range(50):
+        gateway.length_predictor.observe(model, "anonymous", "/v1/completions", data, 10)
+    tenant = gateway.tenant_resolver.resolve({})
+
+    async def scenario():
+        generation = await gateway._admit_generation(data, "/v1/completions", tenant, {}, model, None)
+        generation.release()
+        return generation
+
+    generation = asyncio.run(scenario())
+    assert generation.prediction.typical < 20
+    assert generation.timeout == pytest.approx(gateway.timeout_policy.compute(model, data), rel=0.01)
+    assert generation.timeout > gateway.timeout_policy.compute(model, data, expected_tokens=10)
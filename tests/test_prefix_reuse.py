@@ -0,0 +1,101 @@
+import asyncio
+
+from api_gateway.prefix_reuse import PrefixReuse
+
+
+class WordTokenizer:
+    """One token per space-separated word"""
+
+    async def tokenize(self, model, endpoint, text):
+        return [len(word) for word in text.split(" ")]
+
+    async def detokenize(self, model, endpoint, tokens):
+        return " ".join("x" * token for token in tokens)
+
+
+def make_reuse(**settings):
+    reuse = PrefixReuse(settings, {}, lambda: None)
+    reuse.tokenizer = WordTokenizer()
+    return reuse
+
+
+def completion(text, completion_tokens, finish_reason):
+    return {
+        "choices": [{"index": 0, "text": text, "finish_reason": finish_reason}],
+        "usage": {"prompt_tokens": 3, "completion_tokens": completion_tokens, "total_tokens": 3 + completion_tokens},
+    }
+
+
+def index(reuse, response, data=None):
+    data = data or {"model": "m", "prompt": "p", "temperature": 0}
+    return asyncio.run(reuse.index_entry(data, "http://backend", response))
+
+
+def test_only_deterministic_single_choice_requests_are_eligible():
+    reuse = make_reuse()
+    assert reuse.eligible({"model": "m", "temperature": 0})
+    assert reuse.eligible({"model": "m", "temperature": 0.8, "seed": 7})
+    assert not reuse.eligible({"model": "m"})
+    assert not reuse.eligible({"model": "m", "temperature": 0, "logprobs": 1})
+    assert not reuse.eligible({"model": "m", "temperature": 0, "n": 2})
+    assert not reuse.eligible({"model": "m", "temperature": 0, "stream": True})
+
+
+def test_key_ignores_length_limits():
+    data = {"model": "m", "prompt": "p", "temperature": 0}
+    assert PrefixReuse.key({**data, "max_tokens": 5}) == PrefixReuse.key({**data, "max_completion_tokens": 50})
+    assert PrefixReuse.key(data) != PrefixReuse.key({**data, "prompt": "q"})
+
+
+def test_mismatched_tokenization_is_not_indexed():
+    reuse = make_reuse()
+    assert index(reuse, completion("aa bbb c", 3, "length"))["tokens"] == [2, 3, 1]
+    # An end-of-sequence token may be counted for a natural stop, not for a cut
+    assert index(reuse, completion("aa bbb c", 4, "stop")) is not None
+    assert index(reuse, completion("aa bbb c", 4, "length")) is None
+    assert index(reuse, completion("aa bbb c", 3, "tool_calls")) is None
+
+
+def test_shorter_request_is_cut_at_the_token_boundary():
+    reuse = make_reuse()
+    entry = index(reuse, completion("aa bbb c", 3, "length"))
+    data = {"model": "m", "prompt": "p", "temperature": 0, "max_tokens": 2}
+    served = asyncio.run(reuse.serve(entry, data, "/v1/completions", "http://backend"))
+    assert served["choices"][0]["text"] == "xx xxx"
+    assert served["choices"][0]["finish_reason"] == "length"
+    assert served["usage"] == {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5}
+    assert entry["response"]["choices"][0]["text"] == "aa bbb c"
+    assert asyncio.run(reuse.serve(entry, {**data, "max_tokens": 4}, "/v1/completions", "http://backend")) is None
+
+
+def test_natural_stop_answers_any_larger_limit_whole():
+    reuse = make_reuse()
+    entry = index(reuse, completion("aa bbb c", 3, "stop"))
+    data = {"model": "m", "prompt": "p", "temperature": 0, "max_tokens": 100}
+    assert asyncio.run(reuse.serve(entry, data, "/v1/completions", "http://backend")) == entry["response"]
+    assert not reuse.covers(entry, {**data, "max_tokens": 0}, "/v1/completions")
+
+
+def test_request_without_max_tokens_gets_the_endpoint_default():
+    reuse = make_reuse()
+    text = " ".join(["a"] * 20)
+    stopped = index(reuse, completion(text, 20, "stop"))
+    data = {"model": "m", "prompt": "p", "temperature": 0}
+    # Legacy completions stop at 16 tokens when max_tokens is left out
+    served = asyncio.run(reuse.serve(stopped, data, "/v1/completions", "http://backend"))
+    assert served["usage"]["completion_tokens"] == 16 and served["choices"][0]["finish_reason"] == "length"
+    cut = index(reuse, completion(text, 20, "length"))
+    assert reuse.covers(cut, data, "/v1/completions")
+    # Chat runs to the end of the context: only a natural stop answers it
+    assert reuse.covers(stopped, data, "/v1/chat/completions")
+    assert not reuse.covers(cut, data, "/v1/chat/completions")
+
+
+def test_longer_or_stopped_completion_replaces_the_index():
+    reuse = make_reuse()
+    short = index(reuse, completion("a b", 2, "length"))
+    long = index(reuse, completion("a b c", 3, "length"))
+    stopped = index(reuse, completion("a", 1, "stop"))
+    assert PrefixReuse.longer(short, None)
+    assert PrefixReuse.longer(long, short) and not PrefixReuse.longer(short, long)
+    assert PrefixReuse.longer(stopped, long) and not PrefixReuse.longer(long, stopped)
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import time
+
+from api_gateway.prewarm import BandwidthLimiter, Prewarmer, prioritize, weight_files
+
+KIB = 1024
+
+
+def write(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    return str(path)
+
+
+def test_weight_files_are_filtered_and_largest_first(tmp_path):
+    small = write(tmp_path / "m" / "model-2.safetensors", 10 * KIB)
+    large = write(tmp_path / "m" / "model-1.safetensors", 30 * KIB)
+    config = write(tmp_path / "m" / "config.json", 1 * KIB)
+    write(tmp_path / "m" / "README.md", 50 * KIB)
+    assert weight_files(str(tmp_path / "m"), "", ["*.safetensors", "*.json"]) == [large, small, config]
+
+
+def test_hub_snapshots_are_resolved_and_deduplicated(tmp_path):
+    blob = write(tmp_path / "models--Org--Name" / "blobs" / "abc", 4 * KIB)
+    for revision in ("r1", "r2"):
+        link = tmp_path / "models--Org--Name" / "snapshots" / revision / "model.safetensors"
+        os.makedirs(link.parent)
+        os.symlink(blob, link)
+    assert weight_files("Org/Name", str(tmp_path), ["*.safetensors"]) == [os.path.realpath(blob)]
+
+
+def test_models_are_read_in_request_frequency_order(tmp_path):
+    models = {}
+    for name in ("a", "b", "c"):
+        write(tmp_path / name / "w.safetensors", 16 * KIB)
+        models[name] = {"name": str(tmp_path / name)}
+    prewarmer = Prewarmer({"parallel_files": 1, "max_bytes": 10**9}, models)
+    finished = []
+    prewarmer.on_model = lambda name, nbytes, seconds: finished.append((name, nbytes))
+
+    report = asyncio.run(prewarmer.prewarm(["a", "b", "c"], {"c": 10, "b": 5}))
+    assert finished == [("c", 16 * KIB), ("b", 16 * KIB), ("a", 16 * KIB)]
+    assert all(entry["status"] == "done" for entry in report.values())
+    assert prioritize(["a", "b", "c"], {}) == ["a", "b", "c"]
+
+
+def test_models_past_the_byte_budget_are_skipped(tmp_path):
+    models = {name: {"name": str(tmp_path / name)} for name in ("big", "small", "missing")}
+    write(tmp_path / "big" / "w.safetensors", 64 * KIB)
+    write(tmp_path / "small" / "w.safetensors", 16 * KIB)
+    prewarmer = Prewarmer({"max_bytes": 70 * KIB}, models)
+    report = asyncio.run(prewarmer.prewarm(["big", "small", "missing"]))
+    assert report["big"]["status"] == "done" and report["big"]["bytes"] == 64 * KIB
+    assert report["small"]["status"] == "skipped_budget"
+    assert report["missing"]["status"] == "no_files"
+
+
+def test_reads_respect_the_bandwidth_limit(tmp_path):
+    write(tmp_path / "m" / "w.safetensors", 256 * KIB)
+    # 1 MiB/s in 32 KiB chunks: the 8 chunks need at least 7/32 s
+    prewarmer = Prewarmer({"max_bandwidth_mb": 1, "chunk_size_mb": 1 / 32, "max_bytes": 10**9},
+                          {"m": {"name": str(tmp_path / "m")}})
+    started = time.monotonic()
+    report = asyncio.run(prewarmer.prewarm(["m"]))
+    assert report["m"]["bytes"] == 256 * KIB
+    assert time.monotonic() - started >= 7 / 32 - 0.02
+
+
+def test_limiter_spaces_out_consumers():
+    async def scenario():
+        limiter = BandwidthLimiter(1000.0)
+        started = time.monotonic()
+        await asyncio.gather(*(limiter.consume(50) for _ in range(3)))
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.09
+    unlimited = BandwidthLimiter(0)
+    assert asyncio.run(unlimited.consume(10**9)) is None
@@ -0,0 +1,41 @@
+import pytest
+
+from api_gateway.prompt_registry import PromptError, PromptRegistry
+
+
+def build_registry(storage_path="unused.json"):
+    return PromptRegistry({"storage_path": storage_path, "registry": {"tone": "Be terse. ", "agent": {
+        "messages": [{"role": "system", "content": "You are an agent."}]
+    }}})
+
+
+def test_completion_reference_is_prepended_to_every_text_prompt():
+    registry = build_registry()
+    pinned = registry.pin({"prompt_ref": "tone", "prompt": ["a", "b"]}, {})
+    assert pinned["prompt_ref"] == "tone@1"
+    assert registry.expand(pinned)["prompt"] == ["Be terse. a", "Be terse. b"]
+    assert registry.expand({"prompt_ref": "tone@1", "prompt": "c"})["prompt"] == "Be terse. c"
+
+
+@pytest.mark.parametrize("prompt", [[1, 2, 3], [[1, 2], [3, 4]], 7])
+def test_token_id_prompts_cannot_take_a_reference(prompt):
+    with pytest.raises(PromptError) as raised:
+        build_registry().expand({"prompt_ref": "tone@1", "prompt": prompt})
+    assert raised.value.status_code == 400
+
+
+def test_chat_reference_expands_in_place():
+    registry = build_registry()
+    data = {"messages": [{"prompt_ref": "agent@1"}, {"role": "user", "content": "hi"}]}
+    assert registry.expand(data)["messages"] == [
+        {"role": "system", "content": "You are an agent."}, {"role": "user", "content": "hi"}
+    ]
+    with pytest.raises(PromptError):
+        registry.expand({"prompt_ref": "agent@1", "prompt": "x"})
+
+
+def test_new_version_is_picked_up_and_old_pins_keep_working(tmp_path):
+    registry = build_registry(str(tmp_path / "prompts.json"))
+    assert registry.register("tone", {"content": "Be kind. "}) == 2
+    assert registry.pin({"prompt_ref": "tone", "prompt": "x"}, {})["prompt_ref"] == "tone@2"
+    assert registry.expand({"prompt_ref": "tone@1", "prompt": "x"})["prompt"] == "Be terse. x"
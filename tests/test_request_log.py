@@ -0,0 +1,50 @@
+import math
+
+import numpy as np
+
+from api_gateway.request_log import MAGIC, OUTCOMES, PATHS, RECORD, RECORD_FIELDS, RequestLog, key_hash
+
+
+def read(path):
+    raw = path.read_bytes()
+    assert raw[:len(MAGIC)] == MAGIC
+    return np.frombuffer(raw[len(MAGIC):], dtype=np.dtype(RECORD_FIELDS))
+
+
+def test_record_layout_matches_the_simulator_dtype():
+    assert RECORD.size == np.dtype(RECORD_FIELDS).itemsize == 30
+
+
+def test_records_round_trip(tmp_path):
+    path = tmp_path / "logs" / "requests.log"
+    log = RequestLog({"enabled": True, "path": str(path), "buffer_events": 2, "flush_interval": 3600})
+    log.record("/v1/completions", "ns:a", "miss", size=120, cost=0.5, similarity=0.9)
+    assert not path.exists()
+    log.record("/v1/chat/completions", "ns:a", "hit", cost=0.5)
+    log.record("/v1/embeddings", "ns:b", "semantic", similarity=0.97)
+    log.flush()
+
+    events = read(path)
+    assert len(events) == 3 and log.stats()["events"] == 3
+    assert events["key"].tolist() == [key_hash("ns:a"), key_hash("ns:a"), key_hash("ns:b")]
+    assert events["path"].tolist() == [PATHS.index("/v1/completions"), PATHS.index("/v1/chat/completions"), 255]
+    assert [OUTCOMES[o] for o in events["outcome"]] == ["miss", "hit", "semantic"]
+    assert events["size"].tolist() == [120, 0, 0]
+    assert math.isclose(events["similarity"][0], 0.9, rel_tol=1e-6) and math.isnan(events["similarity"][1])
+
+
+def test_appends_keep_a_single_header(tmp_path):
+    path = tmp_path / "requests.log"
+    for run in range(2):
+        log = RequestLog({"enabled": True, "path": str(path)})
+        log.record("/v1/completions", f"k{run}", "miss")
+        log.flush()
+    assert path.read_bytes().count(MAGIC) == 1
+    assert len(read(path)) == 2
+
+
+def test_disabled_log_writes_nothing(tmp_path):
+    log = RequestLog({"path": str(tmp_path / "requests.log"), "buffer_events": 1})
+    log.record("/v1/completions", "k", "miss")
+    log.flush()
+    assert not (tmp_path / "requests.log").exists() and log.events == 0
@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+from api_gateway import response_cache
+from api_gateway.codec import CacheCodec
+from api_gateway.response_cache import CachedResponse, ResponseCache, freshness_policy
+
+
+class MemoryStore:
+    """The byte-store interface, in a dict"""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def get_many(self, keys):
+        return {key: self.values[key] for key in keys if key in self.values}
+
+    def put(self, key, value, ttl):
+        self.values[key] = (value, ttl)
+        return 0
+
+    def add(self, key, value, ttl):
+        if key in self.values:
+            return False
+        self.values[key] = (value, ttl)
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+    def get_meta(self, name):
+        return None
+
+    def set_meta(self, name, value):
+        pass
+
+
+def test_endpoint_policy_overrides_shared_settings():
+    caching = {"ttl": 600, "stale_while_revalidate": 60, "endpoints": {"/v1/embeddings": {"ttl": 86400}}}
+    assert freshness_policy(caching, "/v1/embeddings")["ttl"] == 86400
+    assert freshness_policy(caching, "/v1/embeddings")["stale_while_revalidate"] == 60
+    assert freshness_policy(caching, "/v1/completions")["ttl"] == 600
+
+
+def test_entry_is_fresh_then_stale_after_its_ttl():
+    entry = CachedResponse({"a": 1}, stored_at=1000.0, ttl=60, delta=0.0)
+    assert entry.freshness(1.0, now=1059.0) == "fresh"
+    assert entry.freshness(1.0, now=1060.0) == "stale"
+
+
+def test_xfetch_refreshes_costly_entries_early_near_expiry(monkeypatch):
+    entry = CachedResponse({"a": 1}, stored_at=1000.0, ttl=60, delta=2.0)
+    # -ln(1 - 0.9) * 2s is about 4.6s ahead of expiry
+    monkeypatch.setattr(response_cache.random, "random", lambda: 0.9)
+    assert entry.freshness(1.0, now=1056.0) == "early"
+    assert entry.freshness(1.0, now=1050.0) == "fresh"
+    assert entry.freshness(0.0, now=1059.0) == "fresh"
+
+
+def test_stored_entries_keep_their_stale_window():
+    store = MemoryStore()
+    cache = ResponseCache(store, CacheCodec({"compression": "none"}))
+    cache.set("k", {"text": "hi"}, {"ttl": 60, "stale_while_revalidate": 30}, delta=1.5)
+    assert store.values["k"][1] == 90
+    entry = cache.get("k")
+    assert entry.value == {"text": "hi"} and entry.ttl == 60 and entry.delta == 1.5
+
+
+def test_one_refresh_per_key():
+    cache = ResponseCache(MemoryStore(), CacheCodec({"compression": "none"}))
+    assert cache.claim_refresh("k", 10)
+    assert not cache.claim_refresh("k", 10)
+    cache.release_refresh("k")
+    assert cache.claim_refresh("k", 10)
+
+
+def test_undecodable_entry_is_dropped():
+    store = MemoryStore()
+    store.put("k", b"\xffgarbage", 60)
+    cache = ResponseCache(store, CacheCodec({"compression": "none"}))
+    assert cache.get("k") is None
+    assert "k" not in store.values
+
+
+def test_concurrent_writers_train_one_dictionary():
+    codec = CacheCodec({"compression": "zlib", "min_size": 0, "train_samples": 40})
+    cache = ResponseCache(MemoryStore(), codec)
+    published = []
+    codec.on_dictionary = lambda ident, data: published.append(ident)
+    policy = {"ttl": 60, "stale_while_revalidate": 0}
+
+    def write(worker):
+        for n in range(20):
+            cache.set(f"{worker}:{n}", {"text": f"answer {worker} {n} " * 8}, policy)
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(published) == 1 and codec.dictionary_id == published[0]
+    assert cache.get("3:19").value == {"text": "answer 3 19 " * 8}
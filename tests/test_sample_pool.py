@@ -0,0 +1,64 @@
+from api_gateway.sample_pool import SamplePools
+
+from test_response_cache import MemoryStore
+
+
+def test_only_unseeded_sampling_requests_are_pooled():
+    pools = SamplePools({"pool_size": 3})
+    assert pools.pooled({"temperature": 0.7})
+    assert pools.pooled({})
+    assert not pools.pooled({"temperature": 0})
+    assert not pools.pooled({"temperature": 0.7, "seed": 1})
+    assert not SamplePools({"pool_size": 1}).pooled({"temperature": 0.7})
+    assert not SamplePools({"default_temperature": 0}).pooled({})
+
+
+def test_pool_fills_before_it_is_served():
+    pools = SamplePools({"pool_size": 3})
+    data = {"temperature": 1.0}
+    samples = None
+    for n in range(3):
+        assert pools.serve("k", data, None, samples) is None
+        samples = pools.add(samples, f"s{n}")
+    assert pools.serve("k", data, None, samples) in samples
+    # Deterministic requests keep their single cached response
+    assert pools.serve("k", {"temperature": 0}, "single", None) == "single"
+
+
+def test_rotation_cycles_through_every_sample():
+    pools = SamplePools({"pool_size": 3})
+    samples = ["a", "b", "c"]
+    served = [pools.pick("k", samples) for _ in range(6)]
+    assert sorted(served[:3]) == samples
+    assert served[3:] == served[:3]
+
+
+def test_rotation_keys_are_bounded():
+    pools = SamplePools({"pool_size": 2, "max_rotation_keys": 2})
+    for key in ("a", "b", "c"):
+        pools.pick(key, ["x", "y"])
+    assert list(pools.rotation) == ["b", "c"]
+
+
+def test_full_pool_replaces_its_oldest_sample():
+    pools = SamplePools({"pool_size": 2})
+    assert pools.add(None, "a") == ["a"]
+    assert pools.add(["a", "b"], "c") == ["b", "c"]
+
+
+def test_refresh_adds_a_sample_to_the_cached_pool(gateway):
+    from api_gateway.codec import CacheCodec
+    from api_gateway.response_cache import ResponseCache
+
+    cache = ResponseCache(MemoryStore(), CacheCodec({"compression": "none"}))
+    policy = {"ttl": 60, "stale_while_revalidate": 30}
+    data = {"model": "m", "prompt": "hi", "temperature": 1.0}
+    for n in range(gateway.sample_pools.pool_size + 1):
+        gateway.store_cached_response(cache, "k", data, {"n": n}, policy, 0.5)
+    entry = cache.get("k")
+    size = gateway.sample_pools.pool_size
+    assert entry.value is None
+    assert entry.samples == [{"n": n} for n in range(1, size + 1)]
+
+    gateway.store_cached_response(cache, "g", {**data, "temperature": 0}, {"n": 0}, policy, 0.5)
+    assert cache.get("g").value == {"n": 0} and cache.get("g").samples is None
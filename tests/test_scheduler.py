@@ -0,0 +1,167 @@
+import asyncio
+import time
+
+import pytest
+
+from api_gateway.scheduler import (
+    BackendQueue, DeficitRoundRobinQueue, FifoQueue, LoadShedError, ShortestJobFirstQueue, Waiter,
+    make_waiting_queue,
+)
+
+
+def waiters(*specs):
+    """Waiters from (expected_seconds, tenant, cost_tokens, weight) tuples; needs a running loop"""
+    return [Waiter(spec[0], time.monotonic() + 60, *spec[1:]) for spec in specs]
+
+
+def drain(queue):
+    order = []
+    while len(queue):
+        order.append(queue.pop())
+    return order
+
+
+def test_fifo_serves_in_arrival_order():
+    async def scenario():
+        queue = FifoQueue()
+        items = waiters((5,), (1,), (3,))
+        for waiter in items:
+            queue.push(waiter)
+        assert drain(queue) == items
+
+    asyncio.run(scenario())
+
+
+def test_sejf_serves_shortest_first_and_ages_long_waiters():
+    async def scenario():
+        queue = ShortestJobFirstQueue(aging_factor=1.0)
+        long_old, short, medium = waiters((10,), (1,), (3,))
+        long_old.enqueued_at -= 20
+        for waiter in (short, medium, long_old):
+            queue.push(waiter)
+        # 10s expected, but waiting 20s longer than the others puts it first
+        assert drain(queue) == [long_old, short, medium]
+
+        fresh_long, fresh_short = waiters((10,), (1,))
+        queue.push(fresh_long)
+        queue.push(fresh_short)
+        assert queue.ahead_of(2, time.monotonic()) == 1
+        assert drain(queue) == [fresh_short, fresh_long]
+
+    asyncio.run(scenario())
+
+
+def test_drr_interleaves_a_light_tenant_with_a_heavy_one():
+    async def scenario():
+        queue = make_waiting_queue("fifo", {}, {"enabled": True, "quantum_tokens": 1000})
+        assert isinstance(queue, DeficitRoundRobinQueue)
+        for waiter in waiters(*[(1, "heavy", 1000)] * 6 + [(1, "light", 1000)] * 2):
+            queue.push(waiter)
+        order = [w.tenant for w in drain(queue)]
+        assert order[:4] == ["heavy", "light", "heavy", "light"]
+
+    asyncio.run(scenario())
+
+
+def test_drr_shares_tokens_by_weight():
+    async def scenario():
+        queue = DeficitRoundRobinQueue(FifoQueue, quantum_tokens=100)
+        for waiter in waiters(*[(1, "gold", 100, 2.0)] * 20 + [(1, "free", 100, 1.0)] * 20):
+            queue.push(waiter)
+        served = [queue.pop().tenant for _ in range(15)]
+        assert served.count("gold") == 10 and served.count("free") == 5
+
+    asyncio.run(scenario())
+
+
+def test_drr_holds_state_only_for_queued_tenants():
+    async def scenario():
+        queue = DeficitRoundRobinQueue(FifoQueue)
+        first, second, third = waiters((1, "a", 10, 3.0), (1, "b", 10, 2.0), (1, "b", 10, 2.0))
+        for waiter in (first, second, third):
+            queue.push(waiter)
+        assert queue.weights == {"a": 3.0, "b": 2.0}
+        queue.remove(first)
+        assert "a" not in queue.weights and "a" not in queue.queues
+        drain(queue)
+        assert queue.weights == {} and queue.queues == {} and queue.deficits == {}
+
+    asyncio.run(scenario())
+
+
+def test_backend_queue_grants_slots_in_arrival_order():
+    async def scenario():
+        queue = BackendQueue("m", max_concurrency=1)
+        held = await queue.acquire(1, time.monotonic() + 60)
+        order = []
+
+        async def request(expected):
+            slot = await queue.acquire(expected, time.monotonic() + 60)
+            order.append(expected)
+            slot.release()
+
+        tasks = [asyncio.create_task(request(expected)) for expected in (5, 1, 3)]
+        await asyncio.sleep(0)
+        assert len(queue) == 3
+        held.release()
+        await asyncio.gather(*tasks)
+        assert order == [5, 1, 3] and queue.inflight == 0
+
+    asyncio.run(scenario())
+
+
+def test_backend_queue_grants_slots_in_policy_order():
+    async def scenario():
+        queue = BackendQueue("m", max_concurrency=1, waiting=ShortestJobFirstQueue())
+        held = await queue.acquire(1, time.monotonic() + 60)
+        order = []
+
+        async def request(expected):
+            slot = await queue.acquire(expected, time.monotonic() + 60)
+            order.append(expected)
+            slot.release()
+
+        tasks = [asyncio.create_task(request(expected)) for expected in (5, 1, 3)]
+        await asyncio.sleep(0)
+        assert len(queue) == 3
+        held.release()
+        await asyncio.gather(*tasks)
+        assert order == [1, 3, 5] and queue.inflight == 0
+
+    asyncio.run(scenario())
+
+
+def test_backend_queue_sheds_requests_that_cannot_meet_their_deadline():
+    async def scenario():
+        queue = BackendQueue("m", max_concurrency=1, max_queue_length=1)
+        held = await queue.acquire(1, time.monotonic() + 60)
+        queue.avg_service_seconds = 10.0
+        with pytest.raises(LoadShedError) as shed:
+            await queue.acquire(1, time.monotonic() + 5)
+        assert shed.value.reason == "deadline" and shed.value.status_code == 503
+        assert shed.value.retry_after >= 1
+
+        waiting = asyncio.create_task(queue.acquire(1, time.monotonic() + 60))
+        await asyncio.sleep(0)
+        with pytest.raises(LoadShedError) as shed:
+            await queue.acquire(1, time.monotonic() + 60)
+        assert shed.value.reason == "queue_full" and shed.value.status_code == 429
+        held.release()
+        (await waiting).release()
+
+    asyncio.run(scenario())
+
+
+def test_waiter_past_its_latest_start_is_dropped():
+    async def scenario():
+        queue = BackendQueue("m", max_concurrency=1)
+        held = await queue.acquire(0.01, time.monotonic() + 60)
+        queue.avg_service_seconds = 0.01
+        with pytest.raises(LoadShedError) as shed:
+            await queue.acquire(0.05, time.monotonic() + 0.1)
+        assert shed.value.reason == "expired"
+        assert len(queue) == 0
+        held.release()
+        assert queue.inflight == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from api_gateway.semantic_cache import SemanticCache
+
+
+def build_cache(max_entries=4):
+    return SemanticCache({"enabled": True, "max_entries": max_entries, "threshold": 0.9}, {}, lambda: None)
+
+
+def test_near_duplicate_prompt_hits_only_its_own_namespace():
+    cache = build_cache()
+
+    async def scenario():
+        data = {"model": "m", "prompt": "What is the capital of France?"}
+        hit, query = await cache.lookup("/v1/completions", "ns", data)
+        assert hit is None
+        cache.store(query, "Paris")
+        hit, _ = await cache.lookup("/v1/completions", "ns", {"model": "m", "prompt": "what is the capital of france"})
+        assert hit is not None and hit.value == "Paris"
+        hit, _ = await cache.lookup("/v1/completions", "ns", {"model": "other", "prompt": data["prompt"]})
+        assert hit is None
+
+    asyncio.run(scenario())
+
+
+def test_namespace_ids_are_recycled_when_their_rows_are_evicted():
+    cache = build_cache(max_entries=4)
+
+    async def scenario():
+        for i in range(50):
+            _, query = await cache.lookup("/v1/completions", "ns", {"model": f"m{i}", "prompt": "hello"})
+            cache.store(query, i)
+        assert len(cache.namespace_ids) == 4
+        assert max(cache.namespace_ids.values()) <= 4
+        hit, _ = await cache.lookup("/v1/completions", "ns", {"model": "m49", "prompt": "hello"})
+        assert hit is not None and hit.value == 49
+        hit, _ = await cache.lookup("/v1/completions", "ns", {"model": "m0", "prompt": "hello"})
+        assert hit is None
+
+    asyncio.run(scenario())
+
+
+def test_expired_row_releases_its_namespace():
+    cache = build_cache()
+    cache.settings["ttl"] = -1
+
+    async def scenario():
+        _, query = await cache.lookup("/v1/completions", "ns", {"model": "m", "prompt": "hello"})
+        cache.store(query, "x")
+        hit, _ = await cache.lookup("/v1/completions", "ns", {"model": "m", "prompt": "hello"})
+        assert hit is None
+        assert cache.namespace_ids == {} and cache.free_ids == [0]
+
+    asyncio.run(scenario())
@@ -0,0 +1,30 @@
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api_gateway import main
+
+
+def test_building_the_app_touches_no_local_state(gateway_config, tmp_path):
+    gateway_config["prompts"]["registry"] = {"tone": "Be terse."}
+    with open(gateway_config["prompts"]["storage_path"], "w") as f:
+        json.dump({"support": [{"version": 1, "content": "You are support."}]}, f)
+    app = main.create_app(gateway_config)
+    assert not os.path.exists(gateway_config["batch"]["storage_dir"])
+    assert main.prompt_registry.get("support") is None
+
+    with TestClient(app) as client:
+        assert os.path.isdir(os.path.join(gateway_config["batch"]["storage_dir"], "files"))
+        listed = {p["id"] for p in client.get("/v1/prompts").json()["data"]}
+        assert listed == {"tone", "support"}
+
+
+def test_bad_prompt_file_fails_startup_clearly(gateway_config):
+    with open(gateway_config["prompts"]["storage_path"], "w") as f:
+        f.write("{not json")
+    app = main.create_app(gateway_config)
+    with pytest.raises(RuntimeError, match="Cannot load registered prompts"):
+        with TestClient(app):
+            pass
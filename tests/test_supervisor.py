@@ -0,0 +1,106 @@
+import asyncio
+import signal
+import socket
+import sys
+import time
+
+from api_gateway.supervisor import Supervisor
+
+# Answers 200 on every path until SIGTERM
+HEALTHY_SERVER = """
+import http.server, sys
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+    def log_message(self, *args):
+        pass
+print("serving", flush=True)
+http.server.HTTPServer(("127.0.0.1", int(sys.argv[1])), Handler).serve_forever()
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def healthy(gpu_memory=0.4):
+    return {"port": free_port(), "gpu_memory": gpu_memory,
+            "launch_command": [sys.executable, "-c", HEALTHY_SERVER, "{port}"]}
+
+
+def crashing(gpu_memory=0.4, code=3):
+    return {"port": free_port(), "gpu_memory": gpu_memory,
+            "launch_command": [sys.executable, "-c", f"print('boom'); raise SystemExit({code})"]}
+
+
+def build_supervisor(tmp_path, models, **settings):
+    lifecycle = {"log_dir": str(tmp_path), "startup_timeout": 10, "health_poll_interval": 0.05,
+                 "stop_timeout": 5, "gpu_memory_budget": 0.9}
+    supervisor_config = {"stream_logs": False, "restart_backoff_initial": 0.01, "restart_backoff_max": 0.02,
+                         **settings}
+    return Supervisor(supervisor_config, lifecycle, models)
+
+
+async def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.02)
+
+
+def test_backoff_doubles_up_to_the_cap(tmp_path):
+    supervisor = build_supervisor(tmp_path, {"m": crashing()}, restart_backoff_initial=1.0, restart_backoff_max=5.0)
+    backend = supervisor.backends["m"]
+    delays = []
+    for failures in range(1, 6):
+        backend.consecutive_failures = failures
+        delays.append(supervisor.backoff(backend))
+    assert delays == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+
+def test_crashing_backend_is_restarted_then_given_up(tmp_path):
+    async def scenario():
+        supervisor = build_supervisor(tmp_path, {"m": crashing()}, max_consecutive_failures=3)
+        supervisor.start()
+        backend = supervisor.backends["m"]
+        await asyncio.wait_for(backend.task, 10)
+        return backend
+
+    backend = asyncio.run(scenario())
+    assert backend.state == "failed"
+    assert backend.restarts == 2 and backend.last_exit_code == 3
+    assert list(backend.tail)[-1] == "boom"
+
+
+def test_shutdown_terminates_ready_backends(tmp_path):
+    async def scenario():
+        supervisor = build_supervisor(tmp_path, {"m": healthy()})
+        supervisor.start()
+        backend = supervisor.backends["m"]
+        await wait_for(lambda: backend.state == "ready")
+        assert supervisor.status()["all_ready"]
+        process = backend.process.process
+        await supervisor.shutdown()
+        return backend, process
+
+    backend, process = asyncio.run(scenario())
+    assert backend.state == "stopped" and not backend.process.running
+    assert process.returncode == -signal.SIGTERM
+
+
+def test_unscheduled_model_takes_over_from_a_failed_one(tmp_path):
+    async def scenario():
+        supervisor = build_supervisor(tmp_path, {"bad": crashing(0.6), "spare": healthy(0.6)},
+                                      max_consecutive_failures=2)
+        assert supervisor.unscheduled == ["spare"]
+        supervisor.start()
+        await wait_for(lambda: "spare" in supervisor.backends and supervisor.backends["spare"].state == "ready")
+        status = supervisor.status()
+        await supervisor.shutdown()
+        return status
+
+    status = asyncio.run(scenario())
+    assert status["unscheduled"] == [] and status["backends"]["bad"]["state"] == "failed"
@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+from api_gateway.scheduler import BackendQueue, DeficitRoundRobinQueue, FifoQueue
+from api_gateway.tenants import TenantResolver
+
+CONFIG = {
+    "enabled": True,
+    "api_keys": {"sk-acme": {"tenant": "acme", "tier": "premium"}},
+    "tenant_tiers": {"globex": "free"},
+    "unknown_tenant_buckets": 4,
+}
+
+
+def test_configured_tenants_keep_their_names():
+    resolver = TenantResolver(CONFIG)
+    acme = resolver.resolve({"X-API-Key": "sk-acme"})
+    assert (acme.name, acme.tier, acme.weight) == ("acme", "premium", 4.0)
+    globex = resolver.resolve({"X-Tenant-ID": "globex"})
+    assert (globex.name, globex.tier, globex.weight) == ("globex", "free", 1.0)
+    assert resolver.resolve({}).name == "anonymous"
+
+
+def test_unknown_identities_share_a_bounded_set_of_tenants():
+    resolver = TenantResolver(CONFIG)
+    names, owners = set(), set()
+    for i in range(200):
+        for headers in ({"X-Tenant-ID": f"t{i}"}, {"Authorization": f"Bearer sk-{i}"}):
+            tenant = resolver.resolve(headers)
+            names.add(tenant.name)
+            owners.add(tenant.owner)
+    assert names <= {f"unknown-{b}" for b in range(4)}
+    # Callers in the same bucket are still told apart
+    assert len(owners) == 400
+    assert resolver.resolve({"X-Tenant-ID": "t1"}).owner == resolver.resolve({"X-Tenant-ID": "t1"}).owner
+
+
+def test_weights_are_held_only_while_a_tenant_is_queued():
+    async def scenario():
+        queue = BackendQueue("m", max_concurrency=1, waiting=DeficitRoundRobinQueue(FifoQueue))
+        deadline = time.monotonic() + 10
+        first = await queue.acquire(0.01, deadline, "a", 10, weight=2.0)
+        # The fast path never touches the fair queue
+        assert queue.waiting.weights == {}
+        waiter = asyncio.create_task(queue.acquire(0.01, deadline, "b", 10, weight=3.0))
+        await asyncio.sleep(0)
+        assert queue.waiting.weights == {"b": 3.0}
+        first.release()
+        (await waiter).release()
+        assert queue.waiting.weights == {} and queue.waiting.queues == {}
+
+    asyncio.run(scenario())
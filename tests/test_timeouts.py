@@ -0,0 +1,54 @@
+import pytest
+
+from api_gateway.timeouts import DecodeSpeedTracker, TimeoutPolicy, estimate_prompt_tokens
+
+MODELS = {"m": {"timeout": 120, "max_tokens": 512}}
+
+
+def test_prompt_estimate_counts_token_ids_exactly():
+    assert estimate_prompt_tokens({"prompt": "x" * 400}) == 100
+    assert estimate_prompt_tokens({"prompt": ["x" * 40, "y" * 40]}) == 20
+    assert estimate_prompt_tokens({"prompt": [101, 20000, 3]}) == 3
+    assert estimate_prompt_tokens({"prompt": [[101, 20000], [3, 4, 5]]}) == 5
+    assert estimate_prompt_tokens({"messages": [
+        {"role": "user", "content": "x" * 40}, {"role": "user", "content": [{"type": "text", "text": "y" * 40}]}
+    ]}) == 20
+
+
+def test_tracker_folds_speeds_into_an_ewma():
+    tracker = DecodeSpeedTracker(alpha=0.5, default_tokens_per_second=30.0, min_observed_tokens=8)
+    assert tracker.tokens_per_second("m") == 30.0
+    tracker.observe("m", 100, 1.0)
+    assert tracker.tokens_per_second("m") == 100.0
+    tracker.observe("m", 200, 1.0)
+    assert tracker.tokens_per_second("m") == 150.0
+    # Too short to say anything about decode speed
+    tracker.observe("m", 4, 0.001)
+    tracker.observe("m", 100, 0.0)
+    assert tracker.tokens_per_second("m") == 150.0
+
+
+def test_timeout_scales_with_max_tokens_and_observed_speed():
+    policy = TimeoutPolicy({"safety_factor": 2.0, "overhead_seconds": 1.0, "min_timeout": 1.0,
+                            "prefill_tokens_per_second": 1e9}, MODELS)
+    # 1s overhead + 300 tokens at the default 30 tok/s, doubled
+    assert policy.compute("m", {"max_tokens": 300}) == pytest.approx(22.0)
+    policy.tracker.observe("m", 600, 1.0)
+    assert policy.compute("m", {"max_tokens": 300}) == pytest.approx(3.0)
+    # Without max_tokens the model's configured default applies
+    assert policy.requested_max_tokens("m", {}) == 512
+
+
+def test_timeout_is_clamped_between_min_and_model_ceiling():
+    policy = TimeoutPolicy({"min_timeout": 5.0}, MODELS)
+    assert policy.compute("m", {"max_tokens": 1}) == 5.0
+    assert policy.compute("m", {"max_tokens": 100000}) == 120.0
+    assert policy.compute("unknown", {"max_tokens": 100000}) == 300.0
+
+
+def test_client_header_overrides_up_to_the_ceiling():
+    policy = TimeoutPolicy({}, MODELS)
+    assert policy.compute("m", {"max_tokens": 100000}, {"X-Request-Timeout": "7.5"}) == 7.5
+    assert policy.compute("m", {}, {"X-Request-Timeout": "999"}) == 120.0
+    assert policy.client_timeout({"X-Request-Timeout": "soon"}) is None
+    assert policy.client_timeout({"X-Request-Timeout": "-1"}) is None
@@ -0,0 +1,47 @@
+import asyncio
+
+import httpx
+
+from api_gateway.warmup import ReadinessGate
+
+SETTINGS = {
+    "startup_timeout": 0.05, "probe_interval": 0.01, "recheck_interval": 0.02,
+    "connections_per_backend": 1, "warmup_requests": False, "min_ready_models": 2,
+}
+
+
+def test_backend_that_recovers_after_startup_makes_the_gateway_ready():
+    up = {"a": True, "b": False}
+
+    def handler(request):
+        model = request.url.host
+        return httpx.Response(200 if up[model] else 503, json={"data": []})
+
+    async def scenario():
+        gate = ReadinessGate(SETTINGS, {})
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            await gate.run(client, {"a": "http://a", "b": "http://b"})
+            assert gate.finished and not gate.ready
+            up["b"] = True
+            for _ in range(50):
+                if gate.ready:
+                    break
+                await asyncio.sleep(0.01)
+            assert gate.ready
+            assert gate.recheck_task.done()
+            await gate.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_recheck_stops_on_shutdown():
+    async def scenario():
+        gate = ReadinessGate(SETTINGS, {})
+        transport = httpx.MockTransport(lambda request: httpx.Response(503))
+        async with httpx.AsyncClient(transport=transport) as client:
+            await gate.run(client, {"a": "http://a"})
+            assert not gate.backends["a"].healthy
+            await gate.shutdown()
+            assert gate.recheck_task.cancelled()
+
+    asyncio.run(scenario())